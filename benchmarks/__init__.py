@@ -0,0 +1,10 @@
+'''Benchmarks for the work log's search and write paths.
+
+    python -m benchmarks.generate --size medium --output bench.db
+    python -m benchmarks.run --database bench.db --output before.json
+    python -m benchmarks.compare before.json after.json
+
+generate builds a database of synthetic tasks, run times every search and
+write path against it and writes a JSON report, and compare flags the
+timings that got slower between two reports.
+'''
@@ -0,0 +1,53 @@
+'''Compares two benchmark reports and flags regressions.
+
+    python -m benchmarks.compare before.json after.json --threshold 1.2
+
+Prints each case's median before and after and the ratio between them,
+and exits with status 1 if any case is slower than threshold times its
+old median, so it can gate a change in a script.
+'''
+import argparse
+import json
+import sys
+
+DEFAULT_THRESHOLD = 1.25
+
+# Timings this small are mostly noise, so they never count as regressions.
+MIN_MS = 0.05
+
+
+def compare(before, after, threshold=DEFAULT_THRESHOLD):
+    '''Returns (name, old median, new median, ratio, regressed) for every
+    case in both reports'''
+    rows = []
+    for name, result in after['results'].items():
+        if name not in before['results']:
+            continue
+        old = before['results'][name]['median_ms']
+        new = result['median_ms']
+        ratio = new / old if old else float('inf')
+        regressed = ratio > threshold and new - old > MIN_MS
+        rows.append((name, old, new, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Compare two benchmark reports.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown ratio that counts as a regression')
+    args = parser.parse_args(argv)
+    with open(args.before) as before, open(args.after) as after:
+        rows = compare(json.load(before), json.load(after), args.threshold)
+    print('{:<24} {:>12} {:>12} {:>8}'.format('case', 'before ms',
+                                              'after ms', 'ratio'))
+    for name, old, new, ratio, regressed in rows:
+        print('{:<24} {:>12.3f} {:>12.3f} {:>7.2f}x{}'.format(
+            name, old, new, ratio, '  SLOWER' if regressed else ''))
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+'''Generates a database of realistic synthetic tasks.
+
+A few employees log most of the tasks (a Zipf-like skew), dates spread
+over several years with quiet weekends, times cluster around an hour
+with a long tail, and notes range from empty to a few paragraphs.  The
+same seed always gives the same data.
+'''
+import argparse
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+
+import work_db
+from work_db import Task
+
+SIZES = {'small': 10000, 'medium': 1000000, 'large': 10000000}
+YEARS = 5
+INSERT_BATCH = 50000
+
+FIRST_NAMES = ['Airi', 'Akari', 'Anna', 'Chinami', 'Chisato', 'Erina',
+               'Fred', 'Haruka', 'Kanon', 'Kato', 'Maasa', 'Mai', 'Maimi',
+               'Mizuki', 'Momoko', 'Reina', 'Richard', 'Rie', 'Rika', 'Saki',
+               'Sayumi', 'Yumeno', 'Yurina', 'Zoe']
+LAST_NAMES = ['Abe', 'Brown', 'Fukumura', 'Ikuta', 'Ishida', 'Kudo',
+              'Miller', 'Nakajima', 'Okai', 'Sato', 'Smith', 'Suzuki',
+              'Takahashi', 'Tanaka', 'Wada', 'Yajima']
+TASK_NAMES = ['Answering the phone', 'Budget review', 'Client meeting',
+              'Code review', 'Customer service', 'Data entry', 'Filing',
+              'Inventory count', 'Onboarding', 'Planning', 'Reference work',
+              'Report writing', 'Sales call', 'Shelving books', 'Training',
+              'Typing', 'Writing report', 'Xeroxing']
+NOTE_WORDS = ('account agenda approved backlog call client copy deadline '
+              'draft email follow invoice market meeting minutes notes '
+              'order phone presentation project quarterly report review '
+              'sales schedule ship summary support team ticket update '
+              'vendor weekly').split()
+
+
+def employee_names(count, rng):
+    names = ['{} {}'.format(first, last)
+             for last, first in itertools.product(LAST_NAMES, FIRST_NAMES)]
+    while len(names) < count:
+        names.append('{} {} {}'.format(rng.choice(FIRST_NAMES),
+                                       rng.choice(LAST_NAMES), len(names)))
+    rng.shuffle(names)
+    return names[:count]
+
+
+def synthetic_tasks(rows, seed=0, end_date=None):
+    '''Yields a dict of Task fields for each of rows synthetic tasks'''
+    rng = random.Random(seed)
+    employees = employee_names(max(20, rows // 2000), rng)
+    # the employee at rank r logs tasks in proportion to 1 / r
+    weights = list(itertools.accumulate(
+        1 / rank for rank in range(1, len(employees) + 1)))
+    end_date = end_date or datetime.date.today()
+    first_day = end_date.toordinal() - 365 * YEARS
+    for _ in range(rows):
+        day = first_day + rng.randrange(365 * YEARS)
+        if (datetime.date.fromordinal(day).weekday() >= 5 and
+                rng.random() < 0.8):
+            day -= 2
+        words = int(rng.expovariate(1 / 25)) if rng.random() < 0.7 else 0
+        yield {
+            'employee': rng.choices(employees, cum_weights=weights)[0],
+            'name': rng.choice(TASK_NAMES),
+            'time': max(1, min(600, int(rng.lognormvariate(3.9, 0.7)))),
+            'date': datetime.date.fromordinal(day).isoformat(),
+            'notes': ' '.join(rng.choice(NOTE_WORDS) for _ in range(words)),
+        }
+
+
+def generate(path, rows, seed=0):
+    '''Builds a fresh database of synthetic tasks at path.
+
+    Rows are loaded into the bare employee and task tables, and the rest
+    of the schema is created afterwards, so the indexes, rollups and
+    full-text index are built once at the end instead of being updated
+    for every row.
+    '''
+    if os.path.exists(path):
+        raise FileExistsError('{} already exists.'.format(path))
+    database = Task._meta.database
+    database.init(path)
+    database.connect()
+    work_db.apply_pragmas(database, work_db.PROFILES['throughput'])
+    database.create_tables([work_db.Employee, Task])
+    tasks = synthetic_tasks(rows, seed)
+    while True:
+        batch = list(itertools.islice(tasks, INSERT_BATCH))
+        if not batch:
+            break
+        with database.atomic():
+            work_db.insert_tasks(batch)
+    work_db.create_schema(database)
+    database.execute_sql('ANALYZE')
+    database.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generate a database of synthetic tasks.')
+    parser.add_argument('--output', default='bench.db')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--size', choices=sorted(SIZES), default='small',
+                       help='small: 10k, medium: 1M, large: 10M rows')
+    group.add_argument('--rows', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    rows = args.rows or SIZES[args.size]
+    started = time.perf_counter()
+    try:
+        generate(args.output, rows, args.seed)
+    except FileExistsError as error:
+        parser.error(str(error))
+    print('Generated {} tasks in {} in {:.1f}s.'.format(
+        rows, args.output, time.perf_counter() - started), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+'''Times every search and write path against a benchmark database.
+
+Each case runs a number of times and the report keeps the median, the
+fastest and the 95th percentile run in milliseconds, along with the row
+count and the Python, SQLite and git versions, so that reports from two
+versions of the work log can be compared with benchmarks.compare.
+
+Write cases change the database, so run them against a copy if the
+same file will be measured again.
+'''
+import argparse
+import datetime
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+from peewee import fn
+
+import work_db
+from work_db import Task
+
+
+def first_page(query):
+    '''What the results view does before showing the first result, for a
+    query or a TaskCursor'''
+    cursor = (query if isinstance(query, work_db.TaskCursor)
+              else work_db.TaskCursor(query))
+    len(cursor)
+    for _ in zip(range(work_db.PAGE_SIZE), cursor):
+        pass
+
+
+def search_cases(rng):
+    '''Returns (name, function) pairs for the read paths'''
+    employees = work_db.employee_counts()
+    busiest = max(employees, key=lambda pair: pair[1])[0]
+    quietest = min(employees, key=lambda pair: pair[1])[0]
+    newest = work_db.date_counts()[0][0]
+    month_start = newest - datetime.timedelta(days=30)
+    return [
+        ('date_picker', work_db.date_counts),
+        ('date_picker_range',
+         lambda: work_db.date_counts(month_start, newest)),
+        ('employee_picker', work_db.employee_counts),
+        ('date_find_one_day',
+         lambda: first_page(work_db.search_query(newest, newest))),
+        ('date_find_month',
+         lambda: first_page(work_db.search_query(month_start, newest))),
+        ('time_find',
+         lambda: first_page(work_db.search_query(
+             time=rng.randint(30, 90)))),
+        ('time_find_range',
+         lambda: first_page(work_db.cached_search(min_time=60,
+                                                  max_time=120))),
+        ('time_find_over_4_hours',
+         lambda: first_page(work_db.cached_search(min_time=240))),
+        ('time_histogram', work_db.time_histogram),
+        ('exact_find_phrase',
+         lambda: first_page(work_db.text_search('quarterly report'))),
+        ('exact_find_prefix',
+         lambda: first_page(work_db.text_search('presen'))),
+        ('exact_find_short',
+         lambda: first_page(work_db.text_search('xe'))),
+        ('employee_find_busiest',
+         lambda: first_page(work_db.search_query(employee=busiest))),
+        ('employee_find_quietest',
+         lambda: first_page(work_db.search_query(employee=quietest))),
+    ]
+
+
+def write_cases(rng):
+    '''Returns (name, function) pairs for the write paths.  Tasks that
+    are added are deleted again, so the row count stays the same.'''
+    highest_id = Task.select(fn.MAX(Task.id)).scalar()
+    added = []
+
+    def add():
+        added.append(work_db.add_task('Benchmark Runner', 'Benchmarking',
+                                      rng.randint(1, 480), 'timing run'))
+
+    def edit():
+        work_db.edit_task(rng.randint(1, highest_id),
+                          time=rng.randint(1, 480))
+
+    def delete():
+        work_db.delete_task(added.pop().id)
+
+    return [('add_task', add), ('edit_task', edit), ('delete_task', delete)]
+
+
+def time_case(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return summarize(timings)
+
+
+def summarize(timings):
+    '''Returns the median, fastest and 95th percentile of timings in
+    seconds, as milliseconds'''
+    timings = sorted(seconds * 1000 for seconds in timings)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(timings[0], 3),
+        'p95_ms': round(timings[min(len(timings) - 1,
+                                    int(len(timings) * 0.95))], 3),
+        'runs': len(timings),
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(repeat=20, seed=0, writes=True):
+    '''Times every case against the initialized database and returns
+    the report as a dict'''
+    rng = random.Random(seed)
+    cases = search_cases(rng)
+    if writes:
+        cases += write_cases(rng)
+    return {
+        'version': git_version(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'rows': Task.select().count(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'results': {name: time_case(function, repeat)
+                    for name, function in cases},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time the work log against a benchmark database.')
+    parser.add_argument('--database', default='bench.db')
+    parser.add_argument('--profile', choices=sorted(work_db.PROFILES),
+                        default=work_db.DEFAULT_PROFILE)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-writes', action='store_true',
+                        help='leave the database unchanged')
+    parser.add_argument('--output', help='write the report here as JSON')
+    args = parser.parse_args(argv)
+    work_db.initialize({'path': args.database,
+                        'pragmas': work_db.PROFILES[args.profile]})
+    report = run_benchmarks(args.repeat, args.seed, not args.no_writes)
+    report['profile'] = args.profile
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text + '\n')
+    else:
+        print(text)
+    for name, result in report['results'].items():
+        print('{:<24} {:>10.3f} ms'.format(name, result['median_ms']),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
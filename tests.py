@@ -1,470 +1,1811 @@
-import datetime
-import unittest
-from unittest.mock import patch
-import io
-from io import StringIO
-from playhouse.test_utils import test_database
-from peewee import *
-
-import work_db
-from work_db import Task
-
-test_db = SqliteDatabase(':memory:')
-
-
-class WorkLogTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.task_search')
-    @patch('work_db.task_entry')
-    @patch('builtins.input', side_effect=['x', 'm', '1', '2', '3'])
-    def test_work_log(self, mock_input, mock_entry, mock_search, mock_stdout):
-        work_db.work_log()
-        self.assertIn("Please", mock_stdout.getvalue())
-        self.assertIn("Select", mock_stdout.getvalue())
-        self.assertTrue(mock_entry.called)
-        work_db.work_log()
-        self.assertTrue(mock_search.called)
-        with self.assertRaises(SystemExit):
-            work_db.work_log()
-
-
-class TaskEntryTests(unittest.TestCase):
-    @patch('work_db.work_log')
-    @patch('builtins.input',
-           side_effect=['Fred', 'Brewing coffee', '30', 'Starbucks', 'n'])
-    def test_task_entry(self, mock_input, mock_work_log):
-        with test_database(test_db, [Task]):
-            work_db.task_entry()
-            query_count = Task.select().where(
-                              (Task.employee == 'Fred') &
-                              (Task.name == 'Brewing coffee') &
-                              (Task.time == '30') &
-                              (Task.notes == 'Starbucks')
-                          ).count()
-            self.assertEqual(query_count, 1)
-            self.assertTrue(mock_work_log.called)
-
-
-class TaskSearchTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.work_log')
-    @patch('work_db.employee_find')
-    @patch('work_db.exact_find')
-    @patch('work_db.time_find')
-    @patch('work_db.date_find')
-    @patch('builtins.input', side_effect=['x', '1', '2', '3', '4', '5'])
-    def test_task_search(self, mock_input, mock_date_find, mock_time_find,
-                         mock_exact_find, mock_employee_find,
-                         mock_work_log, mock_stdout):
-        work_db.task_search()
-        self.assertIn("Please enter a selection from 1 to 5",
-                      mock_stdout.getvalue())
-        self.assertTrue(mock_date_find.called)
-        work_db.task_search()
-        self.assertTrue(mock_time_find.called)
-        work_db.task_search()
-        self.assertTrue(mock_exact_find.called)
-        work_db.task_search()
-        self.assertTrue(mock_employee_find.called)
-        work_db.task_search()
-        self.assertTrue(mock_work_log.called)
-
-
-class NumberInputTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['four', '0', '1'])
-    def test_number_input_invalid(self, mock_input, mock_stdout):
-        result = work_db.number_input("Input number")
-        self.assertIn('Enter a valid number', mock_stdout.getvalue())
-        self.assertIn('Enter a valid time', mock_stdout.getvalue())
-        self.assertEqual(result, 1)
-
-
-class NameInputTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['a' * 101, 'Brewing coffee'])
-    def test_long_name_input(self, mock_input, mock_stdout):
-        work_db.name_input('Insert name')
-        self.assertIn('Please enter a name from 1-100 characters in length.',
-                      mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=[' ', 'Brewing coffee'])
-    def test_no_name_input(self, mock_input, mock_stdout):
-        work_db.name_input('Insert name')
-        self.assertIn('Please enter a name from 1-100 characters in length.',
-                      mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['Brewing coffee'])
-    def test_good_name_input(self, mock_input, mock_stdout):
-        self.assertEqual(work_db.name_input('Insert name'), 'Brewing coffee')
-
-
-class DateInputTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['2017-01-33', '2017-01-01'])
-    def test_nonexistent_date(self, mock_input, mock_stdout):
-        work_db.date_input([])
-        self.assertIn('Date must be valid and in format YYYY-MM-DD. ' +
-                      'Try again.', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['2017/01/01', '2017-01-01'])
-    def test_incorrectly_formatted_date(self, mock_input, mock_stdout):
-        work_db.date_input([])
-        self.assertIn('Date must be valid and in format YYYY-MM-DD. ' +
-                      'Try again.', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['2017-01-01'])
-    def test_correct_date_format(self, mock_input, mock_stdout):
-        time = []
-        work_db.date_input(time)
-        self.assertEqual(datetime.datetime.strftime(time[0],
-                         '%Y-%m-%d'), '2017-01-01')
-
-
-class DateFindTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.display_results')
-    @patch('builtins.input', side_effect=['x', '1', 'one', '2', '1'])
-    def test_single_date_search(self, mock_input,
-                                mock_display_results, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Richard',
-                name='Xeroxing',
-                date=datetime.date(2017, 8, 18),
-                time='60',
-                notes='Richmeister at the copy machine'
-            )
-            work_db.date_find()
-            self.assertIn('Not a valid selection', mock_stdout.getvalue())
-            self.assertIn('Pick one of the following dates ' +
-                          'to view entries from', mock_stdout.getvalue())
-            self.assertIn('1: 2017-08-18 (1 entry)', mock_stdout.getvalue())
-            self.assertIn('Please enter a valid number',
-                          mock_stdout.getvalue())
-            self.assertTrue(mock_display_results.called)
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.display_results')
-    @patch('builtins.input',
-           side_effect=['2', '2017-08-16', '2017-08-18', '2'])
-    def test_date_range_search(self, mock_input,
-                               mock_display_results, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Rika',
-                name='Meeting',
-                date=datetime.date(2017, 8, 16),
-                time='120',
-                notes='Long meeting'
-            )
-            Task.create(
-                employee='Ai',
-                name='Writing report',
-                date=datetime.date(2017, 8, 17),
-                time='30',
-                notes='Report for sales'
-            )
-            work_db.date_find()
-            self.assertNotIn('\nNo results found.\n', mock_stdout.getvalue())
-            self.assertTrue(mock_display_results.called)
-
-
-class TimeFindTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.task_search')
-    @patch('builtins.input', side_effect=['30'])
-    def test_time_find_no_results(self, mock_input, mock_task_search,
-                                  mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Rie',
-                name='Presentation',
-                date=datetime.date(2017, 8, 18),
-                time='40',
-                notes='Presentation on Asian market'
-            )
-            work_db.time_find()
-            self.assertIn('\nNo results found.\n', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.display_results')
-    @patch('builtins.input', side_effect=['40'])
-    def test_time_find_with_results(self, mock_input,
-                                    mock_display_results, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Rie',
-                name='Presentation',
-                date=datetime.date(2017, 8, 18),
-                time='40',
-                notes='Presentation on Asian market'
-            )
-            work_db.time_find()
-            self.assertTrue(mock_display_results.called)
-
-
-class ExactFindTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.task_search')
-    @patch('builtins.input', side_effect=['', 'dancing'])
-    def test_exact_find_no_results(self, mock_input,
-                                   mock_task_search, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Yumeno',
-                name='Answering the phone',
-                date=datetime.date(2017, 8, 21),
-                time='60',
-                notes='Customer service'
-            )
-            work_db.exact_find()
-            self.assertIn('Please enter some text to be searched',
-                          mock_stdout.getvalue())
-            self.assertIn('\nNo results found.\n', mock_stdout.getvalue())
-            self.assertTrue(mock_task_search.called)
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.display_results')
-    @patch('builtins.input', side_effect=['Answering'])
-    def test_exact_find_with_results(self, mock_input,
-                                     mock_display_results, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Yumeno',
-                name='Answering the phone',
-                date=datetime.date(2017, 8, 21),
-                time='60',
-                notes='Customer service'
-            )
-            work_db.exact_find()
-            self.assertIn('Number of results = 1', mock_stdout.getvalue())
-            self.assertTrue(mock_display_results.called)
-
-
-class EmployeeFindTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.display_results')
-    @patch('builtins.input', side_effect=['five', '5', '1'])
-    def test_employee_find(self, mock_input,
-                           mock_display_results, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Kato',
-                name='Shelving books',
-                date=datetime.date(2017, 8, 15),
-                time='20',
-                notes='LC call numbers'
-            )
-            Task.create(
-                employee='Chinami',
-                name='Reference work',
-                date=datetime.date(2017, 8, 17),
-                time='40',
-                notes='Phone reference work'
-            )
-            work_db.employee_find()
-            self.assertIn('1: Chinami (1 entry)',
-                          mock_stdout.getvalue())
-            self.assertIn('2: Kato (1 entry)',
-                          mock_stdout.getvalue())
-            self.assertIn('Please enter a valid number',
-                          mock_stdout.getvalue())
-            self.assertIn('Please enter a valid number between 1 and 2',
-                          mock_stdout.getvalue())
-
-
-class DisplayResultsTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('work_db.task_search')
-    @patch('work_db.delete_entry')
-    @patch('work_db.edit_entry')
-    @patch('builtins.input', side_effect=['e', 'd', 'n', 's'])
-    def test_display_results(self, mock_input, mock_edit_entry,
-                             mock_delete_entry, mock_task_search,
-                             mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Anna',
-                name='Speaking Russian',
-                date=datetime.date(2017, 8, 15),
-                time='10',
-                notes='FUSHEEMU'
-            )
-            Task.create(
-                employee='Akari',
-                name='Acting',
-                date=datetime.date(2017, 8, 17),
-                time='40',
-                notes='Gintama'
-            )
-            Task.create(
-                employee='Airi',
-                name='Golfing',
-                date=datetime.date(2017, 8, 22),
-                time='180',
-                notes='Bankaa'
-            )
-            Task.create(
-                employee='Maimi',
-                name='Testing okazu',
-                date=datetime.date(2017, 8, 22),
-                time='25',
-                notes='Aji de gallina'
-            )
-            search_results = []
-            query = Task.select().order_by(Task.employee.asc())
-            for result in query:
-                search_results.append(result)
-            work_db.display_results(search_results)
-            self.assertIn('''Result 1 of 4\n
-                          Employee name: Airi
-                          Task name: Golfing
-                          Work time: 180
-                          Date: 2017-08-22
-                          Notes: Bankaa
-                          '''.replace(" ", ""),
-                          mock_stdout.getvalue().replace(" ", ""))
-            self.assertTrue(mock_edit_entry.called)
-            self.assertIn('''Result 2 of 4\n
-                          Employee name: Akari
-                          Task name: Acting
-                          Work time: 40
-                          Date: 2017-08-17
-                          Notes: Gintama
-                          '''.replace(" ", ""),
-                          mock_stdout.getvalue().replace(" ", ""))
-            self.assertTrue(mock_delete_entry.called)
-            self.assertIn('''
-                          Result 3 of 4\n
-                          Employee name: Anna
-                          Task name: Speaking Russian
-                          Work time: 10
-                          Date: 2017-08-15
-                          Notes: FUSHEEMU
-                          '''.replace(" ", ""),
-                          mock_stdout.getvalue().replace(" ", ""))
-            self.assertIn('''
-                          Result 4 of 4\n
-                          Employee name: Maimi
-                          Task name: Testing okazu
-                          Work time: 25
-                          Date: 2017-08-22
-                          Notes: Aji de gallina
-                          '''.replace(" ", ""),
-                          mock_stdout.getvalue().replace(" ", ""))
-            self.assertTrue(mock_task_search.called)
-
-
-class EditEntryTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['1', '    ', 'Drawing'])
-    def test_edit_entry_name(self, mock_input, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Saki',
-                name='Bowling',
-                date=datetime.date(2017, 8, 22),
-                time='45',
-                notes='Strike')
-            query = Task.get(Task.id == 1)
-            work_db.edit_entry(query)
-            self.assertIn('Please enter non-empty string.',
-                          mock_stdout.getvalue())
-            self.assertEqual(Task.get(Task.id == 1).name, 'Drawing')
-            self.assertIn('Entry edited', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['2', 'ten', '10'])
-    def test_edit_entry_time(self, mock_input, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Saki',
-                name='Bowling',
-                date=datetime.date(2017, 8, 22),
-                time='45',
-                notes='Strike'
-            )
-            query = Task.get(Task.id == 1)
-            work_db.edit_entry(query)
-            self.assertIn("Please enter a valid number",
-                          mock_stdout.getvalue())
-            self.assertEqual(Task.get(Task.id == 1).time, 10)
-            self.assertIn('Entry edited', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['3', '2017/08/21', '2017-08-21'])
-    def test_edit_entry_date(self, mock_input, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Saki',
-                name='Bowling',
-                date=datetime.date(2017, 8, 22),
-                time='45',
-                notes='Strike'
-            )
-            query = Task.get(Task.id == 1)
-            work_db.edit_entry(query)
-            self.assertIn("Dates should be valid and in format YYYY-MM-DD",
-                          mock_stdout.getvalue())
-            self.assertEqual(Task.get(Task.id == 1).date,
-                             datetime.date(2017, 8, 21))
-            self.assertIn('Entry edited', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['4', 'P-league'])
-    def test_edit_entry_notes(self, mock_input, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Saki',
-                name='Bowling',
-                date=datetime.date(2017, 8, 22),
-                time='45',
-                notes='Strike'
-            )
-            query = Task.get(Task.id == 1)
-            work_db.edit_entry(query)
-            self.assertEqual(Task.get(Task.id == 1).notes, 'P-league')
-            self.assertIn('Entry edited', mock_stdout.getvalue())
-
-
-class DeleteEntryTests(unittest.TestCase):
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['y'])
-    def test_delete_entry_confirm(self, mock_input, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Kashiyuka',
-                name='Singing',
-                date=datetime.date(2017, 8, 22),
-                time='5',
-                notes='Autotune'
-            )
-            query = Task.get(Task.id == 1)
-            work_db.delete_entry(query)
-            self.assertEqual(Task.select().count(), 0)
-            self.assertIn('Entry deleted', mock_stdout.getvalue())
-
-    @patch('sys.stdout', new_callable=StringIO)
-    @patch('builtins.input', side_effect=['n'])
-    def test_delete_entry_cancel(self, mock_input, mock_stdout):
-        with test_database(test_db, [Task]):
-            Task.create(
-                employee='Kashiyuka',
-                name='Singing',
-                date=datetime.date(2017, 8, 22),
-                time='5',
-                notes='Autotune'
-            )
-            query = Task.get(Task.id == 1)
-            work_db.delete_entry(query)
-            self.assertEqual(Task.select().where(
-                Task.employee == 'Kashiyuka').count(), 1)
-            self.assertIn('Delete cancelled', mock_stdout.getvalue())
-
-if __name__ == '__main__':
+import asyncio
+import datetime
+import json
+import sqlite3
+import threading
+import unittest
+from unittest.mock import patch
+import io
+import os
+import tempfile
+from io import StringIO
+from playhouse.test_utils import test_database
+from peewee import *
+
+import work_db
+import work_cli
+from benchmarks import compare, generate
+import work_export
+import work_import
+import work_loadtest
+import work_server
+import work_trace
+try:
+    import work_report
+except ImportError:  # NumPy is only needed for reports
+    work_report = None
+from work_db import (Employee, Task, DailyRollup, EmployeeRollup,
+                     ImportProgress, BulkOperation, BulkUndoRow,
+                     ArchivePartition, ChangeCompaction, employee_id)
+
+test_db = SqliteDatabase(':memory:')
+
+# Every table that work_db.migrate() creates, so that test_database()
+# drops them again afterwards.
+schema_models = [Employee, Task, DailyRollup, EmployeeRollup,
+                 ImportProgress, BulkUndoRow, BulkOperation, ArchivePartition,
+                 ChangeCompaction]
+
+
+class SchemaTestCase(unittest.TestCase):
+    # user_version outlives the tables in the shared in-memory database
+    def setUp(self):
+        test_db.execute_sql('PRAGMA user_version = 0')
+
+    def tearDown(self):
+        test_db.execute_sql('PRAGMA user_version = 0')
+        test_db.execute_sql('DROP TABLE IF EXISTS taskindex')
+        test_db.execute_sql('DROP TABLE IF EXISTS employeeindex')
+        test_db.execute_sql('DROP TABLE IF EXISTS taskchange')
+
+
+class LoadProfileTests(unittest.TestCase):
+    def test_default_profile(self):
+        profile = work_db.load_profile({'WORK_DB_CONFIG': os.devnull})
+        self.assertEqual(profile['path'], 'tasks.db')
+        self.assertEqual(profile['pragmas'],
+                         work_db.PROFILES[work_db.DEFAULT_PROFILE])
+
+    def test_config_file_and_environment(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ini',
+                                         delete=False) as config:
+            config.write('[database]\npath = work.db\n'
+                         'profile = throughput\ncache_size = -2000\n')
+        self.addCleanup(os.remove, config.name)
+        profile = work_db.load_profile({'WORK_DB_CONFIG': config.name,
+                                        'WORK_DB_SYNCHRONOUS': 'off'})
+        self.assertEqual(profile['path'], 'work.db')
+        pragmas = dict(profile['pragmas'])
+        self.assertEqual(pragmas['cache_size'], '-2000')
+        self.assertEqual(pragmas['synchronous'], 'off')
+        self.assertEqual(pragmas['temp_store'], 'memory')
+
+    def test_bad_settings(self):
+        with self.assertRaises(ValueError):
+            work_db.load_profile({'WORK_DB_CONFIG': os.devnull,
+                                  'WORK_DB_PROFILE': 'fastest'})
+        with self.assertRaises(ValueError):
+            work_db.load_profile({'WORK_DB_CONFIG': os.devnull,
+                                  'WORK_DB_CACHE_SIZE': '1; DROP TABLE task'})
+
+    def test_apply_pragmas(self):
+        work_db.apply_pragmas(test_db, [('cache_size', '-3000')])
+        self.assertEqual(
+            test_db.execute_sql('PRAGMA cache_size').fetchone()[0], -3000)
+
+
+class WriteCoordinatorTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tasks.db')
+        self.file_db = SqliteDatabase(self.path, timeout=0)
+        self.file_db.execute_sql(
+            'CREATE TABLE log (value INTEGER UNIQUE)')
+        self.addCleanup(self.file_db.close)
+
+    def insert(self, value):
+        self.file_db.execute_sql('INSERT INTO log VALUES (?)', (value,))
+        return value
+
+    def count(self):
+        return self.file_db.execute_sql(
+            'SELECT COUNT(*) FROM log').fetchone()[0]
+
+    def test_run_retries_while_busy(self):
+        other = sqlite3.connect(self.path, isolation_level=None,
+                                check_same_thread=False)
+        other.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(0.1, other.execute, ['COMMIT'])
+        timer.start()
+        coordinator = work_db.WriteCoordinator(self.file_db, backoff=0.02)
+        self.assertEqual(coordinator.run(self.insert, 1), 1)
+        timer.join()
+        other.close()
+        stats = coordinator.stats()
+        self.assertGreater(stats['busy_retries'], 0)
+        self.assertGreater(stats['lock_wait_seconds'], 0)
+        self.assertEqual(stats['transactions'], 1)
+        self.assertEqual(self.count(), 1)
+
+    def test_writer_thread_groups_writes(self):
+        coordinator = work_db.WriteCoordinator(self.file_db,
+                                               batch_window=0.05)
+        coordinator.start()
+        try:
+            futures = [coordinator.submit(self.insert, value)
+                       for value in range(20)]
+            results = [future.result() for future in futures]
+        finally:
+            coordinator.stop()
+        self.assertEqual(results, list(range(20)))
+        self.assertEqual(self.count(), 20)
+        self.assertLess(coordinator.stats()['transactions'], 20)
+
+    def test_bad_write_does_not_spoil_its_group(self):
+        coordinator = work_db.WriteCoordinator(self.file_db,
+                                               batch_window=0.05)
+        coordinator.start()
+        try:
+            good = coordinator.submit(self.insert, 1)
+            duplicate = coordinator.submit(self.insert, 1)
+            other = coordinator.submit(self.insert, 2)
+            self.assertEqual(good.result(), 1)
+            self.assertEqual(other.result(), 2)
+            with self.assertRaises(IntegrityError):
+                duplicate.result()
+        finally:
+            coordinator.stop()
+        self.assertEqual(self.count(), 2)
+
+
+class MigrateTests(SchemaTestCase):
+    def test_migrate_adds_indexes(self):
+        with test_database(test_db, schema_models):
+            self.assertEqual(work_db.schema_version(test_db), 0)
+            work_db.ensure_schema()
+            self.assertEqual(work_db.schema_version(test_db),
+                             len(work_db.MIGRATIONS))
+            index_names = [index.name for index in test_db.get_indexes('task')]
+            self.assertIn('task_date_id', index_names)
+            self.assertIn('task_employee_date', index_names)
+            self.assertIn('task_time', index_names)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_migrate_normalizes_employees(self, mock_stdout):
+        with test_database(test_db, schema_models, create_tables=False):
+            # the task table as the first version of the work log made it
+            test_db.execute_sql(
+                'CREATE TABLE task (id INTEGER NOT NULL PRIMARY KEY, '
+                'employee VARCHAR(100) NOT NULL, name VARCHAR(100) NOT NULL, '
+                'time INTEGER NOT NULL, date DATE NOT NULL, '
+                'notes TEXT NOT NULL)')
+            test_db.execute_sql(
+                "INSERT INTO task (employee, name, time, date, notes) VALUES "
+                "('Sayumi', 'Dancing', 30, '2017-08-15', ''), "
+                "('Reina', 'Cooking', 45, '2017-08-15', ''), "
+                "('Sayumi', 'Singing', 20, '2017-08-16', '')")
+            # a bulk delete of an employee's only task, to be undone
+            test_db.create_tables([BulkOperation, BulkUndoRow])
+            operation = BulkOperation.create(kind='delete', terms='{}',
+                                             count=1)
+            BulkUndoRow.create(operation=operation, task_id=4,
+                               employee='Risa', name='Typing', time=10,
+                               date=datetime.date(2017, 8, 14), notes='')
+            work_db.ensure_schema()
+            self.assertEqual(work_db.schema_version(test_db),
+                             len(work_db.MIGRATIONS))
+            self.assertIn('employee_id', [column.name for column in
+                                          test_db.get_columns('task')])
+            self.assertEqual(work_db.employee_counts(),
+                             [('Reina', 1), ('Sayumi', 2)])
+            self.assertEqual([row[:3] for row in work_db.changes_since()],
+                             [(1, 'insert', 1), (2, 'insert', 2),
+                              (3, 'insert', 3)])
+            work_db.undo_bulk()
+            self.assertEqual(work_db.employee_counts(),
+                             [('Reina', 1), ('Risa', 1), ('Sayumi', 2)])
+            self.assertEqual(EmployeeRollup.get(
+                EmployeeRollup.employee == employee_id('Sayumi')).minutes, 50)
+            self.assertEqual([task.name for task in work_db.cached_search(
+                employee='Sayumi', text='sing')], ['Singing'])
+            work_db.add_task('Reina', 'Baking', 60)
+            self.assertEqual(work_db.employee_counts(),
+                             [('Reina', 2), ('Risa', 1), ('Sayumi', 2)])
+            work_cli.run(['vacuum'])
+        self.assertEqual(mock_stdout.getvalue(), 'Database compacted.\n')
+
+    def test_migrate_is_idempotent(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.assertEqual(work_db.migrate(), len(work_db.MIGRATIONS))
+
+    def test_schema_is_made_in_the_given_database(self):
+        with test_database(test_db, [Employee, Task]):
+            work_db.create_schema(test_db)
+            self.assertIn('archivepartition', test_db.get_tables())
+            self.assertIs(ArchivePartition._meta.database, work_db.db)
+            for model in work_db.SCHEMA_MODELS[2:]:
+                test_db.execute_sql('DROP TABLE {}'.format(
+                    model._meta.table_name))
+
+
+class InitializeTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tasks.db')
+        self.addCleanup(self.restore)
+
+    def restore(self):
+        work_db.db.close()
+        work_db.db.init('tasks.db')
+        work_db.db._schema_unchecked = False
+        work_db.connection_pragmas[:] = []
+
+    def count_queries(self, function):
+        tracer = work_trace.QueryTracer()
+        tracer.install(work_db.db)
+        try:
+            function()
+        finally:
+            tracer.uninstall()
+        return tracer.totals['(no action)']['queries']
+
+    def test_connects_on_first_query(self):
+        work_db.initialize({'path': self.path,
+                            'pragmas': [('cache_size', '-3000')]})
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(Task.select().count(), 0)
+        self.assertEqual(work_db.schema_version(), len(work_db.MIGRATIONS))
+        self.assertEqual(work_db.db.execute_sql(
+            'PRAGMA cache_size').fetchone()[0], -3000)
+
+    def test_current_schema_is_not_checked_again(self):
+        profile = {'path': self.path, 'pragmas': []}
+        work_db.initialize(profile)
+        first = self.count_queries(lambda: Task.select().count())
+        work_db.db.close()
+        work_db.initialize(profile)
+        # the count and the PRAGMA user_version that finds it current
+        self.assertEqual(
+            self.count_queries(lambda: Task.select().count()), 2)
+        self.assertGreater(first, 2)
+
+    def test_first_queries_from_many_threads(self):
+        work_db.initialize({'path': self.path,
+                            'pragmas': [('journal_mode', 'wal'),
+                                        ('busy_timeout', '5000')]})
+        barrier = threading.Barrier(8)
+        results = []
+
+        def first_query():
+            barrier.wait()
+            try:
+                results.append(Task.select().count())
+            except Exception as error:
+                results.append(error)
+            finally:
+                work_db.db.close()
+        threads = [threading.Thread(target=first_query) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [0] * 8)
+
+
+class ArchiveTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        work_db.initialize({'path': os.path.join(directory.name, 'tasks.db'),
+                            'pragmas': [('journal_mode', 'wal')]})
+        self.addCleanup(InitializeTests.restore, self)
+        for year, day in [(2015, 10), (2015, 11), (2016, 10), (2017, 10)]:
+            Task.create(employee=employee_id('Risa'), name='Typing', time=30,
+                        notes='', date=datetime.date(year, 8, day))
+
+    def test_archive_by_year(self):
+        moved = work_db.archive_tasks(datetime.date(2017, 1, 1))
+        self.assertEqual(moved, {2015: 2, 2016: 1})
+        self.assertTrue(os.path.exists(
+            os.path.join(self.directory, 'tasks-2015.db')))
+        self.assertEqual(Task.select().count(), 1)
+        self.assertEqual(work_db.archive_cutoff(), datetime.date(2017, 1, 1))
+        self.assertEqual(work_db.employee_counts(), [('Risa', 1)])
+        self.assertEqual(work_db.employee_counts(history=True),
+                         [('Risa', 4)])
+        self.assertEqual([row[1:3] for row in work_db.changes_since()],
+                         [('insert', 4), ('archive', 1), ('archive', 2),
+                          ('archive', 3)])
+        output = StringIO()
+        self.assertEqual(work_export.export_tasks(
+            output, 'jsonl', start_date=datetime.date(2015, 1, 1),
+            end_date=datetime.date(2015, 12, 31)), 2)
+        self.assertIn('"date": "2015-08-11"', output.getvalue())
+        self.assertEqual(
+            [task['date'] for task in work_server.search_tasks(
+                {'start_date': '2015-01-01', 'end_date': '2015-12-31'})],
+            ['2015-08-10', '2015-08-11'])
+        self.assertEqual(work_db.archive_tasks(datetime.date(2017, 1, 1)),
+                         {})
+
+    def test_searches_read_archives_by_date(self):
+        work_db.archive_tasks(datetime.date(2017, 1, 1))
+        recent = work_db.cached_search(start_date=datetime.date(2017, 1, 1))
+        self.assertFalse(recent.history)
+        self.assertEqual(len(recent), 1)
+        old = work_db.cached_search(start_date=datetime.date(2015, 8, 11),
+                                    end_date=datetime.date(2016, 12, 31))
+        self.assertTrue(old.history)
+        self.assertEqual([(task.date.year, task.archive) for task in old],
+                         [(2015, 2015), (2016, 2016)])
+        self.assertEqual(len(work_db.cached_search(employee='Risa')), 1)
+        self.assertEqual(len(work_db.cached_search(employee='Risa',
+                                                   history=True)), 4)
+        self.assertEqual(work_db.date_counts(datetime.date(2015, 1, 1),
+                                             datetime.date(2015, 12, 31)),
+                         [(datetime.date(2015, 8, 11), 1),
+                          (datetime.date(2015, 8, 10), 1)])
+
+    def test_unfinished_run_stays_hidden(self):
+        work_db.archive_tasks(datetime.date(2016, 1, 1))
+        # a run that copied tasks and stopped before deleting them
+        work_db.writer.run(work_db._copy_to_archive, 'archive_2015', 2,
+                           ('2015-01-01', '2016-01-01'))
+        self.assertEqual(len(work_db.cached_search(history=True)), 4)
+        self.assertEqual(work_db.archive_tasks(datetime.date(2017, 1, 1)),
+                         {2016: 1})
+        self.assertEqual(len(work_db.cached_search(history=True)), 4)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_cli(self, mock_stdout):
+        work_cli.run(['archive', '--before', '2016-01-01'])
+        work_cli.run(['search', '--employee', 'Risa'])
+        work_cli.run(['search', '--employee', 'Risa', '--archived'])
+        lines = mock_stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], '2015: 2 tasks archived.')
+        self.assertEqual(len(lines), 1 + 2 + 4)
+
+
+class RollupTests(SchemaTestCase):
+    def test_rollups_follow_writes(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            first = Task.create(employee=employee_id('Sayumi'), name='Dancing',
+                                date=datetime.date(2017, 8, 15), time='30',
+                                notes='')
+            Task.create(employee=employee_id('Sayumi'), name='Singing',
+                        date=datetime.date(2017, 8, 16), time='45', notes='')
+            self.assertEqual(EmployeeRollup.get().minutes, 75)
+            self.assertEqual(work_db.date_counts(),
+                             [(datetime.date(2017, 8, 16), 1),
+                              (datetime.date(2017, 8, 15), 1)])
+            Task.update(date='2017-08-16', time=10).where(
+                Task.id == first.id).execute()
+            self.assertEqual(work_db.date_counts(),
+                             [(datetime.date(2017, 8, 16), 2)])
+            self.assertEqual(DailyRollup.get().minutes, 55)
+            first.delete_instance()
+            self.assertEqual(work_db.employee_counts(), [('Sayumi', 1)])
+            self.assertEqual(EmployeeRollup.get().minutes, 45)
+
+    def test_rebuild_rollups(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            Task.create(employee=employee_id('Reina'), name='Cooking',
+                        date=datetime.date(2017, 8, 15), time='30', notes='')
+            EmployeeRollup.delete().execute()
+            work_db.rebuild_rollups()
+            self.assertEqual(work_db.employee_counts(), [('Reina', 1)])
+
+
+class BulkTests(SchemaTestCase):
+    def create_tasks(self):
+        for employee, day in [('Fred Smtih', 15), ('Fred Smtih', 16),
+                              ('Fred Smith', 16), ('Saki', 16)]:
+            Task.create(employee=employee_id(employee),
+                        name='Brewing coffee', time=30,
+                        date=datetime.date(2017, 8, day), notes='Decaf')
+
+    def test_bulk_edit_and_undo(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            terms = {'employee': 'Fred Smtih'}
+            self.assertEqual(work_db.bulk_count(**terms), 2)
+            operation = work_db.bulk_edit(terms, employee='Fred Smith',
+                                          time='45')
+            self.assertEqual(operation.count, 2)
+            self.assertEqual(work_db.employee_counts(),
+                             [('Fred Smith', 3), ('Saki', 1)])
+            self.assertEqual(Task.get(Task.id == 1).time, 45)
+            Task.update(notes='Espresso').where(Task.id == 1).execute()
+            self.assertEqual(work_db.undo_bulk().kind, 'edit')
+            task = Task.get(Task.id == 1)
+            self.assertEqual((task.employee.name, task.time, task.notes),
+                             ('Fred Smtih', 30, 'Espresso'))
+            self.assertEqual(BulkUndoRow.select().count(), 0)
+            self.assertIsNone(work_db.undo_bulk())
+            with self.assertRaises(ValueError):
+                work_db.bulk_edit(terms, time='0')
+
+    def test_bulk_delete_and_undo(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            terms = {'start_date': datetime.date(2017, 8, 16),
+                     'text': 'coffee'}
+            self.assertEqual(work_db.bulk_delete(terms).count, 3)
+            self.assertEqual(Task.select().count(), 1)
+            self.assertEqual(work_db.date_counts(),
+                             [(datetime.date(2017, 8, 15), 1)])
+            work_db.undo_bulk()
+            self.assertEqual(work_db.bulk_count(text='decaf'), 4)
+            self.assertEqual(len(work_db.date_counts()), 2)
+
+    def test_undo_journal_is_pruned(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            with patch('work_db.BULK_UNDO_KEEP', 2):
+                for time in [40, 50, 60]:
+                    work_db.bulk_edit({'employee': 'Saki'}, time=time)
+            self.assertEqual(BulkOperation.select().count(), 2)
+            self.assertEqual(BulkUndoRow.select().count(), 2)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['b', 'e', '1', 'Fred Smith', 'y'])
+    def test_bulk_menu(self, mock_input, mock_stdout):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            results = work_db.cached_search(employee='Fred Smtih')
+            self.assertIs(work_db.display_results(results),
+                          work_db.task_search)
+            self.assertEqual(work_db.bulk_count(employee='Fred Smith'), 3)
+        self.assertIn('2 tasks match this search', mock_stdout.getvalue())
+        self.assertIn('2 tasks changed', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_cli(self, mock_stdout):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            work_cli.run(['bulk-delete', '--date-range', '2017-08-16',
+                          '2017-08-16', '--dry-run'])
+            self.assertEqual(Task.select().count(), 4)
+            work_cli.run(['bulk-edit', '--employee', 'Saki',
+                          '--set-name', 'Tea'])
+            work_cli.run(['undo-bulk'])
+            self.assertEqual(work_db.search_query(employee='Saki').get().name,
+                             'Brewing coffee')
+            with self.assertRaises(work_cli.CommandError):
+                work_cli.run(['bulk-delete'])
+        self.assertEqual(mock_stdout.getvalue().splitlines(), [
+            '3 tasks would be deleted.', '1 tasks changed.',
+            'Undid the bulk edit of 1 tasks.'])
+
+
+class ImportTests(SchemaTestCase):
+    def write_file(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as source:
+            source.write(text)
+        return path
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_import_csv(self):
+        path = self.write_file('tasks.csv', (
+            'employee,name,time,date,notes\n'
+            'Momoko,Filing,30,2017-08-15,Cabinet\n'
+            'Momoko,,30,2017-08-15,No name\n'
+            'Chisato,Typing,ten,2017-08-15,Bad time\n'
+            'Chisato,Typing,45,2017-08-16,\n'))
+        errors = StringIO()
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            summary = work_import.import_file(path, batch_size=1,
+                                              errors=errors)
+            self.assertEqual(summary, (2, 2, 4))
+            self.assertEqual(work_db.employee_counts(),
+                             [('Chisato', 1), ('Momoko', 1)])
+            self.assertIn('Enter a valid number.', errors.getvalue())
+            self.assertEqual(work_db.search_query(
+                employee='Chisato').get().notes, '')
+
+    def test_import_resumes(self):
+        path = self.write_file('tasks.jsonl', (
+            '{"employee": "Maasa", "name": "Filing", "time": 30}\n'
+            '{"employee": "Maasa", "name": "Typing", "time": 45}\n'))
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            ImportProgress.create(source=os.path.abspath(path), next_row=1)
+            summary = work_import.import_file(path)
+            self.assertEqual(summary, (1, 0, 2))
+            self.assertEqual(Task.get().name, 'Typing')
+            self.assertEqual(work_import.import_file(path), (0, 0, 2))
+
+    def test_import_with_workers(self):
+        path = self.write_file('tasks.csv', (
+            'employee,name,time,date,notes\n'
+            'Momoko,Filing,30,2017-08-15,"Cabinet,\nsecond drawer"\n'
+            '\n'
+            'Momoko,,30,2017-08-15,No name\n'
+            'Chisato,Typing,45,2017-08-16,\n'
+            'Chisato,Filing,15,2017-08-16,\n'))
+        errors = StringIO()
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            summary = work_import.import_file(path, batch_size=2,
+                                              errors=errors, workers=2)
+            self.assertEqual(summary, (3, 1, 4))
+            self.assertTrue(errors.getvalue().startswith('2,'))
+            self.assertEqual(EmployeeRollup.get(
+                EmployeeRollup.employee == employee_id('Chisato')).minutes,
+                60)
+            self.assertEqual(DailyRollup.get(
+                DailyRollup.date == datetime.date(2017, 8, 15)).entries, 1)
+            self.assertEqual(work_db.text_search('drawer').get().name,
+                             'Filing')
+            Task.create(employee=employee_id('Momoko'), name='Typing',
+                        time=10, date=datetime.date(2017, 8, 15), notes='')
+            self.assertEqual(DailyRollup.get(
+                DailyRollup.date == datetime.date(2017, 8, 15)).minutes, 40)
+            self.assertEqual([row[1] for row in work_db.changes_since()],
+                             ['insert'] * 4)
+
+    def test_import_rejects_fields_of_the_wrong_type(self):
+        path = self.write_file('tasks.jsonl', (
+            '{"employee": 123, "name": "Filing", "time": 30}\n'
+            '{"employee": "Maasa", "name": "Filing", "time": 30, '
+            '"notes": {"a": 1}}\n'
+            '{"employee": "Maasa", "name": "Typing", "time": true}\n'
+            '{"employee": "Maasa", "name": "Typing", "time": 45}\n'))
+        errors = StringIO()
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            summary = work_import.import_file(path, errors=errors,
+                                              workers=2)
+            self.assertEqual(summary, (1, 3, 4))
+            self.assertEqual([line.split(',')[:2] for line in
+                              errors.getvalue().splitlines()],
+                             [['1', 'employee must be text.'],
+                              ['2', 'notes must be text.'],
+                              ['3', 'time must be a number or text.']])
+            self.assertEqual(Task.get().name, 'Typing')
+
+    def test_stray_quote_ends_its_row(self):
+        rows = ['Fred,5" pipe,30\n'] + [
+            'Fred,Pipe {},{}\n'.format(number, number) for number in
+            range(1, 11)] + ['Fred,"Two\nlines",12\n']
+        path = self.write_file('tasks.csv', 'employee,name,time\n' +
+                               ''.join(rows))
+        chunks = list(work_import.read_chunks(path, 'csv', 3))
+        self.assertEqual([len(records) for _, records in chunks],
+                         [3, 3, 3, 3])
+        self.assertEqual(chunks[-1][1][-1], 'Fred,"Two\nlines",12\n')
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            ImportProgress.create(source=os.path.abspath(path), next_row=10)
+            summary = work_import.import_file(path, batch_size=3)
+            self.assertEqual(summary, (2, 0, 12))
+            self.assertEqual([task.name for task in Task.select()],
+                             ['Pipe 10', 'Two\nlines'])
+
+    def test_file_totals(self):
+        path = self.write_file('tasks.jsonl', (
+            '{"employee": "Maasa", "name": "Filing", "time": 30}\n'
+            '{"employee": "Maasa", "name": "Typing", "time": 45}\n'
+            '{"employee": "Airi", "name": "", "time": 45}\n'))
+        self.assertEqual(work_import.file_totals(path, batch_size=1),
+                         {'Maasa': (2, 75)})
+
+
+class ChangeJournalTests(SchemaTestCase):
+    def test_changes_since(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            first = work_db.add_task('Ai', 'Filing', 30,
+                                     date=datetime.date(2017, 8, 15))
+            second = work_db.add_task('Ai', 'Typing', 45,
+                                      date=datetime.date(2017, 8, 15))
+            self.assertEqual(list(work_db.changes_since()), [
+                (1, 'insert', first.id, 'Ai', 'Filing', 30, '2017-08-15',
+                 ''),
+                (2, 'insert', second.id, 'Ai', 'Typing', 45, '2017-08-15',
+                 '')])
+            work_db.edit_task(first.id, time=40)
+            work_db.delete_task(second.id)
+            work_db.bulk_edit({'employee': 'Ai'}, notes='Checked')
+            self.assertEqual(list(work_db.changes_since(2)), [
+                (4, 'delete', second.id, None, None, None, None, None),
+                (5, 'update', first.id, 'Ai', 'Filing', 40, '2017-08-15',
+                 'Checked')])
+            self.assertEqual(list(work_db.changes_since(5)), [])
+            self.assertEqual(len(list(work_db.changes_since(0, limit=1))),
+                             1)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_compact_changes(self, mock_stdout):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            kept = work_db.add_task('Ai', 'Filing', 30)
+            work_db.edit_task(kept.id, time=40)
+            work_db.delete_task(work_db.add_task('Ai', 'Typing', 45).id)
+            work_cli.run(['compact-changes', '--before', '2999-01-01'])
+            self.assertEqual(mock_stdout.getvalue(),
+                             '3 change journal entries removed.\n')
+            self.assertEqual(work_db.compacted_through(), 4)
+            self.assertEqual([row[:3] for row in work_db.changes_since()],
+                             [(2, 'update', kept.id)])
+            with self.assertRaises(ValueError):
+                list(work_db.changes_since(3))
+            # seq carries on from the removed entries
+            work_db.edit_task(kept.id, time=50)
+            work_cli.run(['changes', '--since', '4'])
+            self.assertIn('"seq": 5', mock_stdout.getvalue())
+
+
+class ExportTests(unittest.TestCase):
+    def create_tasks(self):
+        Task.create(employee=employee_id('Airi'), name='Golfing',
+                    date=datetime.date(2017, 8, 22), time='180',
+                    notes='Bankaa')
+        Task.create(employee=employee_id('Maimi'), name='Testing okazu',
+                    date=datetime.date(2017, 8, 15), time='25',
+                    notes='Aji de gallina')
+
+    def test_export_csv_with_filters(self):
+        output = StringIO()
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            count = work_export.export_tasks(
+                output, 'csv', start_date=datetime.date(2017, 8, 20))
+        self.assertEqual(count, 1)
+        self.assertEqual(output.getvalue().splitlines(), [
+            'id,employee,name,time,date,notes',
+            '1,Airi,Golfing,180,2017-08-22,Bankaa'])
+
+    def test_export_jsonl(self):
+        output = StringIO()
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            work_export.export_tasks(output, 'jsonl', employee='Maimi')
+        self.assertIn('"date": "2017-08-15"', output.getvalue())
+        self.assertNotIn('Airi', output.getvalue())
+
+    def test_columnar_round_trip(self):
+        output = io.BytesIO()
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            self.assertEqual(work_export.export_tasks(output, 'columnar'), 2)
+        output.seek(0)
+        self.assertEqual(list(work_export.read_columnar(output)), [
+            (1, 'Airi', 'Golfing', 180, datetime.date(2017, 8, 22),
+             'Bankaa'),
+            (2, 'Maimi', 'Testing okazu', 25, datetime.date(2017, 8, 15),
+             'Aji de gallina')])
+
+
+class CliTests(unittest.TestCase):
+    def write_batch_file(self, text):
+        batch_file = tempfile.NamedTemporaryFile('w', suffix='.txt',
+                                                 delete=False)
+        with batch_file:
+            batch_file.write(text)
+        self.addCleanup(os.remove, batch_file.name)
+        return batch_file.name
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_add_search_edit_delete(self, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            work_cli.run(['add', '--employee', 'Fred', '--name',
+                          'Brewing coffee', '--time', '30',
+                          '--date', '2017-08-18'])
+            self.assertEqual(mock_stdout.getvalue(), '1\n')
+            work_cli.run(['edit', '1', '--time', '45', '--notes', 'Decaf'])
+            work_cli.run(['search', '--date-range', '2017-08-01',
+                          '2017-08-31', '--employee', 'Fred'])
+            self.assertIn('"time": 45', mock_stdout.getvalue())
+            self.assertIn('"notes": "Decaf"', mock_stdout.getvalue())
+            work_cli.run(['delete', '1'])
+            self.assertEqual(Task.select().count(), 0)
+            with self.assertRaises(work_cli.CommandError):
+                work_cli.run(['delete', '1'])
+
+    def test_invalid_add(self):
+        with test_database(test_db, [Employee, Task]):
+            with self.assertRaises(ValueError):
+                work_cli.run(['add', '--employee', 'Fred', '--name',
+                              'Brewing coffee', '--time', '0'])
+            with self.assertRaises(work_cli.CommandError):
+                work_cli.run(['add', '--employee', 'Fred'])
+
+    def test_batch(self):
+        path = self.write_batch_file(
+            '# two tasks\n'
+            'add --employee Fred --name Brewing --time 30\n'
+            'add --employee Fred --name "Pouring coffee" --time 5\n'
+            'edit 2 --name Pouring\n')
+        with test_database(test_db, [Employee, Task]):
+            with patch('sys.stdout', new_callable=StringIO):
+                work_cli.run(['batch', path])
+            self.assertEqual(Task.get(Task.id == 2).name, 'Pouring')
+
+    def test_failed_batch_keeps_nothing(self):
+        path = self.write_batch_file(
+            'add --employee Fred --name Brewing --time 30\n'
+            'delete 7\n')
+        with test_database(test_db, [Employee, Task]):
+            with patch('sys.stdout', new_callable=StringIO):
+                with self.assertRaisesRegex(work_cli.CommandError,
+                                            'line 2: No task with id 7'):
+                    work_cli.run(['batch', path])
+            self.assertEqual(Task.select().count(), 0)
+
+    def test_batch_rejects_commands_with_own_transactions(self):
+        for line in ['vacuum', 'archive --before 2017-01-01',
+                     'compact-changes', 'rebuild-rollups', 'batch other.txt']:
+            path = self.write_batch_file(
+                'add --employee Fred --name Brewing --time 30\n' + line)
+            with test_database(test_db, [Employee, Task]):
+                with patch('sys.stdout', new_callable=StringIO):
+                    with self.assertRaisesRegex(work_cli.CommandError,
+                                                'line 2: Batch files cannot'):
+                        work_cli.run(['batch', path])
+                self.assertEqual(Task.select().count(), 0)
+
+
+class ServerTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file_db = SqliteDatabase(os.path.join(directory.name,
+                                                   'tasks.db'))
+
+    async def exchange(self, requests):
+        task_server = work_server.TaskServer(workers=2)
+        server = await task_server.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1',
+                                                           port)
+            statuses = []
+            for method, target, body in requests:
+                statuses.append(await work_loadtest.send(
+                    reader, writer, '127.0.0.1', method, target, body))
+            writer.close()
+            return statuses
+        finally:
+            server.close()
+            await server.wait_closed()
+            task_server.close()
+
+    def test_endpoints(self):
+        with test_database(self.file_db, [Employee, Task]):
+            statuses = asyncio.run(self.exchange([
+                ('POST', '/tasks', {'employee': 'Fred', 'name': 'Brewing',
+                                    'time': 30, 'date': '2017-08-18'}),
+                ('POST', '/tasks', {'employee': 'Fred', 'name': 'Brewing',
+                                    'time': 0}),
+                ('PATCH', '/tasks/1', {'time': 45}),
+                ('GET', '/tasks?employee=Fred&start_date=2017-08-01', None),
+                ('GET', '/tasks/1', None),
+                ('DELETE', '/tasks/1', None),
+                ('GET', '/tasks/1', None),
+                ('PUT', '/tasks', None),
+            ]))
+            self.assertEqual(statuses, [201, 400, 200, 200, 200, 204, 404,
+                                        405])
+            self.assertEqual(Task.select().count(), 0)
+
+    def test_server_errors_are_logged(self):
+        with test_database(self.file_db, [Employee, Task]):
+            with patch('work_server.get_task',
+                       side_effect=RuntimeError('broken')):
+                with self.assertLogs('work_server', 'ERROR') as logs:
+                    statuses = asyncio.run(self.exchange([
+                        ('GET', '/tasks/1', None)]))
+            self.assertEqual(statuses, [500])
+            self.assertIn('GET /tasks/1', logs.output[0])
+            self.assertIn('RuntimeError: broken', logs.output[0])
+
+    def test_search_results(self):
+        with test_database(self.file_db, [Employee, Task]):
+            Task.create(employee=employee_id('Fred'), name='Brewing', time=30,
+                        date=datetime.date(2017, 8, 18), notes='')
+            results = work_server.search_tasks({'employee': 'Fred'})
+            self.assertEqual(results, [
+                {'id': 1, 'employee': 'Fred', 'name': 'Brewing',
+                 'time': 30, 'date': '2017-08-18', 'notes': ''}])
+            with self.assertRaises(work_server.HTTPError):
+                work_server.search_tasks({'time': 'long'})
+            self.assertEqual(work_server.search_tasks({'min_time': '31'}),
+                             [])
+            for params in [{'limit': '-1'}, {'limit': '0'},
+                           {'offset': '-1'}]:
+                with self.assertRaises(work_server.HTTPError) as raised:
+                    work_server.search_tasks(params)
+                self.assertEqual(raised.exception.status, 400)
+            with self.assertRaises(work_server.HTTPError):
+                work_server.task_changes({'limit': '-1'})
+
+    def test_bad_field_types(self):
+        with test_database(self.file_db, [Employee, Task]):
+            for data in [{'employee': 5, 'name': 'Brewing', 'time': 30},
+                         {'employee': 'Fred', 'name': ['x'], 'time': 30},
+                         {'employee': 'Fred', 'name': 'Brewing',
+                          'time': [30]},
+                         {'employee': 'Fred', 'name': 'Brewing', 'time': 30,
+                          'notes': {}}]:
+                with self.assertRaises(work_server.HTTPError) as raised:
+                    work_server.create_task(data)
+                self.assertEqual(raised.exception.status, 400)
+            work_server.create_task({'employee': 'Fred', 'name': 'Brewing',
+                                     'time': 30})
+            for data in [{'date': None}, {'time': True}, {'notes': 3}]:
+                with self.assertRaises(work_server.HTTPError) as raised:
+                    work_server.update_task(1, data)
+                self.assertEqual(raised.exception.status, 400)
+            statuses = asyncio.run(self.exchange([
+                ('POST', '/tasks', {'employee': 5, 'name': 'Brewing',
+                                    'time': 30}),
+                ('GET', '/tasks/1', None)]))
+            self.assertEqual(statuses, [400, 200])
+
+
+@unittest.skipIf(work_report is None, 'NumPy is not installed')
+class ReportTests(SchemaTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'tasks.snapshot.npz')
+
+    def create_tasks(self):
+        for employee, day, time in [('Maimi', 14, 30), ('Saki', 15, 90),
+                                    ('Maimi', 15, 60), ('Maimi', 21, 10),
+                                    ('Saki', 31, 45)]:
+            Task.create(employee=employee_id(employee), name='Filing',
+                        time=time, date=datetime.date(2017, 8, day),
+                        notes='')
+
+    def test_snapshot_refreshes_incrementally(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            snapshot = work_report.load_snapshot(self.path)
+            self.assertEqual(snapshot.names, ['Maimi', 'Saki'])
+            self.assertEqual(snapshot.days.dtype, 'int32')
+            Task.create(employee=employee_id('Airi'), name='Typing', time=20,
+                        date=datetime.date(2017, 9, 1), notes='')
+            with patch('work_report.read_rows',
+                       wraps=work_report.read_rows) as read_rows:
+                snapshot = work_report.load_snapshot(self.path)
+            read_rows.assert_called_once_with(5)
+            self.assertEqual(snapshot.names, ['Maimi', 'Saki', 'Airi'])
+            self.assertEqual(snapshot.ids.tolist(), [1, 2, 3, 4, 5, 6])
+            Task.update(time=100).where(Task.id == 1).execute()
+            snapshot = work_report.load_snapshot(self.path)
+            self.assertEqual(snapshot.times.tolist()[0], 100)
+
+    def test_snapshot_sees_changes_that_keep_totals(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            work_report.load_snapshot(self.path)
+            # times that cancel out
+            Task.update(time=40).where(Task.id == 1).execute()
+            Task.update(time=80).where(Task.id == 2).execute()
+            snapshot = work_report.load_snapshot(self.path)
+            self.assertEqual(snapshot.times.tolist()[:2], [40, 80])
+            work_db.bulk_edit({'employee': 'Saki'}, employee='Airi')
+            snapshot = work_report.load_snapshot(self.path)
+            self.assertEqual(work_report.top_employees(snapshot, 1),
+                             [('Airi', 125, 2)])
+
+    def test_reports(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            snapshot = work_report.load_snapshot(self.path)
+        monday = datetime.date(2017, 8, 14)
+        self.assertEqual(work_report.period_totals(snapshot, 'week'), [
+            ('Maimi', monday, 2, 90),
+            ('Maimi', datetime.date(2017, 8, 21), 1, 10),
+            ('Saki', monday, 1, 90),
+            ('Saki', datetime.date(2017, 8, 28), 1, 45)])
+        self.assertEqual(
+            work_report.period_totals(snapshot, 'month',
+                                      end_date=datetime.date(2017, 8, 20)),
+            [('Maimi', datetime.date(2017, 8, 1), 2, 90),
+             ('Saki', datetime.date(2017, 8, 1), 1, 90)])
+        self.assertEqual(work_report.time_percentiles(snapshot, [0, 50, 100]),
+                         {None: [10, 45, 90], 'Maimi': [10, 30, 60],
+                          'Saki': [45, 45, 90]})
+        self.assertEqual(work_report.top_employees(snapshot, 1),
+                         [('Saki', 135, 2)])
+        with self.assertRaises(ValueError):
+            work_report.time_percentiles(snapshot, [50, 150])
+
+    def test_main_rejects_bad_arguments(self):
+        for argv in [['--percentiles', '50', '150'], ['--percentiles', '-5'],
+                     ['--top', '0'], ['--top', '-3']]:
+            with patch('sys.stderr', new_callable=StringIO):
+                with self.assertRaises(SystemExit):
+                    work_report.main(argv)
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_synthetic_tasks(self):
+        tasks = list(generate.synthetic_tasks(2000, seed=1))
+        self.assertEqual(tasks, list(generate.synthetic_tasks(2000, seed=1)))
+        for task in tasks:
+            work_import.clean_row(task)
+        counts = sorted(
+            [sum(1 for task in tasks if task['employee'] == employee)
+             for employee in set(task['employee'] for task in tasks)],
+            reverse=True)
+        self.assertGreater(counts[0], 5 * counts[-1])
+
+    def test_compare(self):
+        before = {'results': {'date_picker': {'median_ms': 2.0},
+                              'time_find': {'median_ms': 0.01}}}
+        after = {'results': {'date_picker': {'median_ms': 3.0},
+                             'time_find': {'median_ms': 0.03}}}
+        self.assertEqual(compare.compare(before, after), [
+            ('date_picker', 2.0, 3.0, 1.5, True),
+            ('time_find', 0.01, 0.03, 3.0, False)])
+
+
+class TraceTests(unittest.TestCase):
+    def setUp(self):
+        self.tracer = work_trace.QueryTracer(StringIO(), threshold=3)
+        self.tracer.install(test_db)
+
+    def tearDown(self):
+        self.tracer.uninstall()
+        work_trace.active = None
+
+    def test_flags_repeated_statement(self):
+        with test_database(test_db, [Employee, Task]):
+            with self.tracer.action('employee_find'):
+                for task_id in range(4):
+                    Task.select().where(Task.id == task_id).first()
+            with self.tracer.action('date_find'):
+                Task.select().count()
+        self.assertEqual(self.tracer.totals['employee_find']['queries'], 4)
+        self.assertEqual(self.tracer.totals['date_find']['calls'], 1)
+        [(name, count, sql)] = self.tracer.warnings
+        self.assertEqual((name, count), ('employee_find', 4))
+        self.assertIn('N+1 in employee_find', self.tracer.summary())
+        actions = [json.loads(line)['action'] for line in
+                   self.tracer.trace_file.getvalue().splitlines()]
+        self.assertEqual(actions.count('employee_find'), 4)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['e', '6', '5', '3'])
+    def test_session_actions(self, mock_input, mock_stdout):
+        work_trace.active = self.tracer
+        with test_database(test_db, [Employee, Task]):
+            Task.create(employee=employee_id('Mai'), name='Acting',
+                        date=datetime.date(2017, 8, 17), time='40',
+                        notes='')
+            with self.assertRaises(SystemExit):
+                work_db.run_session(lambda: work_db.display_results(
+                    work_db.TaskCursor(Task.select())))
+        self.assertEqual(self.tracer.totals['display_results']['calls'], 1)
+        self.assertGreater(
+            self.tracer.totals['display_results']['queries'], 0)
+        self.assertEqual(self.tracer.totals['work_log']['calls'], 1)
+        self.assertEqual(self.tracer.warnings, [])
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        cache = patch('work_db.result_cache', work_db.ResultCache())
+        cache.start().enabled = True
+        self.addCleanup(cache.stop)
+
+    def count_queries(self, function):
+        tracer = work_trace.QueryTracer()
+        tracer.install(test_db)
+        try:
+            function()
+        finally:
+            tracer.uninstall()
+        return sum(totals['queries'] for totals in tracer.totals.values())
+
+    def test_writes_drop_only_results_they_change(self):
+        aug_15, aug_16 = datetime.date(2017, 8, 15), datetime.date(2017, 8, 16)
+        with test_database(test_db, [Employee, Task]):
+            task = work_db.add_task('Sayumi', 'Filing', 20, date=aug_15)
+
+            def search():
+                return len(work_db.cached_search(start_date=aug_15,
+                                                 end_date=aug_15))
+            self.assertEqual(search(), 1)
+            # a hit costs only the data_version check
+            self.assertEqual(self.count_queries(search), 1)
+            work_db.add_task('Sayumi', 'Typing', 30, date=aug_16)
+            self.assertEqual(self.count_queries(search), 1)
+            work_db.date_counts()
+            work_db.edit_task(task.id, notes='Folders')
+            self.assertEqual(self.count_queries(work_db.date_counts), 1)
+            # a miss also runs the count and checks for archives
+            self.assertEqual(self.count_queries(search), 3)
+            work_db.add_task('Sayumi', 'Typing', 30, date=aug_15)
+            self.assertEqual(search(), 2)
+        stats = work_db.result_cache.stats()
+        self.assertEqual(stats['invalidations'], 3)
+        self.assertGreater(stats['hit_rate'], 0)
+
+    def test_limits(self):
+        cache = work_db.ResultCache(max_entries=2, max_rows=10, ttl=60)
+        cache.enabled = True
+        with test_database(test_db, [Employee, Task]):
+            cache.put('a', 1, {}, {'date'})
+            cache.put('b', 2, {}, {'date'})
+            cache.get('a')
+            cache.put('c', 3, {}, {'date'})
+            self.assertEqual(cache.get('b'), (False, None))
+            self.assertEqual(cache.get('a'), (True, 1))
+            cache.put('d', 4, {}, {'date'}, rows=10)
+            self.assertEqual(len(cache), 1)
+            cache.ttl = 0
+            cache.put('e', 5, {}, {'date'})
+            self.assertEqual(cache.get('e'), (False, None))
+
+    def test_other_connection_clears_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'tasks.db')
+        file_db = SqliteDatabase(path)
+        self.addCleanup(file_db.close)
+        with test_database(file_db, [Employee, Task]):
+            work_db.employee_counts()
+            self.assertEqual(work_db.employee_counts(), [])
+            other = sqlite3.connect(path)
+            other.execute("INSERT INTO employee (name) VALUES ('Rika')")
+            other.execute("INSERT INTO task (employee_id, name, time, date, "
+                          "notes) VALUES (1, 'Typing', 5, '2017-08-15', '')")
+            other.commit()
+            other.close()
+            self.assertEqual(work_db.employee_counts(), [('Rika', 1)])
+
+
+class WorkLogTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.task_search')
+    @patch('work_db.task_entry')
+    @patch('builtins.input', side_effect=['x', 'm', '1', '2', '3'])
+    def test_work_log(self, mock_input, mock_entry, mock_search, mock_stdout):
+        work_db.work_log()
+        self.assertIn("Please", mock_stdout.getvalue())
+        self.assertIn("Select", mock_stdout.getvalue())
+        self.assertTrue(mock_entry.called)
+        work_db.work_log()
+        self.assertTrue(mock_search.called)
+        with self.assertRaises(SystemExit):
+            work_db.work_log()
+
+
+class RunSessionTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['2', '5'] * 2000 + ['3'])
+    def test_long_session_keeps_stack_flat(self, mock_input, mock_stdout):
+        with self.assertRaises(SystemExit):
+            work_db.run_session()
+        self.assertEqual(mock_input.call_count, 4001)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['e', '6', '5', '3'])
+    def test_edit_returns_to_search_menu(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(employee=employee_id('Mai'), name='Acting',
+                        date=datetime.date(2017, 8, 17), time='40',
+                        notes='')
+            with self.assertRaises(SystemExit):
+                work_db.run_session(
+                    lambda: work_db.display_results(list(Task.select())))
+        self.assertIn('Find by date', mock_stdout.getvalue())
+
+
+class TaskEntryTests(unittest.TestCase):
+    @patch('work_db.work_log')
+    @patch('builtins.input',
+           side_effect=['Fred', 'Brewing coffee', '30', 'Starbucks', 'n'])
+    def test_task_entry(self, mock_input, mock_work_log):
+        with test_database(test_db, [Employee, Task]):
+            next_menu = work_db.task_entry()
+            query_count = work_db.search_query(employee='Fred').where(
+                              (Task.name == 'Brewing coffee') &
+                              (Task.time == '30') &
+                              (Task.notes == 'Starbucks')
+                          ).count()
+            self.assertEqual(query_count, 1)
+            self.assertIs(next_menu, mock_work_log)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['Fred Smtih', 'x', '1',
+                                          'Fred Smtih', ''])
+    def test_name_input_suggests_employees(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            work_db.employee_id('Fred Smith')
+            self.assertEqual(work_db.name_input('Name?', employee=True),
+                             'Fred Smith')
+            self.assertEqual(work_db.name_input('Name?', employee=True),
+                             'Fred Smtih')
+        self.assertIn('Did you mean:\n1 - Fred Smith\n',
+                      mock_stdout.getvalue())
+
+
+class EmployeeLookupTests(SchemaTestCase):
+    names = ['Fred Smith', 'Fred Smyth', 'Saki Ikuta', 'Sayumi Ishida']
+
+    def check_matches(self):
+        self.assertEqual(work_db.find_employees('fred smtih'),
+                         ['Fred Smith', 'Fred Smyth'])
+        self.assertEqual(work_db.find_employees('ikuta'), ['Saki Ikuta'])
+        self.assertEqual(work_db.find_employees('Sa'),
+                         ['Saki Ikuta', 'Sayumi Ishida'])
+        self.assertEqual(work_db.find_employees('Tsunku'), [])
+
+    def test_find_employees(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.assertTrue(work_db.employee_index_enabled())
+            work_db.employee_ids(self.names)
+            self.check_matches()
+
+    def test_find_employees_without_index(self):
+        with test_database(test_db, [Employee, Task]):
+            work_db.employee_ids(self.names)
+            self.check_matches()
+
+
+class BatchEntryTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal = os.path.join(directory.name, 'tasks.db.batch.jsonl')
+        patcher = patch('work_db.batch_journal_path',
+                        return_value=self.journal)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.work_log')
+    @patch('builtins.input', side_effect=[
+        'a', 'Fred', 'Brewing coffee', '30', 'Starbucks',
+        'a', 'Fred', 'Pouring coffee', '5', '',
+        'e', '2', '3', '10', 's'])
+    def test_batch_entry(self, mock_input, mock_work_log, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            next_menu = work_db.batch_entry()
+            self.assertIs(next_menu, mock_work_log)
+            self.assertEqual(Task.select().count(), 2)
+            self.assertEqual(Task.get(Task.name == 'Pouring coffee').time,
+                             10)
+        self.assertIn('2: Fred - Pouring coffee (5 min)',
+                      mock_stdout.getvalue())
+        self.assertIn('2 tasks saved', mock_stdout.getvalue())
+        self.assertFalse(os.path.exists(self.journal))
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=[
+        'a', 'Fred', 'Brewing coffee', '30', '', KeyboardInterrupt])
+    def test_unsaved_entries_are_journaled(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            with self.assertRaises(KeyboardInterrupt):
+                work_db.batch_entry()
+            self.assertEqual(Task.select().count(), 0)
+        self.assertEqual(work_db.load_batch_journal(), [
+            {'employee': 'Fred', 'name': 'Brewing coffee', 'time': 30,
+             'notes': ''}])
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['r', '1', 's'])
+    def test_recovered_entries(self, mock_input, mock_stdout):
+        work_db.write_batch_journal([
+            {'employee': 'Fred', 'name': 'Brewing', 'time': 30},
+            {'employee': 'Fred', 'name': 'Pouring', 'time': 5}])
+        with test_database(test_db, [Employee, Task]):
+            work_db.batch_entry()
+            self.assertEqual([task.name for task in Task.select()],
+                             ['Pouring'])
+        self.assertIn('Recovered 2 unsaved tasks', mock_stdout.getvalue())
+
+
+class TaskSearchTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.work_log')
+    @patch('work_db.employee_find')
+    @patch('work_db.exact_find')
+    @patch('work_db.time_find')
+    @patch('work_db.date_find')
+    @patch('builtins.input', side_effect=['x', '1', '2', '3', '4', '5'])
+    def test_task_search(self, mock_input, mock_date_find, mock_time_find,
+                         mock_exact_find, mock_employee_find,
+                         mock_work_log, mock_stdout):
+        work_db.task_search()
+        self.assertIn("Please enter a selection from 1 to 5",
+                      mock_stdout.getvalue())
+        self.assertTrue(mock_date_find.called)
+        work_db.task_search()
+        self.assertTrue(mock_time_find.called)
+        work_db.task_search()
+        self.assertTrue(mock_exact_find.called)
+        work_db.task_search()
+        self.assertTrue(mock_employee_find.called)
+        self.assertIs(work_db.task_search(), mock_work_log)
+
+
+class NumberInputTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['four', '0', '1'])
+    def test_number_input_invalid(self, mock_input, mock_stdout):
+        result = work_db.number_input("Input number")
+        self.assertIn('Enter a valid number', mock_stdout.getvalue())
+        self.assertIn('Enter a valid time', mock_stdout.getvalue())
+        self.assertEqual(result, 1)
+
+
+class NameInputTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['a' * 101, 'Brewing coffee'])
+    def test_long_name_input(self, mock_input, mock_stdout):
+        work_db.name_input('Insert name')
+        self.assertIn('Please enter a name from 1-100 characters in length.',
+                      mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=[' ', 'Brewing coffee'])
+    def test_no_name_input(self, mock_input, mock_stdout):
+        work_db.name_input('Insert name')
+        self.assertIn('Please enter a name from 1-100 characters in length.',
+                      mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['Brewing coffee'])
+    def test_good_name_input(self, mock_input, mock_stdout):
+        self.assertEqual(work_db.name_input('Insert name'), 'Brewing coffee')
+
+
+class DateInputTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['2017-01-33', '2017-01-01'])
+    def test_nonexistent_date(self, mock_input, mock_stdout):
+        work_db.date_input([])
+        self.assertIn('Date must be valid and in format YYYY-MM-DD. ' +
+                      'Try again.', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['2017/01/01', '2017-01-01'])
+    def test_incorrectly_formatted_date(self, mock_input, mock_stdout):
+        work_db.date_input([])
+        self.assertIn('Date must be valid and in format YYYY-MM-DD. ' +
+                      'Try again.', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['2017-01-01'])
+    def test_correct_date_format(self, mock_input, mock_stdout):
+        time = []
+        work_db.date_input(time)
+        self.assertEqual(datetime.datetime.strftime(time[0],
+                         '%Y-%m-%d'), '2017-01-01')
+
+
+class SearchQueryTests(unittest.TestCase):
+    def test_search_query(self):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(employee=employee_id('Kanon'), name='Typing',
+                        date=datetime.date(2017, 8, 15), time='20', notes='')
+            Task.create(employee=employee_id('Kanon'), name='Filing',
+                        date=datetime.date(2017, 8, 17), time='40', notes='')
+            Task.create(employee=employee_id('Ayumi'), name='Filing',
+                        date=datetime.date(2017, 8, 17), time='20', notes='')
+            self.assertEqual(work_db.search_query().count(), 3)
+            self.assertEqual(work_db.search_query(
+                start_date=datetime.date(2017, 8, 16),
+                employee='Kanon').get().name, 'Filing')
+            self.assertEqual(work_db.search_query(
+                end_date=datetime.date(2017, 8, 16), time=20).get().name,
+                'Typing')
+
+
+class PickerQueryTests(unittest.TestCase):
+    def create_tasks(self):
+        Task.create(employee=employee_id('Mizuki'), name='Filing',
+                    date=datetime.date(2017, 8, 15), time='20', notes='')
+        Task.create(employee=employee_id('Haruka'), name='Filing',
+                    date=datetime.date(2017, 8, 15), time='30', notes='')
+        Task.create(employee=employee_id('Mizuki'), name='Typing',
+                    date=datetime.date(2017, 8, 16), time='40', notes='')
+
+    def test_employee_counts(self):
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            self.assertEqual(work_db.employee_counts(),
+                             [('Haruka', 1), ('Mizuki', 2)])
+
+    def test_date_counts(self):
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            self.assertEqual(work_db.date_counts(),
+                             [(datetime.date(2017, 8, 16), 1),
+                              (datetime.date(2017, 8, 15), 2)])
+            self.assertEqual(work_db.date_counts(datetime.date(2017, 8, 10),
+                                                 datetime.date(2017, 8, 15)),
+                             [(datetime.date(2017, 8, 15), 2)])
+
+
+class TextSearchTests(SchemaTestCase):
+    def create_tasks(self):
+        Task.create(employee=employee_id('Yumeno'), name='Answering the phone',
+                    date=datetime.date(2017, 8, 21), time='60',
+                    notes='Customer service')
+        Task.create(employee=employee_id('Yumeno'), name='Filing',
+                    date=datetime.date(2017, 8, 21), time='30',
+                    notes='Answered letters about phone service')
+
+    def test_full_text_search(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.assertTrue(work_db.full_text_enabled())
+            self.create_tasks()
+            names = [task.name for task in work_db.text_search('answer')]
+            self.assertEqual(sorted(names), ['Answering the phone', 'Filing'])
+            names = [task.name for task in work_db.text_search('the pho')]
+            self.assertEqual(names, ['Answering the phone'])
+            Task.update(name='Phoning').where(Task.id == 1).execute()
+            self.assertEqual(work_db.text_search('the pho').count(), 0)
+
+    def test_short_search_matches_substrings(self):
+        with test_database(test_db, schema_models):
+            work_db.ensure_schema()
+            self.create_tasks()
+            names = [task.name for task in work_db.text_search('li')]
+            self.assertEqual(names, ['Filing'])
+
+
+class TaskCursorTests(unittest.TestCase):
+    def test_keyset_pages(self):
+        with test_database(test_db, [Employee, Task]):
+            for day in [18, 15, 17, 15, 16]:
+                Task.create(employee=employee_id('Erina'), name='Ironing',
+                            date=datetime.date(2017, 8, day), time='10',
+                            notes='')
+            cursor = work_db.TaskCursor(Task.select(), page_size=2)
+            self.assertEqual(len(cursor), 5)
+            self.assertEqual([(task.date.day, task.id) for task in cursor],
+                             [(15, 2), (15, 4), (16, 5), (17, 3), (18, 1)])
+
+    def test_ordered_query_pages(self):
+        with test_database(test_db, [Employee, Task]):
+            for name in ['Cleaning', 'Baking', 'Airing']:
+                Task.create(employee=employee_id('Erina'), name=name,
+                            date=datetime.date(2017, 8, 15), time='10',
+                            notes='')
+            query = Task.select().order_by(Task.name)
+            cursor = work_db.TaskCursor(query, page_size=2)
+            self.assertEqual([task.name for task in cursor],
+                             ['Airing', 'Baking', 'Cleaning'])
+
+    def test_time_range_pages(self):
+        with test_database(test_db, [Employee, Task]):
+            for time in [50, 30, 90, 30, 20, 45]:
+                Task.create(employee=employee_id('Erina'), name='Ironing',
+                            date=datetime.date(2017, 8, 15), time=time,
+                            notes='')
+            terms = {'min_time': 30, 'max_time': 60}
+            cursor = work_db.TaskCursor(work_db.search_query(**terms),
+                                        page_size=2, terms=terms,
+                                        order='time')
+            self.assertEqual(len(cursor), 4)
+            self.assertEqual([(task.time, task.id) for task in cursor],
+                             [(30, 2), (30, 4), (45, 6), (50, 1)])
+
+
+class DateFindTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['x', '1', 'one', '2', '1'])
+    def test_single_date_search(self, mock_input,
+                                mock_display_results, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Richard'),
+                name='Xeroxing',
+                date=datetime.date(2017, 8, 18),
+                time='60',
+                notes='Richmeister at the copy machine'
+            )
+            work_db.date_find()
+            self.assertIn('Not a valid selection', mock_stdout.getvalue())
+            self.assertIn('Pick one of the following dates ' +
+                          'to view entries from', mock_stdout.getvalue())
+            self.assertIn('1: 2017-08-18 (1 entry)', mock_stdout.getvalue())
+            self.assertIn('Please enter a valid number',
+                          mock_stdout.getvalue())
+            self.assertTrue(mock_display_results.called)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input',
+           side_effect=['2', '2017-08-16', '2017-08-18', '2'])
+    def test_date_range_search(self, mock_input,
+                               mock_display_results, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Rika'),
+                name='Meeting',
+                date=datetime.date(2017, 8, 16),
+                time='120',
+                notes='Long meeting'
+            )
+            Task.create(
+                employee=employee_id('Ai'),
+                name='Writing report',
+                date=datetime.date(2017, 8, 17),
+                time='30',
+                notes='Report for sales'
+            )
+            work_db.date_find()
+            self.assertNotIn('\nNo results found.\n', mock_stdout.getvalue())
+            self.assertTrue(mock_display_results.called)
+
+
+class TimeFindTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.task_search')
+    @patch('builtins.input', side_effect=['30'])
+    def test_time_find_no_results(self, mock_input, mock_task_search,
+                                  mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Rie'),
+                name='Presentation',
+                date=datetime.date(2017, 8, 18),
+                time='40',
+                notes='Presentation on Asian market'
+            )
+            work_db.time_find()
+            self.assertIn('\nNo results found.\n', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['40'])
+    def test_time_find_with_results(self, mock_input,
+                                    mock_display_results, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Rie'),
+                name='Presentation',
+                date=datetime.date(2017, 8, 18),
+                time='40',
+                notes='Presentation on Asian market'
+            )
+            work_db.time_find()
+            self.assertTrue(mock_display_results.called)
+
+    def create_tasks(self):
+        for time in [10, 40, 75, 300, 500]:
+            Task.create(employee=employee_id('Rie'), name='Presentation',
+                        date=datetime.date(2017, 8, 18), time=time,
+                        notes='')
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['60-30', 'lots', '30-100'])
+    def test_time_find_range(self, mock_input, mock_display_results,
+                             mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            work_db.time_find()
+            results = mock_display_results.call_args[0][0]
+            self.assertEqual([task.time for task in results], [40, 75])
+        self.assertIn('cannot be more', mock_stdout.getvalue())
+        self.assertIn('Enter minutes as', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['h', '9', '4'])
+    def test_time_find_histogram(self, mock_input, mock_display_results,
+                                 mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            self.create_tasks()
+            self.assertEqual(work_db.time_histogram(),
+                             [(1, 14, 1), (30, 59, 1), (60, 119, 1),
+                              (240, 479, 1), (480, None, 1)])
+            work_db.time_find()
+            results = mock_display_results.call_args[0][0]
+            self.assertEqual([task.time for task in results], [300])
+        self.assertIn('240-479 minutes', mock_stdout.getvalue())
+
+    def test_parse_time_range(self):
+        self.assertEqual(work_db.parse_time_range('40'), (40, 40))
+        self.assertEqual(work_db.parse_time_range('30 - 60'), (30, 60))
+        self.assertEqual(work_db.parse_time_range('240+'), (240, None))
+        for text in ['0', '60-', '-30', 'x+']:
+            with self.assertRaises(ValueError):
+                work_db.parse_time_range(text)
+
+
+class ExactFindTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.task_search')
+    @patch('builtins.input', side_effect=['', 'dancing'])
+    def test_exact_find_no_results(self, mock_input,
+                                   mock_task_search, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Yumeno'),
+                name='Answering the phone',
+                date=datetime.date(2017, 8, 21),
+                time='60',
+                notes='Customer service'
+            )
+            next_menu = work_db.exact_find()
+            self.assertIn('Please enter some text to be searched',
+                          mock_stdout.getvalue())
+            self.assertIn('\nNo results found.\n', mock_stdout.getvalue())
+            self.assertIs(next_menu, mock_task_search)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['Answering'])
+    def test_exact_find_with_results(self, mock_input,
+                                     mock_display_results, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Yumeno'),
+                name='Answering the phone',
+                date=datetime.date(2017, 8, 21),
+                time='60',
+                notes='Customer service'
+            )
+            work_db.exact_find()
+            self.assertIn('Number of results = 1', mock_stdout.getvalue())
+            self.assertTrue(mock_display_results.called)
+
+
+class EmployeeFindTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['five', '5', '1'])
+    def test_employee_find(self, mock_input,
+                           mock_display_results, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Kato'),
+                name='Shelving books',
+                date=datetime.date(2017, 8, 15),
+                time='20',
+                notes='LC call numbers'
+            )
+            Task.create(
+                employee=employee_id('Chinami'),
+                name='Reference work',
+                date=datetime.date(2017, 8, 17),
+                time='40',
+                notes='Phone reference work'
+            )
+            work_db.employee_find()
+            self.assertIn('1: Chinami (1 entry)',
+                          mock_stdout.getvalue())
+            self.assertIn('2: Kato (1 entry)',
+                          mock_stdout.getvalue())
+            self.assertIn('Please enter a valid number',
+                          mock_stdout.getvalue())
+            self.assertIn('Please enter a valid number between 1 and 2',
+                          mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.display_results')
+    @patch('builtins.input', side_effect=['Tsunku', 'chinmi', '1'])
+    def test_employee_lookup(self, mock_input, mock_display_results,
+                             mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            for name in ['Kato', 'Chinami', 'Chisato']:
+                Task.create(employee=employee_id(name), name='Filing',
+                            time=20, notes='')
+            with patch('work_db.EMPLOYEE_LIST_SIZE', 2):
+                work_db.employee_find()
+            [(results,), _] = mock_display_results.call_args
+            self.assertEqual(results.terms['employee'], 'Chinami')
+        self.assertIn('No employee names match Tsunku.',
+                      mock_stdout.getvalue())
+        self.assertIn('1: Chinami (1 entry)', mock_stdout.getvalue())
+
+
+class DisplayResultsTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('work_db.task_search')
+    @patch('work_db.delete_entry')
+    @patch('work_db.edit_entry', return_value=None)
+    @patch('builtins.input', side_effect=['e', 'd', 'n', 's'])
+    def test_display_results(self, mock_input, mock_edit_entry,
+                             mock_delete_entry, mock_task_search,
+                             mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Anna'),
+                name='Speaking Russian',
+                date=datetime.date(2017, 8, 15),
+                time='10',
+                notes='FUSHEEMU'
+            )
+            Task.create(
+                employee=employee_id('Akari'),
+                name='Acting',
+                date=datetime.date(2017, 8, 17),
+                time='40',
+                notes='Gintama'
+            )
+            Task.create(
+                employee=employee_id('Airi'),
+                name='Golfing',
+                date=datetime.date(2017, 8, 22),
+                time='180',
+                notes='Bankaa'
+            )
+            Task.create(
+                employee=employee_id('Maimi'),
+                name='Testing okazu',
+                date=datetime.date(2017, 8, 22),
+                time='25',
+                notes='Aji de gallina'
+            )
+            search_results = []
+            query = work_db.task_query().order_by(Employee.name.asc())
+            for result in query:
+                search_results.append(result)
+            next_menu = work_db.display_results(search_results)
+            self.assertIn('''Result 1 of 4\n
+                          Employee name: Airi
+                          Task name: Golfing
+                          Work time: 180
+                          Date: 2017-08-22
+                          Notes: Bankaa
+                          '''.replace(" ", ""),
+                          mock_stdout.getvalue().replace(" ", ""))
+            self.assertTrue(mock_edit_entry.called)
+            self.assertIn('''Result 2 of 4\n
+                          Employee name: Akari
+                          Task name: Acting
+                          Work time: 40
+                          Date: 2017-08-17
+                          Notes: Gintama
+                          '''.replace(" ", ""),
+                          mock_stdout.getvalue().replace(" ", ""))
+            self.assertTrue(mock_delete_entry.called)
+            self.assertIn('''
+                          Result 3 of 4\n
+                          Employee name: Anna
+                          Task name: Speaking Russian
+                          Work time: 10
+                          Date: 2017-08-15
+                          Notes: FUSHEEMU
+                          '''.replace(" ", ""),
+                          mock_stdout.getvalue().replace(" ", ""))
+            self.assertIn('''
+                          Result 4 of 4\n
+                          Employee name: Maimi
+                          Task name: Testing okazu
+                          Work time: 25
+                          Date: 2017-08-22
+                          Notes: Aji de gallina
+                          '''.replace(" ", ""),
+                          mock_stdout.getvalue().replace(" ", ""))
+            self.assertIs(next_menu, mock_task_search)
+
+
+class EditEntryTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['1', '    ', 'Drawing'])
+    def test_edit_entry_name(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Saki'),
+                name='Bowling',
+                date=datetime.date(2017, 8, 22),
+                time='45',
+                notes='Strike')
+            query = Task.get(Task.id == 1)
+            work_db.edit_entry(query)
+            self.assertIn('Please enter non-empty string.',
+                          mock_stdout.getvalue())
+            self.assertEqual(Task.get(Task.id == 1).name, 'Drawing')
+            self.assertIn('Entry edited', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['2', 'ten', '10'])
+    def test_edit_entry_time(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Saki'),
+                name='Bowling',
+                date=datetime.date(2017, 8, 22),
+                time='45',
+                notes='Strike'
+            )
+            query = Task.get(Task.id == 1)
+            work_db.edit_entry(query)
+            self.assertIn("Please enter a valid number",
+                          mock_stdout.getvalue())
+            self.assertEqual(Task.get(Task.id == 1).time, 10)
+            self.assertIn('Entry edited', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['3', '2017/08/21', '2017-08-21'])
+    def test_edit_entry_date(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Saki'),
+                name='Bowling',
+                date=datetime.date(2017, 8, 22),
+                time='45',
+                notes='Strike'
+            )
+            query = Task.get(Task.id == 1)
+            work_db.edit_entry(query)
+            self.assertIn("Dates should be valid and in format YYYY-MM-DD",
+                          mock_stdout.getvalue())
+            self.assertEqual(Task.get(Task.id == 1).date,
+                             datetime.date(2017, 8, 21))
+            self.assertIn('Entry edited', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['4', 'P-league'])
+    def test_edit_entry_notes(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Saki'),
+                name='Bowling',
+                date=datetime.date(2017, 8, 22),
+                time='45',
+                notes='Strike'
+            )
+            query = Task.get(Task.id == 1)
+            work_db.edit_entry(query)
+            self.assertEqual(Task.get(Task.id == 1).notes, 'P-league')
+            self.assertIn('Entry edited', mock_stdout.getvalue())
+
+
+class DeleteEntryTests(unittest.TestCase):
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['y'])
+    def test_delete_entry_confirm(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Kashiyuka'),
+                name='Singing',
+                date=datetime.date(2017, 8, 22),
+                time='5',
+                notes='Autotune'
+            )
+            query = Task.get(Task.id == 1)
+            work_db.delete_entry(query)
+            self.assertEqual(Task.select().count(), 0)
+            self.assertIn('Entry deleted', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    @patch('builtins.input', side_effect=['n'])
+    def test_delete_entry_cancel(self, mock_input, mock_stdout):
+        with test_database(test_db, [Employee, Task]):
+            Task.create(
+                employee=employee_id('Kashiyuka'),
+                name='Singing',
+                date=datetime.date(2017, 8, 22),
+                time='5',
+                notes='Autotune'
+            )
+            query = Task.get(Task.id == 1)
+            work_db.delete_entry(query)
+            self.assertEqual(work_db.search_query(
+                employee='Kashiyuka').count(), 1)
+            self.assertIn('Delete cancelled', mock_stdout.getvalue())
+
+if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
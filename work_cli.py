@@ -0,0 +1,319 @@
+'''Command line interface to the work log for scripts.
+
+Each command does one thing and exits without prompting:
+
+    python work_db.py add --employee Fred --name "Brewing coffee" --time 30
+    python work_db.py search --date-range 2017-08-01 2017-08-31
+    python work_db.py search --employee Fred --text coffee
+    python work_db.py search --time-range 240+
+    python work_db.py search --employee Fred --archived
+    python work_db.py edit 12 --time 45 --notes "Two pots"
+    python work_db.py delete 12
+    python work_db.py bulk-edit --employee "Fred Smtih" --set-employee \
+        "Fred Smith" --dry-run
+    python work_db.py undo-bulk
+    python work_db.py batch operations.txt
+    python work_db.py archive --before 2017-01-01
+    python work_db.py vacuum
+    python work_db.py changes --since 1200
+    python work_db.py compact-changes --before 2017-08-01
+
+Searches print one JSON object per task.  A batch file has one command
+per line, written as it would be on the command line (lines starting
+with # are ignored), and runs in a single transaction: if any line
+fails, none of its changes are kept.  Commands that need transactions
+of their own (batch, archive, vacuum, compact-changes and
+rebuild-rollups) cannot be used in a batch file.
+
+changes prints the tasks written since an entry of the change journal,
+one JSON object per task with the seq of its latest entry; a sync
+passes the last seq it saw as --since next time.
+'''
+import json
+import argparse
+import shlex
+import sys
+
+import work_db
+
+
+class CommandError(Exception):
+    '''A command that cannot be carried out, such as editing a missing task'''
+
+
+def add(args):
+    task = work_db.add_task(args.employee, args.name, args.time, args.notes,
+                            args.date)
+    print(task.id)
+
+
+def search_terms(args):
+    '''Returns the search terms given on the command line as a dict of
+    work_db.search_query() arguments'''
+    start_date, end_date = args.date_range or (None, None)
+    min_time, max_time = args.time_range or (None, None)
+    terms = {'start_date': start_date, 'end_date': end_date,
+             'employee': args.employee, 'time': args.time,
+             'text': args.text, 'min_time': min_time, 'max_time': max_time}
+    return {name: value for name, value in terms.items()
+            if value is not None}
+
+
+def search(args):
+    import work_export
+    terms = search_terms(args)
+    if args.archived:
+        terms['history'] = True
+    terms = work_db.with_archives(terms)
+    query = work_db.search_query(**terms)
+    if args.limit:
+        query = query.limit(args.limit)
+    model = work_db.TaskHistory if terms.get('history') else work_db.Task
+    work_export.write_jsonl(work_export.export_rows(query, model=model),
+                            sys.stdout)
+
+
+def edit(args):
+    changes = {field: getattr(args, field)
+               for field in ('name', 'time', 'date', 'notes')
+               if getattr(args, field) is not None}
+    if not changes:
+        raise CommandError('Give at least one of --name, --time, '
+                           '--date and --notes.')
+    if not work_db.edit_task(args.id, **changes):
+        raise CommandError('No task with id {}.'.format(args.id))
+
+
+def delete(args):
+    if not work_db.delete_task(args.id):
+        raise CommandError('No task with id {}.'.format(args.id))
+
+
+def bulk_edit(args):
+    terms = search_terms(args)
+    changes = {field: getattr(args, 'set_' + field)
+               for field in work_db.BULK_FIELDS
+               if getattr(args, 'set_' + field) is not None}
+    if not terms:
+        raise CommandError('Give at least one search term.')
+    if args.dry_run:
+        work_db.validate_changes(changes)
+        print('{} tasks would change.'.format(work_db.bulk_count(**terms)))
+    else:
+        operation = work_db.bulk_edit(terms, **changes)
+        print('{} tasks changed.'.format(operation.count))
+
+
+def bulk_delete(args):
+    terms = search_terms(args)
+    if not terms:
+        raise CommandError('Give at least one search term.')
+    if args.dry_run:
+        print('{} tasks would be deleted.'.format(
+            work_db.bulk_count(**terms)))
+    else:
+        operation = work_db.bulk_delete(terms)
+        print('{} tasks deleted.'.format(operation.count))
+
+
+def undo_bulk(args):
+    operation = work_db.undo_bulk()
+    if operation is None:
+        raise CommandError('There is no bulk change to undo.')
+    print('Undid the bulk {} of {} tasks.'.format(operation.kind,
+                                                  operation.count))
+
+
+def archive(args):
+    moved = work_db.archive_tasks(args.before)
+    for year, count in sorted(moved.items()):
+        print('{}: {} tasks archived.'.format(year, count))
+    if not moved:
+        print('No tasks to archive.')
+
+
+def changes(args):
+    for row in work_db.changes_since(args.since, args.limit):
+        print(json.dumps(dict(zip(work_db.CHANGE_FIELDS, row))))
+
+
+def compact_changes(args):
+    removed = work_db.compact_changes(args.before)
+    print('{} change journal entries removed.'.format(removed))
+
+
+def vacuum(args):
+    work_db.vacuum()
+    print('Database compacted.')
+
+
+def rebuild_rollups(args):
+    work_db.rebuild_rollups()
+    print('Rollups rebuilt.')
+
+
+def batch(args):
+    with open(args.path) as operations:
+        lines = operations.readlines()
+    work_db.writer.run(_run_lines, lines)
+
+
+def _run_lines(lines):
+    parser = build_parser()
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        try:
+            line_args = parser.parse_args(shlex.split(line))
+            if line_args.command in _NOT_IN_BATCH:
+                raise CommandError('Batch files cannot run {}.'.format(
+                    line_args.command_name))
+            line_args.command(line_args)
+        except (CommandError, ValueError) as error:
+            raise CommandError('line {}: {}'.format(line_number, error))
+
+
+# Commands that cannot share the batch's transaction: VACUUM cannot run
+# inside one, archive commits to other files in steps of its own, and
+# the rest run their own transaction.
+_NOT_IN_BATCH = {batch, vacuum, archive, compact_changes, rebuild_rollups}
+
+
+class _Parser(argparse.ArgumentParser):
+    # Raise instead of exiting so that a bad line in a batch file can be
+    # reported with its line number.
+    def error(self, message):
+        raise CommandError(message)
+
+
+def add_search_arguments(parser):
+    parser.add_argument('--date-range', nargs=2, type=work_db.validate_date,
+                        metavar=('START', 'END'))
+    parser.add_argument('--employee')
+    parser.add_argument('--time', type=work_db.validate_time,
+                        help='exact time spent in minutes')
+    parser.add_argument('--time-range', type=work_db.parse_time_range,
+                        metavar='MIN-MAX',
+                        help='minutes spent, as 30-60 or 240+')
+    parser.add_argument('--text', help='text in the task name or notes')
+
+
+def build_parser():
+    parser = _Parser(
+        prog='work_db.py',
+        description='Add, search, edit and delete work log tasks.')
+    commands = parser.add_subparsers(dest='command_name')
+    commands.required = True
+
+    add_parser = commands.add_parser('add', help='add a task')
+    add_parser.add_argument('--employee', required=True)
+    add_parser.add_argument('--name', required=True)
+    add_parser.add_argument('--time', required=True,
+                            help='time spent in minutes')
+    add_parser.add_argument('--date', type=work_db.validate_date,
+                            metavar='YYYY-MM-DD', help='default: today')
+    add_parser.add_argument('--notes', default='')
+    add_parser.set_defaults(command=add)
+
+    search_parser = commands.add_parser(
+        'search', help='print matching tasks as JSON lines')
+    add_search_arguments(search_parser)
+    search_parser.add_argument('--limit', type=int)
+    search_parser.add_argument('--archived', action='store_true',
+                               help='search archived tasks too (searches '
+                               'of old dates always do)')
+    search_parser.set_defaults(command=search)
+
+    bulk_edit_parser = commands.add_parser(
+        'bulk-edit', help='change every task a search matches at once')
+    add_search_arguments(bulk_edit_parser)
+    for field in work_db.BULK_FIELDS:
+        bulk_edit_parser.add_argument('--set-' + field,
+                                      help='new {}'.format(field))
+    bulk_edit_parser.add_argument('--dry-run', action='store_true',
+                                  help='only count the tasks')
+    bulk_edit_parser.set_defaults(command=bulk_edit)
+
+    bulk_delete_parser = commands.add_parser(
+        'bulk-delete', help='delete every task a search matches at once')
+    add_search_arguments(bulk_delete_parser)
+    bulk_delete_parser.add_argument('--dry-run', action='store_true',
+                                    help='only count the tasks')
+    bulk_delete_parser.set_defaults(command=bulk_delete)
+
+    undo_parser = commands.add_parser(
+        'undo-bulk', help='undo the last bulk edit or delete')
+    undo_parser.set_defaults(command=undo_bulk)
+
+    edit_parser = commands.add_parser('edit', help='change a task')
+    edit_parser.add_argument('id', type=int)
+    edit_parser.add_argument('--name')
+    edit_parser.add_argument('--time')
+    edit_parser.add_argument('--date')
+    edit_parser.add_argument('--notes')
+    edit_parser.set_defaults(command=edit)
+
+    delete_parser = commands.add_parser('delete', help='delete a task')
+    delete_parser.add_argument('id', type=int)
+    delete_parser.set_defaults(command=delete)
+
+    batch_parser = commands.add_parser(
+        'batch', help='run the commands in a file in one transaction')
+    batch_parser.add_argument('path')
+    batch_parser.set_defaults(command=batch)
+
+    archive_parser = commands.add_parser(
+        'archive', help='move old tasks to yearly archive files')
+    archive_parser.add_argument('--before', type=work_db.validate_date,
+                                metavar='YYYY-MM-DD',
+                                help='default: archive_after_days ago')
+    archive_parser.set_defaults(command=archive)
+
+    changes_parser = commands.add_parser(
+        'changes', help='print the tasks written since a journal entry')
+    changes_parser.add_argument('--since', type=int, default=0,
+                                metavar='SEQ',
+                                help='default: 0, every task')
+    changes_parser.add_argument('--limit', type=int)
+    changes_parser.set_defaults(command=changes)
+
+    compact_parser = commands.add_parser(
+        'compact-changes',
+        help='remove change journal entries a sync no longer needs')
+    compact_parser.add_argument('--before', type=work_db.validate_date,
+                                metavar='YYYY-MM-DD',
+                                help='default: {} days ago'.format(
+                                    work_db.CHANGE_KEEP_DAYS))
+    compact_parser.set_defaults(command=compact_changes)
+
+    vacuum_parser = commands.add_parser(
+        'vacuum', help='shrink the database file to fit its tasks')
+    vacuum_parser.set_defaults(command=vacuum)
+
+    rebuild_parser = commands.add_parser(
+        'rebuild-rollups', help='recompute the date and employee rollups')
+    rebuild_parser.set_defaults(command=rebuild_rollups)
+    return parser
+
+
+def run(argv):
+    '''Runs one command against an initialized database,
+    raising CommandError or ValueError if it fails.
+    '''
+    args = build_parser().parse_args(argv)
+    args.command(args)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    work_db.initialize()
+    try:
+        run(argv)
+    except (CommandError, ValueError) as error:
+        print('work_db.py: error: {}'.format(error), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
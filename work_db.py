@@ -1,398 +1,2758 @@
-import sys
-import os
-import datetime
-
-from peewee import *
-
-welcome = '\n***Welcome to Work Database for Python Command Line***\n'
-
-db = SqliteDatabase('tasks.db')
-
-
-class Task(Model):
-    employee = CharField(max_length=100)
-    name = CharField(max_length=100)
-    time = IntegerField(default=0)
-    date = DateField(default=datetime.date.today())
-    notes = TextField()
-
-    class Meta:
-        database = db
-
-
-def initialize():
-    '''Create the database and the table if they don't exist.'''
-    db.connect()
-    db.create_tables([Task], safe=True)
-
-
-def clear():
-    os.system('cls' if os.name == 'nt' else 'clear')
-
-
-def work_log():
-    '''stores information about tasks including name, time spent, and optional
-    notes.  Tasks can be searched, edited, and deleted.
-
-    >>> work_log()
-    >>> 1
-
-    '''
-    menu = """\nSelect from the following options:\n
-      1 - Enter new task
-      2 - Search for existing task
-      3 - Quit\n
-    """
-    print(menu)
-    menu_select = None
-    while not menu_select:
-        menu_select = input('>>>')
-        if menu_select == '1':
-            task_entry()
-        elif menu_select == '2':
-            task_search()
-        elif menu_select == '3':
-            sys.exit(0)
-        elif menu_select.lower() == 'm':
-            print(menu)
-            menu_select = None
-        else:
-            print("Please select an option from 1, 2, 3, m=menu")
-            menu_select = None
-
-
-def task_entry():
-    '''Allows user to enter a task name, time spent, and optional notes'''
-    # define employee, name, time, and notes variables
-    # employee = name = time = notes = None
-    # get input for each of these
-    employee = name_input('Enter employee name (100 characters or less).')
-    name = name_input('Enter a name for the task (100 characters or less).')
-    time = number_input('Enter time spent on task in minutes.')
-    notes = input("Enter any notes about the task (optional).\n>>>")
-    if notes.isspace():
-        notes = None
-    # insert input into file
-    Task.create(employee=employee, name=name, time=time, notes=notes)
-    # Option to add another entry or return to main menu
-    repeat = input("The task was added.  Enter another task? [Y/n]")
-    if repeat.lower() == 'y':
-        task_entry()
-    else:
-        work_log()
-
-
-def task_search():
-    '''Allows user to search, edit, and delete task entries from file'''
-    menu = '''\nSelect from the following options:\n
-        1 - Find by date
-        2 - Find by time spent
-        3 - Find by exact search
-        4 - Find by employee name
-        5 - Return to main menu\n
-    '''
-    print(menu)
-    search_mode = None
-    while not search_mode:
-        search_mode = input('>>>').strip()
-        if search_mode == '1':
-            date_find()
-        elif search_mode == '2':
-            time_find()
-        elif search_mode == '3':
-            exact_find()
-        elif search_mode == '4':
-            employee_find()
-        elif search_mode == '5':
-            work_log()
-        else:
-            print("Please enter a selection from 1 to 5")
-            search_mode = None
-
-
-def number_input(msg):
-    '''Takes string as argument and prints it to solicit input,
-    and tests that input represents an integer
-    '''
-    time = None
-    print(msg)
-    while not time:
-        time = input('>>>').strip()
-        try:
-            time = int(time)
-        except ValueError:
-            print('Enter a valid number.')
-            time = None
-        else:
-            if not time or time < 0:
-                print('Enter a valid time.')
-                time = None
-    return time
-
-
-def name_input(msg):
-    '''Takes string as argument and prints it to solicit name,
-    then checks that input is 100 characters or less in length.
-    '''
-    name = None
-    print(msg)
-    while not name or name.isspace():
-        name = input('>>>').strip()
-        if len(name) > 100 or not name:
-            print('Please enter a name from 1-100 characters in length.')
-            name = None
-    return name
-
-
-def date_input(date_wrapper):
-    '''Asks for date and validates for format YYYY-MM-DD'''
-    # Function takes lists rather than strings since strings are immutable
-    while len(date_wrapper) == 0:
-        try:
-            input_string = input('>>>')
-            date_wrapper.append(datetime.datetime.strptime(
-                                input_string, '%Y-%m-%d'))
-        except ValueError:
-            print('Date must be valid and in format YYYY-MM-DD. Try again.')
-
-
-def date_find():
-    '''Searches for all entries matching a specific date
-    or falling within a date range.
-    '''
-    # Dates are lists so that they can be passed into date_input and modified
-    search_date_1 = []
-    search_date_2 = []
-    search_mode = None
-    while not search_mode:
-        search_mode = input('Enter 1 to browse all dates '
-                            'or 2 to search within a date range.\n>>>').strip()
-        if search_mode not in ['1', '2']:
-            print('Not a valid selection')
-            search_mode = None
-    if search_mode == '2':
-        print('Input start date in format YYYY-MM-DD')
-        date_input(search_date_1)
-        print('Input end date in format YYYY-MM-DD')
-        while not search_date_2:
-            date_input(search_date_2)
-            # make sure search_date1 is no later than search_date2
-            if search_date_1[0].timestamp() > search_date_2[0].timestamp():
-                print('First date cannot be later than second date. '
-                      'Enter end date again.')
-                search_date_2 = []
-    # run search
-    search_results = []
-    tasks = Task.select().order_by(Task.date.desc())
-    if search_mode == '2':
-        tasks = tasks.where(Task.date >= search_date_1[0].date())
-        tasks = tasks.where(Task.date <= search_date_2[0].date())
-    if not tasks.count():
-        print('\nNo results found.\n')
-        task_search()
-    else:
-        entry_dates = []
-        count = 1
-        for task in tasks:
-            if task.date not in entry_dates:
-                entry_dates.append(task.date)
-        print('Pick one of the following dates to view entries from')
-        for date in entry_dates:
-            date_entries_count = Task.select().where(
-                Task.date == str(date)).count()
-            print(str(count) + ": " + str(date) + " (" +
-                  str(date_entries_count) + " entr{})".format(
-                'ies' if date_entries_count > 1 else 'y'))
-            count += 1
-        selection = None
-        print('Enter number corresponding to the desired date.')
-        while not selection:
-            selection = input('>>>').strip()
-            try:
-                selection = int(selection)
-            except ValueError:
-                print('Please enter a valid number')
-                selection = None
-            else:
-                if selection > len(entry_dates) or selection < 0:
-                    print('Please enter a valid number{}'.format(
-                        ' between 1 and {}.'.format(
-                            len(entry_dates)) if len(entry_dates) > 1
-                        else '.'))
-                    selection = None
-        search_results = []
-        query = Task.select().where(
-            Task.date == str(entry_dates[selection - 1]))
-        for result in query:
-            search_results.append(result)
-        display_results(search_results)
-
-
-def time_find():
-    search_results = []
-    search_time = number_input("Enter task time to the nearest minute")
-    query = Task.select().where(Task.time == search_time)
-    for result in query:
-        search_results.append(result)
-    if len(search_results) == 0:
-        print('\nNo results found.\n')
-        task_search()
-    else:
-        display_results(search_results)
-
-
-def exact_find():
-    search_string = None
-    search_results = []
-    print('Enter text to be searched')
-    while search_string is None or search_string.isspace():
-        search_string = input('>>>')
-        if search_string.strip() == '':
-            print("Please enter some text to be searched.")
-            search_string = None
-    query = Task.select().where(
-        (Task.name.contains(search_string)) |
-        (Task.notes.contains(search_string))
-    )
-    for result in query:
-        search_results.append(result)
-    if len(search_results) == 0:
-        print('\nNo results found.\n')
-        task_search()
-    else:
-        print('Number of results = ' + str(len(search_results)))
-        display_results(search_results)
-
-
-def employee_find():
-    tasks = Task.select().order_by(Task.employee.asc())
-    employee_names = []
-    count = 1
-    for task in tasks:
-        if task.employee not in employee_names:
-            employee_names.append(task.employee)
-    print('Pick one of the following employees to view entries from:')
-    for person in employee_names:
-        number_of_entries = Task.select().where(
-            Task.employee == person).count()
-        print(str(count) + ": " + person + " (" + str(number_of_entries)
-              + " entr{})".format('ies' if number_of_entries > 1 else 'y'))
-        count += 1
-    selection = None
-    while not selection:
-        print('Enter number corresponding to the desired employee.')
-        selection = input('>>>').strip()
-        try:
-            selection = int(selection)
-        except ValueError:
-            print('Please enter a valid number')
-            selection = None
-        else:
-            if selection > len(employee_names):
-                print('Please enter a valid number{}'.format(
-                    ' between 1 and {}.'.format(
-                      len(employee_names) if len(employee_names) > 1
-                      else '.')))
-                selection = None
-    search_results = []
-    query = Task.select().where(Task.employee == employee_names[selection - 1])
-    for result in query:
-        search_results.append(result)
-    display_results(search_results)
-
-
-def display_results(results_list):
-    '''Displays search results one by one,
-allowing each entry to be edited or deleted.'''
-    count = 1
-    for entry in results_list:
-        print('''
-            Result {} of {}\n
-            Employee name: {}
-            Task name: {}
-            Work time: {}
-            Date: {}
-            Notes: {}
-'''.format(count, len(results_list), entry.employee, entry.name,
-              entry.time, entry.date, entry.notes))
-        selection = None
-        while not selection:
-            selection = input('Select {}[E]dit entry, '
-                              '[D]elete entry, [S]earch menu \n>>>'
-                              .format('[N]ext result, ' if count <
-                                      len(results_list) else ''))
-            if selection.lower() == 'e':
-                edit_entry(entry)
-            elif selection.lower() == 'd':
-                delete_entry(entry)
-            elif selection.lower() == 's':
-                # quit display results and go back to search menu
-                return task_search()
-            elif selection.lower() != 'n':
-                selection = None
-        count += 1
-    print("\nEnd of search results.\n")
-    task_search()
-
-
-def edit_entry(table_row):
-    '''Allows user to edit specific field of task entry'''
-    field_dict = {'1': 'name', '2': 'time', '3': 'date', '4': 'notes'}
-    field = None
-    while not field:
-        field = input('''Select field to edit: 1 - task name, 2 - time, 3 - date, 4 - notes.
-Enter 5 to go back to search results, 6 to go back to search menu\n>>>''')
-        if field == '5':
-            return
-        if field == '6':
-            return task_search()
-    print('Enter new {}.'.format(field_dict[field]))
-    new_info = None
-    while not new_info:
-        new_info = input('>>>')
-        if new_info.isspace():
-            print('Please enter non-empty string.')
-            new_info = None
-            continue
-        if field == '2':
-            try:
-                new_info = int(new_info)
-            except ValueError:
-                print("Please enter a valid number")
-                new_info = None
-            else:
-                new_info = str(new_info)
-        if field == '3':
-            try:
-                datetime.datetime.strptime(new_info, '%Y-%m-%d')
-            except ValueError:
-                print("Dates should be valid and in format YYYY-MM-DD")
-                new_info = None
-    if field == '1':
-        query = Task.update(name=new_info).where(Task.id == table_row.id)
-    elif field == '2':
-        query = Task.update(time=new_info).where(Task.id == table_row.id)
-    elif field == '3':
-        query = Task.update(date=new_info).where(Task.id == table_row.id)
-    else:
-        query = Task.update(notes=new_info).where(Task.id == table_row.id)
-    query.execute()
-    print("\nEntry edited!\n")
-
-
-def delete_entry(table_row):
-    '''Allows user to delete task entry'''
-    print("Confirm delete? [yN]")
-    confirm = input('>>>')
-    if confirm.lower() == 'y':
-        row = Task.get(Task.id == table_row.id)
-        row.delete_instance()
-        print("\nEntry deleted!\n")
-    else:
-        print("Delete cancelled!\n")
-
-
-if __name__ == "__main__":
-    print(welcome)
-    initialize()
-    work_log()
\ No newline at end of file
+import sys
+import os
+import re
+import datetime
+import threading
+import collections
+import json
+from time import monotonic, sleep
+# Modules that only some features need (configparser, random, queue,
+# concurrent.futures, playhouse.sqlite_ext) are imported where they are
+# used, so that starting the work log does not wait for them.
+
+from peewee import *
+
+import work_trace
+
+welcome = '\n***Welcome to Work Database for Python Command Line***\n'
+
+
+class WorkDatabase(SqliteDatabase):
+    '''The work log's database.
+
+    Every connection it opens gets the pragmas of the connection profile
+    (connection_pragmas), and after check_schema_on_first_query() the
+    first statement it runs brings the schema up to date first.  So
+    nothing opens the database file until something needs it.
+    '''
+    _schema_unchecked = False
+    _schema_lock = threading.Lock()
+    # the thread running ensure_schema(), whose own queries go straight
+    # through; every other thread waits for the lock until it is done
+    _schema_checker = None
+
+    def _connect(self, *args, **kwargs):
+        connection = super()._connect(*args, **kwargs)
+        for name, value in connection_pragmas:
+            connection.execute('PRAGMA {} = {}'.format(name, value))
+        return connection
+
+    def check_schema_on_first_query(self):
+        self._schema_unchecked = True
+
+    def execute_sql(self, sql, *args, **kwargs):
+        if (self._schema_unchecked and
+                self._schema_checker != threading.get_ident()):
+            with self._schema_lock:
+                if self._schema_unchecked:
+                    self._schema_checker = threading.get_ident()
+                    try:
+                        ensure_schema(self)
+                    finally:
+                        self._schema_checker = None
+                    self._schema_unchecked = False
+        return super().execute_sql(sql, *args, **kwargs)
+
+
+db = WorkDatabase('tasks.db')
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# Connection profiles: SQLite pragmas applied to every connection.
+# "durable" never loses a committed task, even on power failure;
+# "throughput" trades that for faster commits and reads (a crash of the
+# operating system can lose the last few commits, but never corrupts).
+PROFILES = {
+    'durable': [
+        ('journal_mode', 'wal'),
+        ('synchronous', 'full'),
+        ('cache_size', '-16000'),
+        ('mmap_size', '0'),
+        ('busy_timeout', '5000'),
+        ('temp_store', 'default'),
+    ],
+    'throughput': [
+        ('journal_mode', 'wal'),
+        ('synchronous', 'normal'),
+        ('cache_size', '-64000'),
+        ('mmap_size', '268435456'),
+        ('busy_timeout', '5000'),
+        ('temp_store', 'memory'),
+    ],
+}
+DEFAULT_PROFILE = 'durable'
+PRAGMA_NAMES = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size',
+                'busy_timeout', 'temp_store']
+CONFIG_FILE = 'work_db.ini'
+
+# Tasks older than this many days are moved to the archive files when
+# archive_tasks() runs, unless the archive_after_days setting says
+# otherwise.
+ARCHIVE_AFTER_DAYS = 365
+archive_after_days = ARCHIVE_AFTER_DAYS
+
+# Pragmas of the profile initialize() connected with, for other threads'
+# connections to use too.
+connection_pragmas = []
+
+
+class Employee(Model):
+    '''Someone who logs tasks.  Tasks refer to their employee by id, so
+    each name is stored once.'''
+    name = CharField(max_length=100, unique=True)
+
+    class Meta:
+        database = db
+
+    def __str__(self):
+        return self.name
+
+
+class Task(Model):
+    # task_employee_date indexes the column
+    employee = ForeignKeyField(Employee, index=False)
+    name = CharField(max_length=100)
+    time = IntegerField(default=0)
+    date = DateField(default=datetime.date.today())
+    notes = TextField()
+
+    class Meta:
+        database = db
+
+
+class ImportProgress(Model):
+    '''Number of rows of each import file that have been committed'''
+    source = CharField(primary_key=True)
+    next_row = IntegerField(default=0)
+
+    class Meta:
+        database = db
+
+
+class BulkOperation(Model):
+    '''A bulk edit or delete, remembered so that it can be undone'''
+    kind = CharField()
+    terms = TextField()
+    changes = TextField(default='')
+    count = IntegerField(default=0)
+    created = DateTimeField(default=datetime.datetime.now)
+    undone = BooleanField(default=False)
+
+    class Meta:
+        database = db
+
+
+class BulkUndoRow(Model):
+    '''A task as it was before a bulk operation changed or deleted it'''
+    operation = ForeignKeyField(BulkOperation)
+    task_id = IntegerField()
+    employee = CharField(max_length=100)
+    name = CharField(max_length=100)
+    time = IntegerField()
+    date = DateField()
+    notes = TextField()
+
+    class Meta:
+        database = db
+        indexes = ((('operation', 'task_id'), True),)
+
+
+class DailyRollup(Model):
+    '''Number of entries and minutes worked on each date'''
+    date = DateField(primary_key=True)
+    entries = IntegerField(default=0)
+    minutes = IntegerField(default=0)
+
+    class Meta:
+        database = db
+
+
+class EmployeeRollup(Model):
+    '''Number of entries and minutes worked by each employee'''
+    employee = ForeignKeyField(Employee, primary_key=True)
+    entries = IntegerField(default=0)
+    minutes = IntegerField(default=0)
+
+    class Meta:
+        database = db
+
+
+class TaskIndex(Model):
+    '''Full-text index over task names and notes (SQLite FTS5).
+    It only exists when the SQLite library was built with FTS5.
+    '''
+    rowid = IntegerField(primary_key=True)
+    name = TextField()
+    notes = TextField()
+    # Hidden FTS5 columns: the one named after the table takes MATCH
+    # queries, and rank is the relevance of each match (lower is better).
+    taskindex = TextField()
+    rank = FloatField()
+
+    class Meta:
+        database = db
+
+
+class ArchivePartition(Model):
+    '''A year of old tasks moved out of the task table into a database
+    file of its own (see archive_tasks)'''
+    year = IntegerField(primary_key=True)
+    path = CharField()
+    rows = IntegerField(default=0)
+    # rows copied by archive runs up to this one are shown; later ones
+    # are left over from a run that did not finish
+    last_run = IntegerField(default=0)
+    # the archive only holds tasks dated before this
+    archived_before = DateField()
+
+    class Meta:
+        database = db
+
+
+class TaskChange(Model):
+    '''A write to the task table, in the change journal that triggers
+    append to (see changes_since).  kind is insert, update, delete, or
+    archive for a task that archive_tasks() moved out.  seq is never
+    used again, even for entries that compaction removes.
+    '''
+    seq = AutoField()
+    task_id = IntegerField()
+    kind = CharField()
+    changed = DateTimeField()
+
+    class Meta:
+        database = db
+
+
+class ChangeCompaction(Model):
+    '''A compaction of the change journal that removed the entries of
+    deleted tasks, up to and including seq through'''
+    through = IntegerField()
+    created = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = db
+
+
+class TaskHistory(Model):
+    '''Every task, in the task table or archived: a temporary view that
+    attach_archives() creates on each connection.  archive is the year of
+    the archive holding the task, or 0 for the task table.
+    '''
+    employee = CharField(max_length=100)
+    name = CharField(max_length=100)
+    time = IntegerField()
+    date = DateField()
+    notes = TextField()
+    archive = IntegerField()
+
+    class Meta:
+        database = db
+
+
+# Search strings shorter than this are matched as plain substrings, since
+# the full-text index only matches from the start of a word.
+FULL_TEXT_MIN_LENGTH = 3
+
+_FULL_TEXT_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS taskindex "
+    "USING fts5(name, notes, content='task', content_rowid='id')")
+
+# The insert trigger comes first, for load_tasks() to find.
+_FULL_TEXT_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS task_index_insert AFTER INSERT ON task '
+    'BEGIN INSERT INTO taskindex (rowid, name, notes) '
+    'VALUES (NEW.id, NEW.name, NEW.notes); END',
+    'CREATE TRIGGER IF NOT EXISTS task_index_delete AFTER DELETE ON task '
+    "BEGIN INSERT INTO taskindex (taskindex, rowid, name, notes) "
+    "VALUES ('delete', OLD.id, OLD.name, OLD.notes); END",
+    'CREATE TRIGGER IF NOT EXISTS task_index_update '
+    'AFTER UPDATE OF name, notes ON task '
+    "BEGIN INSERT INTO taskindex (taskindex, rowid, name, notes) "
+    "VALUES ('delete', OLD.id, OLD.name, OLD.notes); "
+    'INSERT INTO taskindex (rowid, name, notes) '
+    'VALUES (NEW.id, NEW.name, NEW.notes); END',
+]
+
+
+_EMPLOYEE_INDEX_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS employeeindex USING fts5(name, "
+    "content='employee', content_rowid='id', tokenize='trigram')")
+
+_EMPLOYEE_INDEX_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS employee_index_insert '
+    'AFTER INSERT ON employee '
+    'BEGIN INSERT INTO employeeindex (rowid, name) '
+    'VALUES (NEW.id, NEW.name); END',
+    'CREATE TRIGGER IF NOT EXISTS employee_index_delete '
+    'AFTER DELETE ON employee '
+    "BEGIN INSERT INTO employeeindex (employeeindex, rowid, name) "
+    "VALUES ('delete', OLD.id, OLD.name); END",
+    'CREATE TRIGGER IF NOT EXISTS employee_index_update '
+    'AFTER UPDATE OF name ON employee '
+    "BEGIN INSERT INTO employeeindex (employeeindex, rowid, name) "
+    "VALUES ('delete', OLD.id, OLD.name); "
+    'INSERT INTO employeeindex (rowid, name) '
+    'VALUES (NEW.id, NEW.name); END',
+]
+
+
+# The change journal is made with SQL rather than from TaskChange, for
+# AUTOINCREMENT, which keeps seq from going back when entries are removed.
+_CHANGE_TABLE = [
+    'CREATE TABLE IF NOT EXISTS taskchange ('
+    'seq INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER NOT NULL, '
+    'kind VARCHAR(255) NOT NULL, changed DATETIME NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS taskchange_task_id_seq '
+    'ON taskchange (task_id, seq)',
+]
+
+# The insert trigger comes first, for load_tasks() to find.
+_CHANGE_TRIGGERS = [
+    'CREATE TRIGGER IF NOT EXISTS task_change_{0} AFTER {1} ON task '
+    'BEGIN INSERT INTO taskchange (task_id, kind, changed) '
+    "VALUES ({2}.id, '{0}', datetime('now', 'localtime')); END"
+    .format(kind, kind.upper(), row)
+    for kind, row in [('insert', 'NEW'), ('update', 'NEW'),
+                      ('delete', 'OLD')]
+]
+
+
+# Statements that add one task's totals to ("+") or take them away from
+# ("-") the rollup rows for its date and employee.  The triggers below
+# fill in NEW or OLD for the row being written, and the name of the
+# employee column: employee_id, or employee before _normalize_employees.
+_ROLLUP_STATEMENTS = '''
+    INSERT OR IGNORE INTO dailyrollup (date, entries, minutes)
+        VALUES ({row}.date, 0, 0);
+    UPDATE dailyrollup
+        SET entries = entries {sign} 1, minutes = minutes {sign} {row}.time
+        WHERE date = {row}.date;
+    DELETE FROM dailyrollup WHERE date = {row}.date AND entries <= 0;
+    INSERT OR IGNORE INTO employeerollup ({employee}, entries, minutes)
+        VALUES ({row}.{employee}, 0, 0);
+    UPDATE employeerollup
+        SET entries = entries {sign} 1, minutes = minutes {sign} {row}.time
+        WHERE {employee} = {row}.{employee};
+    DELETE FROM employeerollup
+        WHERE {employee} = {row}.{employee} AND entries <= 0;
+'''
+
+
+def _rollup_triggers(employee='employee_id'):
+    def statements(row, sign):
+        return _ROLLUP_STATEMENTS.format(row=row, sign=sign,
+                                         employee=employee)
+    return [
+        'CREATE TRIGGER IF NOT EXISTS task_rollup_insert AFTER INSERT ON task '
+        'BEGIN {} END'.format(statements('NEW', '+')),
+        'CREATE TRIGGER IF NOT EXISTS task_rollup_delete AFTER DELETE ON task '
+        'BEGIN {} END'.format(statements('OLD', '-')),
+        'CREATE TRIGGER IF NOT EXISTS task_rollup_update '
+        'AFTER UPDATE OF {}, date, time ON task '
+        'BEGIN {} {} END'.format(employee, statements('OLD', '-'),
+                                 statements('NEW', '+')),
+    ]
+
+
+def rebuild_rollups(database=None):
+    '''Recomputes the date and employee rollups from scratch'''
+    _rebuild_rollups(database or Task._meta.database, 'employee_id')
+
+
+def _rebuild_rollups(database, employee):
+    with database.atomic():
+        database.execute_sql('DELETE FROM dailyrollup')
+        database.execute_sql('DELETE FROM employeerollup')
+        database.execute_sql(
+            'INSERT INTO dailyrollup (date, entries, minutes) '
+            'SELECT date, COUNT(*), SUM(time) FROM task GROUP BY date')
+        database.execute_sql(
+            'INSERT INTO employeerollup ({0}, entries, minutes) '
+            'SELECT {0}, COUNT(*), SUM(time) FROM task GROUP BY {0}'
+            .format(employee))
+
+
+def _add_search_indexes(database):
+    '''Indexes the columns used by date_find, employee_find and time_find.'''
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS task_date_id ON task (date, id)')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS task_employee_date '
+        'ON task (employee, date)')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS task_time ON task (time)')
+
+
+# Indexes of the task table at the latest schema version.
+_TASK_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS task_date_id ON task (date, id)',
+    'CREATE INDEX IF NOT EXISTS task_employee_date '
+    'ON task (employee_id, date)',
+    'CREATE INDEX IF NOT EXISTS task_time ON task (time)',
+]
+
+
+# Each migration upgrades the schema by one version, in order.  Append new
+# migrations to the end; never reorder or edit ones that have shipped.
+def _add_rollups(database):
+    '''Adds date and employee rollups that triggers keep current.'''
+    database.create_tables([DailyRollup], safe=True)
+    # the employee rollup as this migration first made it, keyed by name;
+    # EmployeeRollup has changed since
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS employeerollup (employee VARCHAR(100) '
+        'NOT NULL PRIMARY KEY, entries INTEGER NOT NULL, '
+        'minutes INTEGER NOT NULL)')
+    for trigger in _rollup_triggers('employee'):
+        database.execute_sql(trigger)
+    _rebuild_rollups(database, 'employee')
+
+
+def _add_full_text_index(database):
+    '''Adds the full-text index if SQLite supports FTS5.'''
+    try:
+        database.execute_sql(_FULL_TEXT_TABLE)
+    except OperationalError:
+        # no FTS5 module: exact_find keeps using substring matches
+        return
+    for trigger in _FULL_TEXT_TRIGGERS:
+        database.execute_sql(trigger)
+    database.execute_sql(
+        "INSERT INTO taskindex (taskindex) VALUES ('rebuild')")
+
+
+def _add_import_progress(database):
+    '''Adds the table that lets bulk imports resume.'''
+    database.create_tables([ImportProgress], safe=True)
+
+
+def _add_bulk_undo(database):
+    '''Adds the undo journal of bulk edits and deletes.'''
+    database.create_tables([BulkOperation, BulkUndoRow], safe=True)
+
+
+def _add_archive_partitions(database):
+    '''Adds the list of archive files that old tasks are moved to.'''
+    database.create_tables([ArchivePartition], safe=True)
+
+
+def _normalize_employees(database):
+    '''Moves employee names into the employee table, so that each task
+    keeps only the integer id of its employee.'''
+    database.create_tables([Employee], safe=True)
+    # the undo journal keeps names, which undoing turns back into ids
+    for table in ('task', 'bulkundorow'):
+        database.execute_sql(
+            'INSERT OR IGNORE INTO employee (name) '
+            'SELECT employee FROM {0} GROUP BY employee'.format(table))
+    # SQLite cannot change a column in place, so the tasks are copied to
+    # a new table.  Renaming the old one takes its indexes and triggers
+    # with it, and they are dropped along with it.
+    database.execute_sql('ALTER TABLE task RENAME TO task_by_name')
+    database.create_tables([Task])
+    database.execute_sql(
+        'INSERT INTO task (id, employee_id, name, time, date, notes) '
+        'SELECT old.id, employee.id, old.name, old.time, old.date, '
+        'old.notes FROM task_by_name AS old '
+        'JOIN employee ON employee.name = old.employee')
+    database.execute_sql('DROP TABLE task_by_name')
+    database.execute_sql('DROP TABLE employeerollup')
+    database.create_tables([EmployeeRollup])
+    _add_task_triggers(database)
+    rebuild_rollups(database)
+
+
+def _add_employee_index(database):
+    '''Adds the trigram index of employee names if SQLite supports it.'''
+    try:
+        database.execute_sql(_EMPLOYEE_INDEX_TABLE)
+    except OperationalError:
+        # no FTS5, or SQLite older than 3.34 without its trigram
+        # tokenizer: find_employees compares every name instead
+        return
+    for trigger in _EMPLOYEE_INDEX_TRIGGERS:
+        database.execute_sql(trigger)
+    database.execute_sql(
+        "INSERT INTO employeeindex (employeeindex) VALUES ('rebuild')")
+
+
+def _add_change_journal(database):
+    '''Adds the change journal, starting it with an insert entry for
+    every task, so that changes since 0 are all of them.'''
+    database.create_tables([ChangeCompaction], safe=True)
+    for statement in _CHANGE_TABLE + _CHANGE_TRIGGERS:
+        database.execute_sql(statement)
+    database.execute_sql(
+        "INSERT INTO taskchange (task_id, kind, changed) "
+        "SELECT id, 'insert', datetime('now', 'localtime') FROM task "
+        "WHERE NOT EXISTS (SELECT 1 FROM taskchange) ORDER BY id")
+
+
+def _add_task_triggers(database):
+    # the latest indexes and triggers of the task table; ids are kept, so
+    # the full-text index still matches it
+    for statement in _TASK_INDEXES + _rollup_triggers():
+        database.execute_sql(statement)
+    if full_text_enabled(database):
+        for trigger in _FULL_TEXT_TRIGGERS:
+            database.execute_sql(trigger)
+
+
+MIGRATIONS = [
+    _add_search_indexes,
+    _add_rollups,
+    _add_full_text_index,
+    _add_import_progress,
+    _add_bulk_undo,
+    _add_archive_partitions,
+    _normalize_employees,
+    _add_employee_index,
+    _add_change_journal,
+]
+
+# First schema version at which the rollup tables can be read.
+ROLLUP_VERSION = MIGRATIONS.index(_add_rollups) + 1
+# First schema version that can have archives.
+ARCHIVE_VERSION = MIGRATIONS.index(_add_archive_partitions) + 1
+
+# Every table of the latest schema version but the full-text indexes
+# and the change journal.
+SCHEMA_MODELS = [Employee, Task, DailyRollup, EmployeeRollup,
+                 ImportProgress, BulkOperation, BulkUndoRow, ArchivePartition,
+                 ChangeCompaction]
+
+
+def schema_version(database=None):
+    '''Returns the schema version recorded in the database file'''
+    database = database or Task._meta.database
+    return database.execute_sql('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(database=None):
+    '''Brings an existing database up to the latest schema version,
+    running every migration it has not seen yet in a single transaction.
+    '''
+    database = database or Task._meta.database
+    current = schema_version(database)
+    if current >= len(MIGRATIONS):
+        return current
+    # the models are bound to the database for the migrations, so that
+    # the tables they create are made in it and not in their own
+    with database.atomic(), database.bind_ctx(SCHEMA_MODELS):
+        for version in range(current, len(MIGRATIONS)):
+            MIGRATIONS[version](database)
+        database.execute_sql(
+            'PRAGMA user_version = {}'.format(len(MIGRATIONS)))
+    return len(MIGRATIONS)
+
+
+def create_schema(database=None):
+    '''Creates the latest schema in a new database at once, instead of
+    running every migration.  Tables that exist already are kept, so the
+    rollups and the full-text index are built from any tasks in them.
+    '''
+    database = database or Task._meta.database
+    with database.atomic(), database.bind_ctx(SCHEMA_MODELS):
+        database.create_tables(SCHEMA_MODELS, safe=True)
+        _add_full_text_index(database)
+        _add_employee_index(database)
+        _add_task_triggers(database)
+        _add_change_journal(database)
+        rebuild_rollups(database)
+        database.execute_sql(
+            'PRAGMA user_version = {}'.format(len(MIGRATIONS)))
+    return len(MIGRATIONS)
+
+
+def vacuum(database=None):
+    '''Rewrites the database file without the free pages left by deleted
+    rows and old tables, such as the task table _normalize_employees()
+    replaces'''
+    database = database or Task._meta.database
+    database.execute_sql('VACUUM')
+
+
+def load_profile(environ=None):
+    '''Returns the database path and pragmas to connect with, as a dict.
+
+    Settings come from the [database] section of the config file (the
+    WORK_DB_CONFIG environment variable, or work_db.ini if it exists),
+    then from WORK_DB_* environment variables, which win.  "profile"
+    picks a preset from PROFILES, and "path" or any pragma in
+    PRAGMA_NAMES overrides it, e.g. WORK_DB_SYNCHRONOUS=normal.
+    "archive_after_days" is the age at which archive_tasks() archives
+    tasks.
+    '''
+    environ = os.environ if environ is None else environ
+    settings = {}
+    config_path = environ.get('WORK_DB_CONFIG', CONFIG_FILE)
+    if os.path.exists(config_path):
+        import configparser
+        config = configparser.ConfigParser()
+        if config.read(config_path) and config.has_section('database'):
+            settings.update(config.items('database'))
+    for key in ['path', 'profile', 'archive_after_days'] + PRAGMA_NAMES:
+        if 'WORK_DB_' + key.upper() in environ:
+            settings[key] = environ['WORK_DB_' + key.upper()]
+    profile_name = settings.get('profile', DEFAULT_PROFILE)
+    if profile_name not in PROFILES:
+        raise ValueError('Unknown database profile {!r}; choose from {}.'
+                         .format(profile_name, ', '.join(sorted(PROFILES))))
+    pragmas = []
+    for name, value in PROFILES[profile_name]:
+        value = str(settings.get(name, value)).strip()
+        # pragma values are spliced into SQL, so only allow plain words
+        if not re.match(r'^-?\w+$', value):
+            raise ValueError('Bad value {!r} for pragma {}.'.format(value,
+                                                                    name))
+        pragmas.append((name, value))
+    try:
+        after_days = int(settings.get('archive_after_days',
+                                      ARCHIVE_AFTER_DAYS))
+    except ValueError:
+        raise ValueError('archive_after_days must be a number of days.')
+    return {'path': settings.get('path', 'tasks.db'), 'pragmas': pragmas,
+            'archive_after_days': after_days}
+
+
+def apply_pragmas(database, pragmas):
+    '''Sets pragmas on the database's current connection'''
+    for name, value in pragmas:
+        database.execute_sql('PRAGMA {} = {}'.format(name, value))
+
+
+def is_busy_error(error):
+    '''Returns True if an OperationalError means another connection
+    holds the lock SQLite needs'''
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class WriteCoordinator:
+    '''Runs database writes so that several processes can share the file.
+
+    Each write runs in a transaction that takes the write lock as it
+    begins (BEGIN IMMEDIATE), so it cannot deadlock half way through.  If
+    another process holds the lock past the connection's busy_timeout,
+    the transaction is retried after an exponential, jittered backoff.
+
+    run() writes in the calling thread.  After start(), submit() and
+    write() hand writes to a writer thread, which commits the writes that
+    arrive within batch_window seconds of each other in one transaction,
+    so a burst of writes pays for one commit.  stats() reports how long
+    writes waited for the lock.
+    '''
+    def __init__(self, database=None, batch_window=0.002, max_batch=500,
+                 max_attempts=10, backoff=0.01, max_backoff=1.0):
+        self.database = database
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queue = None
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'transactions': 0,
+            'writes': 0,
+            'busy_retries': 0,
+            'failed_transactions': 0,
+            'lock_wait_seconds': 0.0,
+            'max_lock_wait_seconds': 0.0,
+        }
+
+    def _database(self):
+        return self.database or Task._meta.database
+
+    def stats(self):
+        '''Returns a copy of the write and lock wait counters'''
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, **amounts):
+        with self._stats_lock:
+            for key, amount in amounts.items():
+                self._stats[key] += amount
+
+    def _transaction(self, writes):
+        '''Runs (func, args, kwargs) writes in one transaction, retrying
+        while the database is busy.  Returns their results.'''
+        database = self._database()
+        if database.transaction_depth():
+            # already inside the caller's transaction, which has the lock
+            return [func(*args, **kwargs) for func, args, kwargs in writes]
+        waited = 0.0
+        for attempt in range(self.max_attempts):
+            started = monotonic()
+            try:
+                with database.transaction('IMMEDIATE'):
+                    waited += monotonic() - started
+                    started = None
+                    results = [func(*args, **kwargs)
+                               for func, args, kwargs in writes]
+            except OperationalError as error:
+                if started is not None:
+                    waited += monotonic() - started
+                if (not is_busy_error(error) or
+                        attempt == self.max_attempts - 1):
+                    self._count(failed_transactions=1,
+                                lock_wait_seconds=waited)
+                    raise
+                import random
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)
+                self._count(busy_retries=1)
+                sleep(delay)
+                waited += delay
+            else:
+                self._count(transactions=1, writes=len(writes),
+                            lock_wait_seconds=waited)
+                with self._stats_lock:
+                    self._stats['max_lock_wait_seconds'] = max(
+                        self._stats['max_lock_wait_seconds'], waited)
+                return results
+
+    def run(self, func, *args, **kwargs):
+        '''Runs one write in its own transaction in this thread'''
+        return self._transaction([(func, args, kwargs)])[0]
+
+    def submit(self, func, *args, **kwargs):
+        '''Queues a write for the writer thread, returning a Future'''
+        if not self._thread:
+            raise RuntimeError('The writer thread has not been started.')
+        from concurrent.futures import Future
+        future = Future()
+        self._queue.put((future, (func, args, kwargs)))
+        return future
+
+    def write(self, func, *args, **kwargs):
+        '''Runs a write through the writer thread if it is running,
+        otherwise in this thread, and returns its result'''
+        if self._thread:
+            return self.submit(func, *args, **kwargs).result()
+        return self.run(func, *args, **kwargs)
+
+    def start(self):
+        '''Starts the writer thread, which has its own connection'''
+        if self._thread:
+            return
+        import queue
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_batches,
+                                        name='work-db-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        '''Commits queued writes and stops the writer thread'''
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = self._queue = None
+
+    def _next_batch(self):
+        import queue
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(
+                    timeout=max(0, deadline - monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                # finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _write_batches(self):
+        database = self._database()
+        database.connect()
+        apply_pragmas(database, connection_pragmas)
+        try:
+            batch = self._next_batch()
+            while batch is not None:
+                self._commit_batch(batch)
+                batch = self._next_batch()
+        finally:
+            database.close()
+
+    def _commit_batch(self, batch):
+        futures = [future for future, write in batch]
+        try:
+            results = self._transaction([write for future, write in batch])
+        except Exception as error:
+            if len(batch) == 1:
+                futures[0].set_exception(error)
+                return
+            # one bad write spoils the group, so give each its own
+            # transaction to find out which
+            for item in batch:
+                self._commit_batch([item])
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+
+# Every write from the work log goes through this coordinator.
+writer = WriteCoordinator()
+
+
+def initialize(profile=None):
+    '''Points the work log at the database of the given profile, or the
+    one load_profile() finds.  Nothing is opened yet: the first query
+    connects with the profile's pragmas and runs ensure_schema().'''
+    global archive_after_days
+    profile = profile or load_profile()
+    db.init(profile['path'])
+    connection_pragmas[:] = profile['pragmas']
+    archive_after_days = profile.get('archive_after_days',
+                                     ARCHIVE_AFTER_DAYS)
+    db.check_schema_on_first_query()
+
+
+def ensure_schema(database=None):
+    '''Creates the database and its tables if they don't exist, or
+    upgrades the schema of an existing one to the latest version.  When
+    the stored schema version is already the latest, this is a single
+    PRAGMA.'''
+    database = database or Task._meta.database
+    version = schema_version(database)
+    if version >= len(MIGRATIONS):
+        return
+    columns = [column.name for column in database.get_columns('task')]
+    if version == 0 and 'employee' not in columns:
+        # no task table from before the migrations to upgrade
+        create_schema(database)
+    else:
+        migrate(database)
+
+
+def main(argv):
+    '''Runs the interactive work log, or the command given on the
+    command line (see work_cli).'''
+    if argv:
+        import work_cli
+        return work_cli.main(argv)
+    initialize()
+    result_cache.enabled = True
+    tracing = work_trace.start(db, os.environ.get('WORK_DB_TRACE'))
+    print(welcome)
+    try:
+        run_session()
+    finally:
+        work_trace.finish()
+        if tracing:
+            print('Result cache: {hits} hits, {misses} misses '
+                  '({hit_rate:.0%}), {invalidations} invalidated, '
+                  '{evictions} evicted'.format(**result_cache.stats()),
+                  file=sys.stderr)
+
+
+def run_session(state=None):
+    '''Shows menus until the user quits.
+
+    Each menu returns the next menu to show instead of calling it, and this
+    loop calls it, so the stack stays the same depth however long the
+    session runs.
+    '''
+    state = state or work_log
+    while state:
+        with work_trace.action(getattr(state, '__name__', 'menu')):
+            state = state()
+
+
+def clear():
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+
+def work_log():
+    '''stores information about tasks including name, time spent, and optional
+    notes.  Tasks can be searched, edited, and deleted.
+    Returns the next menu for run_session to show.
+
+    >>> work_log()
+    >>> 1
+
+    '''
+    menu = """\nSelect from the following options:\n
+      1 - Enter new task
+      2 - Search for existing task
+      3 - Quit
+      4 - Enter a batch of tasks, saved together\n
+    """
+    print(menu)
+    menu_select = None
+    while not menu_select:
+        menu_select = input('>>>')
+        if menu_select == '1':
+            return task_entry()
+        elif menu_select == '2':
+            return task_search()
+        elif menu_select == '3':
+            sys.exit(0)
+        elif menu_select == '4':
+            return batch_entry()
+        elif menu_select.lower() == 'm':
+            print(menu)
+            menu_select = None
+        else:
+            print("Please select an option from 1, 2, 3, 4, m=menu")
+            menu_select = None
+
+
+def task_input():
+    '''Asks for an employee, task name, time spent and optional notes,
+    and returns them in a dict'''
+    employee = name_input('Enter employee name (100 characters or less).',
+                          employee=True)
+    name = name_input('Enter a name for the task (100 characters or less).')
+    time = number_input('Enter time spent on task in minutes.')
+    notes = input("Enter any notes about the task (optional).\n>>>")
+    if notes.isspace():
+        notes = None
+    return {'employee': employee, 'name': name, 'time': time,
+            'notes': notes}
+
+
+@work_trace.traced
+def task_entry():
+    '''Allows user to enter a task name, time spent, and optional notes'''
+    entry = task_input()
+    # insert input into file
+    add_task(**entry)
+    # Option to add another entry or return to main menu
+    repeat = input("The task was added.  Enter another task? [Y/n]")
+    if repeat.lower() == 'y':
+        return task_entry
+    else:
+        return work_log
+
+
+def batch_journal_path():
+    '''Returns the file where batch_entry keeps tasks not yet saved'''
+    return Task._meta.database.database + '.batch.jsonl'
+
+
+def load_batch_journal():
+    '''Returns the tasks left in the batch journal by a session that
+    ended before saving them'''
+    try:
+        with open(batch_journal_path()) as journal:
+            return [json.loads(line) for line in journal if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def write_batch_journal(entries):
+    '''Replaces the batch journal with entries, or removes it if there
+    are none.  The new journal is written beside the old one and renamed
+    over it, so a crash leaves one or the other intact.'''
+    path = batch_journal_path()
+    if not entries:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path + '.tmp', 'w') as journal:
+        for entry in entries:
+            journal.write(json.dumps(entry) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def save_batch(entries):
+    '''Checks every entry, saves them all in one transaction and clears
+    the batch journal.  Returns the number saved.'''
+    tasks = []
+    for entry in entries:
+        task = {
+            'employee': validate_name(entry['employee']),
+            'name': validate_name(entry['name']),
+            'time': validate_time(entry['time']),
+            'notes': entry.get('notes') or '',
+            'date': datetime.date.today(),
+        }
+        if entry.get('date'):
+            task['date'] = validate_date(entry['date'])
+        tasks.append(task)
+    writer.run(insert_tasks, tasks)
+    write_batch_journal([])
+    return len(tasks)
+
+
+def print_pending(entries):
+    print('\nTasks waiting to be saved:')
+    if not entries:
+        print('  (none)')
+    for number, entry in enumerate(entries, 1):
+        print('  {}: {} - {} ({} min){}'.format(
+            number, entry['employee'], entry['name'], entry['time'],
+            ', ' + entry['notes'] if entry.get('notes') else ''))
+
+
+def pending_number_input(entries):
+    '''Asks which pending task to change; returns its index or None'''
+    print('Enter the number of the task, or press enter to go back.')
+    while True:
+        selection = input('>>>').strip()
+        if not selection:
+            return None
+        try:
+            selection = int(selection)
+        except ValueError:
+            selection = 0
+        if 1 <= selection <= len(entries):
+            return selection - 1
+        print('Please enter a number from 1 to {}.'.format(len(entries)))
+
+
+def edit_pending(entry):
+    '''Asks for a new value for one field of a pending task'''
+    field = None
+    while field not in ('1', '2', '3', '4'):
+        field = input('Select field to edit: 1 - employee, 2 - task name, '
+                      '3 - time, 4 - notes\n>>>').strip()
+    if field == '1':
+        entry['employee'] = name_input('Enter employee name.',
+                                       employee=True)
+    elif field == '2':
+        entry['name'] = name_input('Enter a name for the task.')
+    elif field == '3':
+        entry['time'] = number_input('Enter time spent on task in minutes.')
+    else:
+        entry['notes'] = input('Enter notes about the task.\n>>>')
+
+
+@work_trace.traced
+def batch_entry():
+    '''Lets the user enter several tasks, review and correct them, and
+    then save them all at once in a single transaction.
+
+    Tasks are kept in a journal file until they are saved, so tasks
+    entered before a crash are offered again the next time.
+    '''
+    entries = load_batch_journal()
+    if entries:
+        print('\nRecovered {} unsaved task{} from an earlier session.'
+              .format(len(entries), 's' if len(entries) > 1 else ''))
+    while True:
+        print_pending(entries)
+        selection = input('\n[A]dd task, [E]dit task, [R]emove task, '
+                          '[S]ave all, [D]iscard all\n>>>').strip().lower()
+        if selection == 'a':
+            entries.append(task_input())
+        elif selection == 'e' and entries:
+            index = pending_number_input(entries)
+            if index is not None:
+                edit_pending(entries[index])
+        elif selection == 'r' and entries:
+            index = pending_number_input(entries)
+            if index is not None:
+                del entries[index]
+        elif selection == 's':
+            print('\n{} task{} saved.\n'.format(
+                save_batch(entries), '' if len(entries) == 1 else 's'))
+            return work_log
+        elif selection == 'd':
+            if input('Discard {} unsaved tasks? [yN]'.format(
+                    len(entries))).lower() == 'y':
+                write_batch_journal([])
+                return work_log
+        else:
+            print('Please choose A, E, R, S or D.')
+        write_batch_journal(entries)
+
+
+def task_search():
+    '''Allows user to search, edit, and delete task entries from file'''
+    menu = '''\nSelect from the following options:\n
+        1 - Find by date
+        2 - Find by time spent
+        3 - Find by exact search
+        4 - Find by employee name
+        5 - Return to main menu\n
+    '''
+    print(menu)
+    search_mode = None
+    while not search_mode:
+        search_mode = input('>>>').strip()
+        if search_mode == '1':
+            return date_find()
+        elif search_mode == '2':
+            return time_find()
+        elif search_mode == '3':
+            return exact_find()
+        elif search_mode == '4':
+            return employee_find()
+        elif search_mode == '5':
+            return work_log
+        else:
+            print("Please enter a selection from 1 to 5")
+            search_mode = None
+
+
+def validate_time(time):
+    '''Returns time as a positive whole number of minutes,
+    or raises ValueError with a message saying what is wrong.
+    '''
+    try:
+        time = int(str(time).strip())
+    except ValueError:
+        raise ValueError('Enter a valid number.')
+    if time <= 0:
+        raise ValueError('Enter a valid time.')
+    return time
+
+
+def validate_name(name):
+    '''Returns name without surrounding whitespace if it is 1-100
+    characters long, or raises ValueError.
+    '''
+    name = name.strip()
+    if len(name) > 100 or not name:
+        raise ValueError(
+            'Please enter a name from 1-100 characters in length.')
+    return name
+
+
+def validate_date(date_string):
+    '''Returns the date written as YYYY-MM-DD, or raises ValueError'''
+    try:
+        return datetime.datetime.strptime(date_string, DATE_FORMAT).date()
+    except ValueError:
+        raise ValueError(
+            'Date must be valid and in format YYYY-MM-DD. Try again.')
+
+
+def number_input(msg):
+    '''Takes string as argument and prints it to solicit input,
+    and tests that input represents an integer
+    '''
+    time = None
+    print(msg)
+    while not time:
+        try:
+            time = validate_time(input('>>>'))
+        except ValueError as error:
+            print(error)
+    return time
+
+
+def name_input(msg, employee=False):
+    '''Takes string as argument and prints it to solicit name,
+    then checks that input is 100 characters or less in length.
+    For an employee's name, Tab completes it from the employees'
+    names where readline is available, and a name that no employee has
+    yet can be swapped for one of the closest that they do.
+    '''
+    name = None
+    print(msg)
+    stop_completion = complete_employees() if employee else None
+    try:
+        while not name:
+            try:
+                name = validate_name(input('>>>'))
+            except ValueError as error:
+                print(error)
+    finally:
+        if stop_completion:
+            stop_completion()
+    return suggest_employee(name) if employee else name
+
+
+def complete_employees():
+    '''Makes Tab complete employee names with find_employees() in the
+    following input() calls, if they read a terminal with readline.
+    Returns a function that stops it, or None.'''
+    if not sys.stdin.isatty():
+        return None
+    try:
+        import readline
+    except ImportError:
+        return None
+    matches = []
+
+    def complete(text, state):
+        if state == 0:
+            matches[:] = find_employees(text)
+        return matches[state] if state < len(matches) else None
+
+    delims = readline.get_completer_delims()
+    # complete the whole line, since names have spaces in them
+    readline.set_completer_delims('')
+    readline.set_completer(complete)
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
+
+    def stop():
+        readline.set_completer(None)
+        readline.set_completer_delims(delims)
+    return stop
+
+
+# Number of existing names suggest_employee() offers.
+SUGGESTIONS = 5
+
+
+def suggest_employee(name):
+    '''Returns the name, or the name of an existing employee that the
+    user picks instead from those closest to it, if no employee has it
+    yet'''
+    if Employee.select().where(Employee.name == name).exists():
+        return name
+    matches = find_employees(name, SUGGESTIONS)
+    if not matches:
+        return name
+    print('No employee is called {}.  Did you mean:'.format(name))
+    for number, match in enumerate(matches, 1):
+        print('{} - {}'.format(number, match))
+    while True:
+        choice = input('Enter a number to use that name, or press enter '
+                       'to keep {}.\n>>>'.format(name)).strip()
+        if not choice:
+            return name
+        if choice.isdigit() and 1 <= int(choice) <= len(matches):
+            return matches[int(choice) - 1]
+        print('Please enter a number from 1 to {}.'.format(len(matches)))
+
+
+def date_input(date_wrapper):
+    '''Asks for date and validates for format YYYY-MM-DD'''
+    # Function takes lists rather than strings since strings are immutable
+    while len(date_wrapper) == 0:
+        try:
+            input_string = input('>>>')
+            date_wrapper.append(datetime.datetime.strptime(
+                                input_string, DATE_FORMAT))
+        except ValueError:
+            print('Date must be valid and in format YYYY-MM-DD. Try again.')
+
+
+# Rows per INSERT statement.  Five columns per row keeps each statement
+# under SQLite's default limit of 999 bound variables.
+INSERT_CHUNK_SIZE = 150
+
+
+class ResultCache:
+    '''Keeps the results of recent searches in memory.
+
+    Entries are keyed by the normalized search terms and remember which
+    tasks they could contain, so a write only drops the entries it can
+    change: adding a task on one date leaves searches of other dates
+    cached, and editing a task's notes leaves the date and employee
+    pickers cached.  Writes by other connections or processes are noticed
+    through SQLite's data_version, which drops everything.
+
+    Entries expire after ttl seconds, and the least recently used are
+    dropped to keep within max_entries entries and max_rows cached rows.
+    stats() reports hits, misses and the hit rate.
+    '''
+    def __init__(self, max_entries=256, max_rows=20000, ttl=300):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.enabled = False
+        self._entries = collections.OrderedDict()
+        self._rows = 0
+        self._data_versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0,
+                       'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        '''Returns (True, value) for a cached result, or (False, None)'''
+        if not self.enabled:
+            return False, None
+        self._check_data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] <= monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, entry['value']
+
+    def put(self, key, value, terms, fields, rows=1):
+        '''Caches value for key.  terms are the search terms the value
+        depends on and fields the task fields it shows.'''
+        if not self.enabled or rows > self.max_rows:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {'value': value, 'terms': terms,
+                                  'fields': fields, 'rows': rows,
+                                  'expires': monotonic() + self.ttl}
+            self._rows += rows
+            while (len(self._entries) > self.max_entries or
+                   self._rows > self.max_rows):
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def _drop(self, key):
+        self._rows -= self._entries.pop(key)['rows']
+
+    def invalidate(self, tasks, fields=None):
+        '''Drops the entries that could show any of the tasks (dicts of
+        task fields, before and after a change).  fields are the fields
+        that changed, or None if the tasks were added or deleted.'''
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if fields is not None and not entry['fields'] & fields:
+                    continue
+                if any(_could_match(entry['terms'], task) for task in tasks):
+                    self._drop(key)
+                    self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+            self._rows = 0
+
+    def _check_data_version(self):
+        # data_version changes when another connection commits
+        database = Task._meta.database
+        version = database.execute_sql('PRAGMA data_version').fetchone()[0]
+        key = (id(database), threading.get_ident())
+        if self._data_versions.get(key, version) != version:
+            self.clear()
+        self._data_versions[key] = version
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries),
+                         rows=self._rows)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+def _day(value):
+    # dates arrive as date objects, datetimes or ISO strings
+    return value if isinstance(value, str) else value.isoformat()[:10]
+
+
+def _could_match(terms, task):
+    '''Returns False if a task with these fields cannot match the search
+    terms.  Text terms are not checked, so they always could.'''
+    date = _day(task.get('date') or datetime.date.today())
+    if terms.get('start_date') and date < _day(terms['start_date']):
+        return False
+    if terms.get('end_date') and date > _day(terms['end_date']):
+        return False
+    if terms.get('employee') is not None and (
+            task.get('employee') != terms['employee']):
+        return False
+    time = int(task.get('time') or 0)
+    if terms.get('time') is not None and time != terms['time']:
+        return False
+    if terms.get('min_time') is not None and time < terms['min_time']:
+        return False
+    if terms.get('max_time') is not None and time > terms['max_time']:
+        return False
+    return True
+
+
+TASK_FIELDS = frozenset(['employee', 'name', 'time', 'date', 'notes'])
+result_cache = ResultCache()
+
+
+def _task_fields(task_id):
+    # a task's fields before a change, if any cached result could show it
+    if not len(result_cache):
+        return None
+    return (Task
+            .select(Task.id, Employee.name.alias('employee'), Task.name,
+                    Task.time, Task.date, Task.notes)
+            .join(Employee)
+            .where(Task.id == task_id)
+            .dicts()
+            .first())
+
+
+def employee_ids(names):
+    '''Returns {name: id} for the employees with the given names, adding
+    the ones that are new.  Run it inside a transaction that writes.'''
+    names = sorted(set(names))
+    ids = _find_employees(names)
+    new = [name for name in names if name not in ids]
+    for start in range(0, len(new), INSERT_CHUNK_SIZE):
+        chunk = new[start:start + INSERT_CHUNK_SIZE]
+        Task._meta.database.execute_sql(
+            'INSERT OR IGNORE INTO employee (name) VALUES ' +
+            ', '.join(['(?)'] * len(chunk)), chunk)
+    ids.update(_find_employees(new))
+    return ids
+
+
+def _find_employees(names):
+    ids = {}
+    for start in range(0, len(names), INSERT_CHUNK_SIZE):
+        ids.update(Employee
+                   .select(Employee.name, Employee.id)
+                   .where(Employee.name.in_(
+                       names[start:start + INSERT_CHUNK_SIZE]))
+                   .tuples())
+    return ids
+
+
+def employee_id(name):
+    '''Returns the id of the employee with the given name, adding them if
+    they are new'''
+    return employee_ids([name])[name]
+
+
+def insert_tasks(tasks):
+    '''Inserts dicts of task fields, with employees given by name, with
+    as few statements as possible.  Run it inside a transaction so that
+    the statements commit together.'''
+    ids = employee_ids(task['employee'] for task in tasks)
+    rows = [dict(task, employee=ids[task['employee']]) for task in tasks]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        Task.insert_many(rows[start:start + INSERT_CHUNK_SIZE]).execute()
+    result_cache.invalidate(tasks)
+
+
+def load_tasks(rows, dates, employees):
+    '''Inserts many tasks at once, for bulk imports.  rows are tuples of
+    (employee, name, time, date, notes), with employees by name and
+    dates as YYYY-MM-DD.  dates and employees are the rows' totals,
+    worked out already, as {date: (entries, minutes)} and
+    {employee name: (entries, minutes)}.
+
+    The rollups are updated once per date and employee from the totals,
+    and the full-text index and the change journal once for all the
+    rows, instead of by the insert triggers for every row.  Run it
+    inside a transaction that writes: the triggers are dropped and made
+    again within it, so no other connection sees them missing.
+    '''
+    database = Task._meta.database
+    ids = employee_ids(employees)
+    paused = [name for name, in database.execute_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND "
+        "name IN ('task_rollup_insert', 'task_index_insert', "
+        "'task_change_insert')")]
+    for name in paused:
+        database.execute_sql('DROP TRIGGER {}'.format(name))
+    last_id = database.execute_sql(
+        'SELECT COALESCE(MAX(id), 0) FROM task').fetchone()[0]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start:start + INSERT_CHUNK_SIZE]
+        database.execute_sql(
+            'INSERT INTO task (employee_id, name, time, date, notes) '
+            'VALUES ' + ', '.join(['(?, ?, ?, ?, ?)'] * len(chunk)),
+            [value for row in chunk
+             for value in (ids[row[0]],) + tuple(row[1:])])
+    if 'task_index_insert' in paused:
+        database.execute_sql(
+            'INSERT INTO taskindex (rowid, name, notes) '
+            'SELECT id, name, notes FROM task WHERE id > ?', (last_id,))
+        database.execute_sql(_FULL_TEXT_TRIGGERS[0])
+    if 'task_change_insert' in paused:
+        database.execute_sql(
+            "INSERT INTO taskchange (task_id, kind, changed) "
+            "SELECT id, 'insert', datetime('now', 'localtime') FROM task "
+            "WHERE id > ? ORDER BY id", (last_id,))
+        database.execute_sql(_CHANGE_TRIGGERS[0])
+    if 'task_rollup_insert' in paused:
+        for table, key, totals in [
+                ('dailyrollup', 'date', dates),
+                ('employeerollup', 'employee_id',
+                 {ids[name]: total for name, total in employees.items()})]:
+            for value, (entries, minutes) in totals.items():
+                database.execute_sql(
+                    'INSERT OR IGNORE INTO {} ({}, entries, minutes) '
+                    'VALUES (?, 0, 0)'.format(table, key), (value,))
+                database.execute_sql(
+                    'UPDATE {} SET entries = entries + ?, '
+                    'minutes = minutes + ? WHERE {} = ?'.format(table, key),
+                    (entries, minutes, value))
+        database.execute_sql(_rollup_triggers()[0])
+    result_cache.clear()
+
+
+def add_task(employee, name, time, notes='', date=None):
+    '''Checks and saves a new task, returning it'''
+    fields = {
+        'employee': validate_name(employee),
+        'name': validate_name(name),
+        'time': validate_time(time),
+        'notes': notes or '',
+    }
+    if date:
+        fields['date'] = date
+    task = writer.write(_create_task, fields)
+    result_cache.invalidate([fields])
+    return task
+
+
+def _create_task(fields):
+    return Task.create(**dict(fields,
+                              employee=employee_id(fields['employee'])))
+
+
+def edit_task(task_id, **changes):
+    '''Checks and saves new values for any of a task's name, time, date and
+    notes.  Returns the number of tasks changed: 0 if there is no such task.
+    '''
+    if 'name' in changes:
+        changes['name'] = validate_name(changes['name'])
+    if 'time' in changes:
+        changes['time'] = validate_time(changes['time'])
+    if isinstance(changes.get('date'), str):
+        changes['date'] = validate_date(changes['date'])
+    if 'notes' in changes:
+        changes['notes'] = changes['notes'] or ''
+    before = _task_fields(task_id)
+    query = Task.update(**changes).where(Task.id == task_id)
+    changed = writer.write(query.execute)
+    if before:
+        result_cache.invalidate([before, dict(before, **changes)],
+                                set(changes))
+    return changed
+
+
+def delete_task(task_id):
+    '''Deletes a task, returning the number deleted: 0 or 1'''
+    before = _task_fields(task_id)
+    deleted = writer.write(Task.delete().where(Task.id == task_id).execute)
+    if before:
+        result_cache.invalidate([before])
+    return deleted
+
+
+# Number of bulk operations kept in the undo journal; older ones are
+# dropped as new ones are made.
+BULK_UNDO_KEEP = 20
+
+BULK_FIELDS = ['employee', 'name', 'time', 'date', 'notes']
+
+
+def validate_changes(changes):
+    '''Returns new values for any of a task's fields, checked, or raises
+    ValueError saying what is wrong'''
+    checked = {}
+    for field, value in changes.items():
+        if field in ('employee', 'name'):
+            checked[field] = validate_name(value)
+        elif field == 'time':
+            checked[field] = validate_time(value)
+        elif field == 'date':
+            checked[field] = (value if isinstance(value, datetime.date)
+                              else validate_date(value))
+        elif field == 'notes':
+            checked[field] = value or ''
+        else:
+            raise ValueError('There is no field called {}.'.format(field))
+    if not checked:
+        raise ValueError('Give at least one field to change.')
+    return checked
+
+
+def bulk_count(**terms):
+    '''Returns how many tasks a bulk edit or delete of the tasks matching
+    the search terms would change, without changing them'''
+    return search_query(**terms).order_by().count()
+
+
+def bulk_edit(terms, **changes):
+    '''Gives new values to fields of every task matching the search terms
+    with one UPDATE, in one transaction that also copies the tasks to the
+    undo journal.  Archived tasks are left alone.  Returns the
+    BulkOperation; its count is the number of tasks changed.'''
+    changes = validate_changes(changes)
+    operation = writer.run(_bulk_write, 'edit', terms, changes)
+    result_cache.clear()
+    return operation
+
+
+def bulk_delete(terms):
+    '''Deletes every task matching the search terms with one DELETE,
+    like bulk_edit()'''
+    operation = writer.run(_bulk_write, 'delete', terms, {})
+    result_cache.clear()
+    return operation
+
+
+def _bulk_write(kind, terms, changes):
+    operation = BulkOperation.create(
+        kind=kind, terms=json.dumps(terms, default=str, sort_keys=True),
+        changes=json.dumps(changes, default=str, sort_keys=True))
+    # the journal is filled from the search once, and then names the
+    # tasks to change, so both see the same tasks.  It keeps employees by
+    # name.
+    ids_sql, params = search_query(**terms).select(Task.id).order_by().sql()
+    operation.count = Task._meta.database.execute_sql(
+        'INSERT INTO bulkundorow (operation_id, task_id, employee, name, '
+        'time, date, notes) SELECT ?, {} FROM {} WHERE task.id IN ({})'
+        .format(_NAMED_COLUMNS, _NAMED_TASKS, ids_sql),
+        [operation.id] + list(params)).rowcount
+    journal = (BulkUndoRow
+               .select(BulkUndoRow.task_id)
+               .where(BulkUndoRow.operation == operation.id))
+    if kind == 'edit':
+        if 'employee' in changes:
+            changes = dict(changes,
+                           employee=employee_id(changes['employee']))
+        Task.update(**changes).where(Task.id.in_(journal)).execute()
+    else:
+        Task.delete().where(Task.id.in_(journal)).execute()
+    operation.save()
+    kept = (BulkOperation
+            .select(BulkOperation.id)
+            .order_by(BulkOperation.id.desc())
+            .limit(BULK_UNDO_KEEP))
+    BulkUndoRow.delete().where(BulkUndoRow.operation.not_in(kept)).execute()
+    BulkOperation.delete().where(BulkOperation.id.not_in(kept)).execute()
+    return operation
+
+
+def undo_bulk():
+    '''Undoes the latest bulk edit or delete that has not been undone, in
+    one transaction.  Returns its BulkOperation, or None if there is
+    nothing to undo.'''
+    operation = writer.run(_undo_latest)
+    result_cache.clear()
+    return operation
+
+
+def _undo_latest():
+    operation = (BulkOperation
+                 .select()
+                 .where(BulkOperation.undone == False)
+                 .order_by(BulkOperation.id.desc())
+                 .first())
+    if operation is None:
+        return None
+    journal = 'FROM bulkundorow WHERE operation_id = ?'
+    # the journal's employee names, as ids
+    employee = ('(SELECT id FROM employee '
+                'WHERE employee.name = bulkundorow.employee)')
+    columns = {'employee': ('employee_id', employee)}
+    database = Task._meta.database
+    if operation.kind == 'edit':
+        fields = [columns.get(field, (field, field))
+                  for field in sorted(json.loads(operation.changes))
+                  if field in BULK_FIELDS]
+        database.execute_sql(
+            'UPDATE task SET {} WHERE id IN (SELECT task_id {})'.format(
+                ', '.join('{0} = (SELECT {1} {2} AND task_id = task.id)'
+                          .format(column, value, journal)
+                          for column, value in fields),
+                journal),
+            [operation.id] * (len(fields) + 1))
+    else:
+        try:
+            database.execute_sql(
+                'INSERT INTO task (id, employee_id, name, time, date, '
+                'notes) SELECT task_id, {}, name, time, date, notes {}'
+                .format(employee, journal), [operation.id])
+        except IntegrityError:
+            raise ValueError('Some of the deleted tasks\' ids have been '
+                             'used again, so they cannot be restored.')
+    BulkUndoRow.delete().where(
+        BulkUndoRow.operation == operation.id).execute()
+    operation.undone = True
+    operation.save()
+    return operation
+
+
+# SQLite attaches at most this many databases to a connection.
+MAX_ARCHIVES = 10
+
+# Tables and indexes of each archive file.  archive_id keeps rows apart
+# even if an id is used again after its task was archived; run is the
+# archive run that copied the row (see ArchivePartition.last_run), and is
+# in the employee index so that employees can be counted from it alone.
+_ARCHIVE_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS {0}.task ('
+    'archive_id INTEGER PRIMARY KEY, id INTEGER NOT NULL, '
+    'employee VARCHAR(100) NOT NULL, name VARCHAR(100) NOT NULL, '
+    'time INTEGER NOT NULL, date DATE NOT NULL, notes TEXT NOT NULL, '
+    'run INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS {0}.task_date_id ON task (date, id)',
+    'CREATE INDEX IF NOT EXISTS {0}.task_employee_date '
+    'ON task (employee, date, run)',
+    'CREATE INDEX IF NOT EXISTS {0}.task_time ON task (time)',
+    'CREATE INDEX IF NOT EXISTS {0}.task_run_id ON task (run, id)',
+]
+
+_TASK_COLUMNS = 'id, employee, name, time, date, notes'
+
+# The same columns of the task table, with each employee's name in place
+# of its id, for the archives, the taskhistory view and the undo journal.
+_NAMED_COLUMNS = ('task.id AS id, employee.name AS employee, '
+                  'task.name AS name, task.time AS time, task.date AS date, '
+                  'task.notes AS notes')
+_NAMED_TASKS = 'main.task JOIN main.employee ON employee.id = task.employee_id'
+
+
+def _archive_schema(year):
+    # the name each archive file is attached as
+    return 'archive_{}'.format(int(year))
+
+
+def _archive_file(database, path):
+    # archive paths are kept relative to the main database file
+    return os.path.join(os.path.dirname(database.database), path)
+
+
+def archive_partitions(database=None):
+    '''Returns the (year, path) of every archive file, oldest first'''
+    database = database or Task._meta.database
+    if schema_version(database) < ARCHIVE_VERSION:
+        return []
+    return list(ArchivePartition
+                .select(ArchivePartition.year, ArchivePartition.path)
+                .order_by(ArchivePartition.year)
+                .tuples())
+
+
+def archive_cutoff(database=None):
+    '''Returns the date that every archived task is older than, or None
+    if nothing has been archived'''
+    database = database or Task._meta.database
+    if schema_version(database) < ARCHIVE_VERSION:
+        return None
+    cutoff = ArchivePartition.select(
+        fn.MAX(ArchivePartition.archived_before)).scalar()
+    return validate_date(_day(cutoff)) if cutoff else None
+
+
+def with_archives(terms):
+    '''Returns search terms with history=True added if they ask for a
+    range of dates that begins before archive_cutoff().  Searches of
+    recent dates read only the task table; searches without dates read
+    the archives only if history=True is given.'''
+    if 'history' in terms or not (terms.get('start_date') or
+                                  terms.get('end_date')):
+        return terms
+    cutoff = archive_cutoff()
+    if cutoff and (not terms.get('start_date') or
+                   _day(terms['start_date']) < cutoff.isoformat()):
+        return dict(terms, history=True)
+    return terms
+
+
+def attach_archives(database=None):
+    '''Attaches every archive file to the current connection and creates
+    the taskhistory view over them and the task table, unless that has
+    been done already'''
+    database = database or Task._meta.database
+    partitions = archive_partitions(database)
+    attached = set(row[1] for row in
+                   database.execute_sql('PRAGMA database_list'))
+    missing = [(year, path) for year, path in partitions
+               if _archive_schema(year) not in attached]
+    for year, path in missing:
+        database.execute_sql('ATTACH DATABASE ? AS {}'.format(
+            _archive_schema(year)), (_archive_file(database, path),))
+    view = database.execute_sql(
+        "SELECT 1 FROM temp.sqlite_master WHERE name = 'taskhistory'"
+    ).fetchone()
+    if view and not missing:
+        return
+    # Each archive is read up to its last finished run.  A search's
+    # conditions on date are pushed into every part of the view, so the
+    # date index of an archive that cannot match finds nothing at once.
+    parts = ['SELECT {}, 0 AS archive FROM {}'.format(_NAMED_COLUMNS,
+                                                     _NAMED_TASKS)]
+    for year, path in partitions:
+        parts.append(
+            'SELECT {0}, {1} FROM {2}.task WHERE run <= (SELECT last_run '
+            'FROM main.archivepartition WHERE year = {1})'.format(
+                _TASK_COLUMNS, int(year), _archive_schema(year)))
+    database.execute_sql('DROP VIEW IF EXISTS temp.taskhistory')
+    database.execute_sql('CREATE TEMP VIEW taskhistory AS ' +
+                         ' UNION ALL '.join(parts))
+
+
+def archive_tasks(before=None):
+    '''Moves the tasks dated before the given date (by default, those
+    more than archive_after_days old) out of the task table into one
+    archive database file per year, next to the main one.  Returns the
+    number of tasks moved for each year.
+
+    Archived tasks are still found by searches that ask for them (see
+    with_archives()), but cannot be edited or deleted, and leave the
+    rollups and the full-text index, which only cover the task table.
+    The change journal lists them as archived.
+    '''
+    database = Task._meta.database
+    before = _day(before or datetime.date.today() -
+                  datetime.timedelta(days=archive_after_days))
+    moved = {}
+    day = database.execute_sql('SELECT MIN(date) FROM task WHERE date < ?',
+                               (before,)).fetchone()[0]
+    while day is not None:
+        year = int(day[:4])
+        moved[year] = _archive_year(year, before)
+        # the next year with tasks to archive, found on the date index
+        day = database.execute_sql(
+            'SELECT MIN(date) FROM task WHERE date >= ? AND date < ?',
+            ('{:04}-01-01'.format(year + 1), before)).fetchone()[0]
+    result_cache.clear()
+    return moved
+
+
+def _archive_year(year, before):
+    # Tasks are first copied into the archive file, where they stay
+    # hidden, and then deleted from the task table in the transaction
+    # that makes them visible.  Transactions are not atomic across WAL
+    # database files, so this order means a crash can leave hidden
+    # copies behind, which the next run replaces, but never loses tasks.
+    database = Task._meta.database
+    partition = (ArchivePartition
+                 .select()
+                 .where(ArchivePartition.year == year)
+                 .first())
+    if partition is None:
+        if len(archive_partitions()) >= MAX_ARCHIVES:
+            raise ValueError('There can be at most {} archive files.'
+                             .format(MAX_ARCHIVES))
+        name = '{}-{}.db'.format(
+            os.path.splitext(os.path.basename(database.database))[0], year)
+        partition = ArchivePartition(year=year, path=name, rows=0,
+                                     last_run=0, archived_before=before)
+    schema = _archive_schema(year)
+    attached = set(row[1] for row in
+                   database.execute_sql('PRAGMA database_list'))
+    if schema not in attached:
+        database.execute_sql('ATTACH DATABASE ? AS {}'.format(schema),
+                             (_archive_file(database, partition.path),))
+        # so that attach_archives() adds the new archive to the view
+        database.execute_sql('DROP VIEW IF EXISTS temp.taskhistory')
+    for statement in _ARCHIVE_SCHEMA:
+        database.execute_sql(statement.format(schema))
+    run = partition.last_run + 1
+    dates = ('{:04}-01-01'.format(year),
+             min('{:04}-01-01'.format(year + 1), before))
+    writer.run(_copy_to_archive, schema, run, dates)
+    return writer.run(_finish_archive_run, partition, run, dates, before)
+
+
+def _copy_to_archive(schema, run, dates):
+    database = Task._meta.database
+    database.execute_sql('DELETE FROM {}.task WHERE run >= ?'.format(schema),
+                         (run,))
+    database.execute_sql(
+        'INSERT INTO {}.task ({}, run) SELECT {}, ? FROM {} '
+        'WHERE task.date >= ? AND task.date < ?'.format(
+            schema, _TASK_COLUMNS, _NAMED_COLUMNS, _NAMED_TASKS),
+        (run,) + dates)
+
+
+def _finish_archive_run(partition, run, dates, before):
+    database = Task._meta.database
+    copies = '{}.task'.format(_archive_schema(partition.year))
+    # a task changed by another process since it was copied stays in the
+    # task table, and its copy is dropped
+    hot = {column: 'hot.' + column for column in _TASK_COLUMNS.split(', ')}
+    hot['employee'] = 'employee.name'
+    database.execute_sql(
+        'DELETE FROM {0} WHERE run = ? AND NOT EXISTS (SELECT 1 FROM '
+        'main.task AS hot JOIN main.employee ON employee.id = hot.employee_id '
+        'WHERE {1})'.format(copies, ' AND '.join(
+            '{} = {}.{}'.format(hot[column], copies, column)
+            for column in _TASK_COLUMNS.split(', '))), (run,))
+    last_seq = database.execute_sql(
+        'SELECT COALESCE(MAX(seq), 0) FROM main.taskchange').fetchone()[0]
+    moved = database.execute_sql(
+        'DELETE FROM main.task WHERE date >= ? AND date < ? AND id IN '
+        '(SELECT id FROM {} WHERE run = ?)'.format(copies),
+        dates + (run,)).rowcount
+    database.execute_sql(
+        "UPDATE main.taskchange SET kind = 'archive' WHERE seq > ?",
+        (last_seq,))
+    database.execute_sql(
+        'INSERT OR REPLACE INTO archivepartition '
+        '(year, path, rows, last_run, archived_before) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (partition.year, partition.path, partition.rows + moved, run,
+         max(_day(partition.archived_before), before)))
+    return moved
+
+
+# Entries of the change journal older than this many days are compacted
+# when compact_changes() runs.
+CHANGE_KEEP_DAYS = 30
+
+# change journal rows pulled from the database cursor at a time
+CHANGE_FETCH_SIZE = 10000
+
+CHANGE_FIELDS = ['seq', 'kind', 'id', 'employee', 'name', 'time', 'date',
+                 'notes']
+
+
+def compacted_through(database=None):
+    '''Returns the last seq that compaction may have removed entries of
+    deleted tasks up to, or 0'''
+    database = database or Task._meta.database
+    return database.execute_sql(
+        'SELECT COALESCE(MAX(through), 0) FROM changecompaction'
+    ).fetchone()[0]
+
+
+def changes_since(since=0, limit=None):
+    '''Yields (seq, kind, id, employee, name, time, date, notes) tuples
+    for the tasks written since the change journal entry seq since, in
+    seq order, with dates as YYYY-MM-DD strings.  Each task comes once,
+    with its latest entry and its fields now; deleted and archived
+    tasks have None for their fields.  A consumer keeps the last seq it
+    has seen and passes it next time.  Its first insert or update of a
+    task may be the task's update or insert entry, so both should be
+    taken as "add or replace".
+
+    Raises ValueError if since is before a compaction removed entries of
+    deleted tasks, since the consumer could miss those deletes: it must
+    start again from 0, which gives every task there is.
+    '''
+    database = Task._meta.database
+    if 0 < since < compacted_through(database):
+        raise ValueError('Changes up to {} have been compacted; sync again '
+                         'from 0.'.format(compacted_through(database)))
+    sql = ('SELECT entry.seq, entry.kind, entry.task_id, employee.name, '
+           'task.name, task.time, task.date, task.notes '
+           'FROM taskchange AS entry '
+           'LEFT JOIN task ON task.id = entry.task_id '
+           'LEFT JOIN employee ON employee.id = task.employee_id '
+           'WHERE entry.seq > ? AND entry.seq = (SELECT MAX(seq) '
+           'FROM taskchange WHERE task_id = entry.task_id) '
+           'ORDER BY entry.seq')
+    params = [since]
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    # one statement, so the rows are from one snapshot of the tables
+    cursor = database.execute_sql(sql, params)
+    rows = cursor.fetchmany(CHANGE_FETCH_SIZE)
+    while rows:
+        for row in rows:
+            yield row
+        rows = cursor.fetchmany(CHANGE_FETCH_SIZE)
+
+
+def compact_changes(before=None):
+    '''Removes change journal entries made before the given date (by
+    default, CHANGE_KEEP_DAYS ago) that changes_since() no longer needs:
+    those with a later entry for the same task, and those of deleted and
+    archived tasks.  Returns the number removed.'''
+    before = _day(before or datetime.date.today() -
+                  datetime.timedelta(days=CHANGE_KEEP_DAYS))
+    return writer.run(_compact_changes, before)
+
+
+def _compact_changes(before):
+    database = Task._meta.database
+    removed = database.execute_sql(
+        'DELETE FROM taskchange WHERE changed < ? AND seq < (SELECT '
+        'MAX(seq) FROM taskchange AS later '
+        'WHERE later.task_id = taskchange.task_id)', (before,)).rowcount
+    gone = "changed < ? AND kind IN ('delete', 'archive')"
+    through = database.execute_sql(
+        'SELECT MAX(seq) FROM taskchange WHERE ' + gone,
+        (before,)).fetchone()[0]
+    if through is not None:
+        removed += database.execute_sql(
+            'DELETE FROM taskchange WHERE ' + gone, (before,)).rowcount
+        ChangeCompaction.create(through=through)
+    return removed
+
+
+def search_query(start_date=None, end_date=None, employee=None, time=None,
+                 text=None, min_time=None, max_time=None, history=False):
+    '''Returns a query for the tasks matching every search term given:
+    an inclusive date range (either end may be left open), an employee
+    name, an exact time in minutes, an inclusive range of minutes (either
+    end may be left open) and text in the name or notes.  With history,
+    archived tasks are searched too, through TaskHistory.
+    '''
+    model = Task
+    if history:
+        attach_archives()
+        model = TaskHistory
+    query = text_search(text, model) if text else task_query(model)
+    if start_date:
+        query = query.where(model.date >= start_date)
+    if end_date:
+        query = query.where(model.date <= end_date)
+    if employee is not None and model is Task:
+        # compare integer keys, looking the name up once
+        query = query.where(Task.employee == Employee
+                            .select(Employee.id)
+                            .where(Employee.name == employee))
+    elif employee is not None:
+        query = query.where(model.employee == employee)
+    if time is not None:
+        query = query.where(model.time == time)
+    if min_time is not None:
+        query = query.where(model.time >= min_time)
+    if max_time is not None:
+        query = query.where(model.time <= max_time)
+    return query
+
+
+def task_query(model=Task):
+    '''Returns a query for every task of model (Task or TaskHistory) with
+    the name of its employee'''
+    if model is Task:
+        return Task.select(Task, Employee).join(Employee)
+    return model.select()
+
+
+# Lower bounds of the buckets in the histogram of time spent, in minutes.
+TIME_BUCKETS = [1, 15, 30, 60, 120, 240, 480]
+
+
+def time_histogram(buckets=TIME_BUCKETS):
+    '''Returns (low, high, number of entries) for each bucket of time spent
+    that has entries, where high is None for the last, open-ended bucket.
+    Each bucket is counted from a range of the task_time index.
+    '''
+    found, histogram = result_cache.get(('time_histogram', tuple(buckets)))
+    if found:
+        return histogram
+    ranges = list(zip(buckets, [high - 1 for high in buckets[1:]] + [None]))
+    counts = ['(SELECT COUNT(*) FROM task WHERE time >= ?{})'.format(
+        '' if high is None else ' AND time <= ?') for low, high in ranges]
+    params = [bound for pair in ranges for bound in pair if bound is not None]
+    row = Task._meta.database.execute_sql(
+        'SELECT ' + ', '.join(counts), params).fetchone()
+    histogram = [(low, high, count)
+                 for (low, high), count in zip(ranges, row) if count]
+    result_cache.put(('time_histogram', tuple(buckets)), histogram, {},
+                     {'time'}, len(histogram))
+    return histogram
+
+
+def date_counts(start_date=None, end_date=None):
+    '''Returns (date, number of entries) pairs, newest first, from the
+    date rollup or a single grouped query if the database has no rollups.
+    Dates can be limited to an inclusive range, and archived tasks are
+    counted too if the range begins before archive_cutoff().
+    '''
+    key = ('date_counts', start_date, end_date)
+    found, counts = result_cache.get(key)
+    if found:
+        return counts
+    if schema_version() >= ROLLUP_VERSION:
+        date_field = DailyRollup.date
+        query = DailyRollup.select(DailyRollup.date, DailyRollup.entries)
+    else:
+        date_field = Task.date
+        query = Task.select(Task.date, fn.COUNT(Task.id)).group_by(Task.date)
+    query = query.order_by(date_field.desc())
+    if start_date:
+        query = query.where(date_field >= start_date)
+    if end_date:
+        query = query.where(date_field <= end_date)
+    counts = list(query.tuples())
+    terms = {'start_date': start_date, 'end_date': end_date}
+    if (start_date or end_date) and with_archives(terms).get('history'):
+        counts = _add_archived_counts(counts, start_date, end_date)
+    result_cache.put(key, counts, terms, {'date'}, len(counts))
+    return counts
+
+
+def _add_archived_counts(counts, start_date, end_date):
+    attach_archives()
+    query = (TaskHistory
+             .select(TaskHistory.date, fn.COUNT(TaskHistory.id))
+             .where(TaskHistory.archive > 0)
+             .group_by(TaskHistory.date))
+    if start_date:
+        query = query.where(TaskHistory.date >= start_date)
+    if end_date:
+        query = query.where(TaskHistory.date <= end_date)
+    totals = collections.Counter(dict(counts))
+    for date, entries in query.tuples():
+        totals[date] += entries
+    return sorted(totals.items(), reverse=True)
+
+
+def employee_counts(history=False):
+    '''Returns (employee, number of entries) pairs in name order from the
+    employee rollup or a single grouped query if the database has no rollups.
+    With history, archived tasks are counted too, with a grouped query of
+    each archive's employee index.
+    '''
+    key = ('employee_counts', 'history') if history else ('employee_counts',)
+    found, counts = result_cache.get(key)
+    if found:
+        return counts
+    if schema_version() >= ROLLUP_VERSION:
+        query = (EmployeeRollup
+                 .select(Employee.name, EmployeeRollup.entries)
+                 .join(Employee))
+    else:
+        query = (Task
+                 .select(Employee.name, fn.COUNT(Task.id))
+                 .join(Employee)
+                 .group_by(Task.employee))
+    query = query.order_by(Employee.name.asc())
+    counts = list(query.tuples())
+    if history:
+        counts = _add_archived_employee_counts(counts)
+    result_cache.put(key, counts, {}, {'employee'}, len(counts))
+    return counts
+
+
+def _add_archived_employee_counts(counts):
+    database = Task._meta.database
+    attach_archives()
+    totals = collections.Counter(dict(counts))
+    runs = ArchivePartition.select(ArchivePartition.year,
+                                   ArchivePartition.last_run).tuples()
+    for year, last_run in list(runs):
+        for employee, entries in database.execute_sql(
+                'SELECT employee, COUNT(*) FROM {}.task WHERE run <= ? '
+                'GROUP BY employee'.format(_archive_schema(year)),
+                (last_run,)):
+            totals[employee] += entries
+    return sorted(totals.items())
+
+
+# Number of tasks fetched at a time while browsing search results.
+PAGE_SIZE = 50
+
+
+class TaskCursor:
+    '''Lazily pages through the tasks matched by a query.
+
+    Pages are fetched by keyset on (date, id), which the task_date_id index
+    serves directly, so only one page of tasks is held in memory however
+    many match.  Searches of a range of times are ordered and paged by
+    (time, id) instead, which the task_time index serves.  Queries that
+    bring their own ordering, such as ranked text searches, are paged with
+    LIMIT and OFFSET.
+
+    If the search terms that built the query are given, the count and the
+    pages are kept in result_cache.  The query may then be left out: it
+    is built from the terms by search_query() when a page or the count is
+    not cached, so a cached search runs nothing but the cache's check.
+    '''
+    def __init__(self, query=None, page_size=PAGE_SIZE, terms=None,
+                 order='date'):
+        self._query = query
+        self.page_size = page_size
+        self.terms = terms
+        self.order = order
+        self._count = None
+        self._search_terms = None
+
+    def search_terms(self):
+        '''The terms with history added if they need the archives'''
+        if self._search_terms is None:
+            self._search_terms = with_archives(self.terms or {})
+        return self._search_terms
+
+    @property
+    def query(self):
+        if self._query is None:
+            self._query = search_query(**self.search_terms())
+        return self._query
+
+    @property
+    def history(self):
+        '''True if archived tasks are searched too'''
+        return bool(self.search_terms().get('history'))
+
+    @property
+    def model(self):
+        return TaskHistory if self.history else Task
+
+    def __len__(self):
+        # one COUNT query, remembered for the life of the cursor
+        if self._count is None:
+            self._count = self._cached('count',
+                                       lambda: self.query.count())
+        return self._count
+
+    def __iter__(self):
+        if self._query is None and not self.terms.get('text'):
+            # of the searches, only text searches bring their own order
+            return self._keyset_pages()
+        if self.query._order_by:
+            return self._offset_pages()
+        return self._keyset_pages()
+
+    def _cached(self, part, load):
+        if self.terms is None:
+            return load()
+        key = ('search', tuple(sorted(self.terms.items())), self.page_size,
+               part)
+        found, value = result_cache.get(key)
+        if not found:
+            value = load()
+            result_cache.put(key, value, self.terms, TASK_FIELDS,
+                             len(value) if isinstance(value, list) else 1)
+        return value
+
+    def _keyset_pages(self):
+        number = 0
+        page = self._cached(number, lambda: list(self._page_query(None)))
+        while page:
+            for task in page:
+                yield task
+            last = page[-1]
+            number += 1
+            page = self._cached(number, lambda: list(self._page_query(last)))
+
+    def _page_query(self, last):
+        # The page after last starts with a lower bound on the ordering
+        # field so the index can seek straight to it.  A search's own lower
+        # bound is replaced rather than added to: given two, SQLite may
+        # seek on the wrong one.
+        model = self.model
+        field = getattr(model, self.order)
+        query = self.query
+        if last is not None:
+            value = getattr(last, self.order)
+            if self.terms is not None:
+                query = search_query(**dict(
+                    self.search_terms(),
+                    **{_LOWER_BOUNDS[self.order]: value}))
+            else:
+                query = query.where(field >= value)
+            query = query.where((field > value) | (model.id > last.id))
+        return query.order_by(field, model.id).limit(self.page_size)
+
+    def _offset_pages(self):
+        offset = 0
+        page = self._cached(offset,
+                            lambda: list(self.query.limit(self.page_size)))
+        while page:
+            for task in page:
+                yield task
+            offset += len(page)
+            page = self._cached(offset, lambda: list(
+                self.query.limit(self.page_size).offset(offset)))
+
+
+def cached_search(**terms):
+    '''Returns a TaskCursor over search_query(**terms) whose count and
+    pages are kept in result_cache.  Terms left out or None are dropped
+    from the cache key, so equivalent searches share entries.  Ranges of
+    times are ordered by time.  Archived tasks are searched if the terms
+    need them (see with_archives()).'''
+    terms = {name: value for name, value in terms.items()
+             if value is not None}
+    order = 'time' if terms.keys() & {'min_time', 'max_time'} else 'date'
+    return TaskCursor(terms=terms, order=order)
+
+
+# The search term that bounds each TaskCursor ordering from below.
+_LOWER_BOUNDS = {'date': 'start_date', 'time': 'min_time'}
+
+
+@work_trace.traced
+def date_find():
+    '''Searches for all entries matching a specific date
+    or falling within a date range.
+    '''
+    # Dates are lists so that they can be passed into date_input and modified
+    search_date_1 = []
+    search_date_2 = []
+    search_mode = None
+    while not search_mode:
+        search_mode = input('Enter 1 to browse all dates '
+                            'or 2 to search within a date range.\n>>>').strip()
+        if search_mode not in ['1', '2']:
+            print('Not a valid selection')
+            search_mode = None
+    if search_mode == '2':
+        print('Input start date in format YYYY-MM-DD')
+        date_input(search_date_1)
+        print('Input end date in format YYYY-MM-DD')
+        while not search_date_2:
+            date_input(search_date_2)
+            # make sure search_date1 is no later than search_date2
+            if search_date_1[0].timestamp() > search_date_2[0].timestamp():
+                print('First date cannot be later than second date. '
+                      'Enter end date again.')
+                search_date_2 = []
+    # run search
+    if search_mode == '2':
+        entry_dates = date_counts(search_date_1[0].date(),
+                                  search_date_2[0].date())
+    else:
+        entry_dates = date_counts()
+    if not entry_dates:
+        print('\nNo results found.\n')
+        return task_search
+    else:
+        cutoff = archive_cutoff() if search_mode == '1' else None
+        if cutoff:
+            print('Tasks before {} are archived: search a date range to '
+                  'see them.'.format(cutoff))
+        count = 1
+        print('Pick one of the following dates to view entries from')
+        for date, date_entries_count in entry_dates:
+            print(str(count) + ": " + str(date) + " (" +
+                  str(date_entries_count) + " entr{})".format(
+                'ies' if date_entries_count > 1 else 'y'))
+            count += 1
+        selection = None
+        print('Enter number corresponding to the desired date.')
+        while not selection:
+            selection = input('>>>').strip()
+            try:
+                selection = int(selection)
+            except ValueError:
+                print('Please enter a valid number')
+                selection = None
+            else:
+                if selection > len(entry_dates) or selection < 0:
+                    print('Please enter a valid number{}'.format(
+                        ' between 1 and {}.'.format(
+                            len(entry_dates)) if len(entry_dates) > 1
+                        else '.'))
+                    selection = None
+        date = entry_dates[selection - 1][0]
+        return display_results(cached_search(start_date=date,
+                                             end_date=date))
+
+
+def parse_time_range(text):
+    '''Returns the (lowest, highest) minutes described by text: "40" for
+    exactly 40, "30-60" for 30 to 60 and "240+" for at least 240, which
+    has None as its highest'''
+    text = text.replace(' ', '')
+    try:
+        if text.endswith('+'):
+            return validate_time(text[:-1]), None
+        low, separator, high = text.partition('-')
+        low = validate_time(low)
+        high = validate_time(high) if separator else low
+    except ValueError:
+        raise ValueError('Enter minutes as 40, 30-60 or 240+.')
+    if low > high:
+        raise ValueError('The lowest time cannot be more than the highest.')
+    return low, high
+
+
+def time_bucket_input():
+    '''Shows the histogram of time spent and returns the (lowest,
+    highest) minutes of the bucket the user picks, or None if there are
+    no tasks'''
+    histogram = time_histogram()
+    if not histogram:
+        return None
+    widest = max(count for low, high, count in histogram)
+    print('Pick one of the following times to view entries from')
+    for number, (low, high, count) in enumerate(histogram, 1):
+        label = '{}+'.format(low) if high is None else '{}-{}'.format(
+            low, high)
+        print('{}: {:>8} minutes {:>8} {}'.format(
+            number, label, count, '#' * max(1, 40 * count // widest)))
+    selection = None
+    while not selection:
+        selection = input('>>>').strip()
+        try:
+            selection = int(selection)
+        except ValueError:
+            selection = None
+        if not selection or not 1 <= selection <= len(histogram):
+            print('Please enter a number between 1 and {}.'.format(
+                len(histogram)))
+            selection = None
+    low, high, count = histogram[selection - 1]
+    return low, high
+
+
+def archive_input():
+    '''Asks whether to search archived tasks too, if there are any, and
+    returns True if so, or None'''
+    cutoff = archive_cutoff()
+    if cutoff and input('Tasks before {} are archived.  Search them too? '
+                        '[yN]'.format(cutoff)).strip().lower() == 'y':
+        return True
+    return None
+
+
+@work_trace.traced
+def time_find():
+    '''Searches for entries by time spent: an exact number of minutes,
+    a range, or a bucket picked from a histogram of all times'''
+    print('Enter task time to the nearest minute: 40 for exactly 40, '
+          '30-60 for a range, 240+ for at least 240, '
+          'or H to pick from a histogram of times.')
+    time_range = None
+    while not time_range:
+        answer = input('>>>').strip()
+        if answer.lower() == 'h':
+            time_range = time_bucket_input()
+            if time_range is None:
+                print('\nNo results found.\n')
+                return task_search
+            continue
+        try:
+            time_range = parse_time_range(answer)
+        except ValueError as error:
+            print(error)
+    low, high = time_range
+    history = archive_input()
+    if low == high:
+        search_results = cached_search(time=low, history=history)
+    else:
+        search_results = cached_search(min_time=low, max_time=high,
+                                       history=history)
+    if len(search_results) == 0:
+        print('\nNo results found.\n')
+        return task_search
+    else:
+        return display_results(search_results)
+
+
+def full_text_enabled(database=None):
+    '''Returns True if the database has the full-text index'''
+    database = database or Task._meta.database
+    return 'taskindex' in database.get_tables()
+
+
+def employee_index_enabled(database=None):
+    '''Returns True if the database has the trigram index of employee
+    names'''
+    database = database or Task._meta.database
+    return 'employeeindex' in database.get_tables()
+
+
+# Names the trigram index offers find_employees() to rank.
+FUZZY_CANDIDATES = 200
+# Share of the typed text's trigrams that a name must have to match it.
+FUZZY_MIN_SHARE = 0.5
+
+
+def _trigrams(text):
+    # runs of three characters, ignoring case, as the trigram tokenizer
+    # splits text
+    text = text.lower()
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+def _name_score(trigrams, name):
+    # the share of the text's trigrams found in the name, then the share
+    # of all their trigrams they have in common, which favours names
+    # without much else in them
+    found = _trigrams(name)
+    shared = len(trigrams & found)
+    return shared / len(trigrams), shared / len(trigrams | found)
+
+
+def find_employees(text, limit=10):
+    '''Returns the names of up to limit employees that best match text,
+    best first.  Names are compared by their trigrams (runs of three
+    characters, ignoring case), so a name is found from any part of it
+    and despite typos.  Text shorter than three characters matches the
+    start of names.  The trigram index finds the names to compare when
+    the database has it; otherwise every name is compared.
+    '''
+    text = text.strip()
+    database = Task._meta.database
+    trigrams = _trigrams(text)
+    if not trigrams:
+        return [name for name, in database.execute_sql(
+            'SELECT name FROM employee WHERE lower(substr(name, 1, ?)) = ? '
+            'ORDER BY name LIMIT ?', (len(text), text.lower(), limit))]
+    if employee_index_enabled(database):
+        # names with any of the trigrams, most of the rarer ones first
+        rows = database.execute_sql(
+            'SELECT name FROM employeeindex WHERE employeeindex MATCH ? '
+            'ORDER BY rank LIMIT ?',
+            (' OR '.join('"{}"'.format(trigram.replace('"', '""'))
+                         for trigram in sorted(trigrams)),
+             FUZZY_CANDIDATES))
+    else:
+        rows = database.execute_sql('SELECT name FROM employee')
+    scored = [(_name_score(trigrams, name), name) for name, in rows]
+    scored.sort(key=lambda pair: (-pair[0][0], -pair[0][1], pair[1]))
+    return [name for score, name in scored[:limit]
+            if score[0] >= FUZZY_MIN_SHARE]
+
+
+def text_search(search_string, model=Task):
+    '''Returns a query for tasks whose name or notes contain the search
+    string.  Uses the full-text index when there is one, matching the
+    string as a phrase whose last word may be a prefix and ranking the
+    best matches first.  Short strings, and searches of TaskHistory,
+    which the index does not cover, fall back to a substring match.
+    '''
+    if (model is Task and
+            len(search_string.strip()) >= FULL_TEXT_MIN_LENGTH and
+            full_text_enabled()):
+        from playhouse.sqlite_ext import match
+        phrase = '"{}"*'.format(search_string.strip().replace('"', '""'))
+        return (task_query()
+                .switch(Task)
+                .join(TaskIndex, on=(TaskIndex.rowid == Task.id))
+                .where(match(TaskIndex.taskindex, phrase))
+                .order_by(TaskIndex.rank, Task.id))
+    return task_query(model).where(
+        (model.name.contains(search_string)) |
+        (model.notes.contains(search_string))
+    )
+
+
+@work_trace.traced
+def exact_find():
+    search_string = None
+    print('Enter text to be searched')
+    while search_string is None or search_string.isspace():
+        search_string = input('>>>')
+        if search_string.strip() == '':
+            print("Please enter some text to be searched.")
+            search_string = None
+    search_results = cached_search(text=search_string,
+                                   history=archive_input())
+    if len(search_results) == 0:
+        print('\nNo results found.\n')
+        return task_search
+    else:
+        print('Number of results = ' + str(len(search_results)))
+        return display_results(search_results)
+
+
+# employee_find lists every employee when there are no more than this
+# many, and otherwise asks for part of a name and lists the best matches.
+EMPLOYEE_LIST_SIZE = 20
+
+
+@work_trace.traced
+def employee_find():
+    history = archive_input()
+    employee_names = employee_counts(history)
+    if len(employee_names) > EMPLOYEE_LIST_SIZE:
+        employee_names = employee_lookup(employee_names)
+    count = 1
+    print('Pick one of the following employees to view entries from:')
+    for person, number_of_entries in employee_names:
+        print(str(count) + ": " + person + " (" + str(number_of_entries)
+              + " entr{})".format('ies' if number_of_entries > 1 else 'y'))
+        count += 1
+    selection = None
+    while not selection:
+        print('Enter number corresponding to the desired employee.')
+        selection = input('>>>').strip()
+        try:
+            selection = int(selection)
+        except ValueError:
+            print('Please enter a valid number')
+            selection = None
+        else:
+            if selection > len(employee_names):
+                print('Please enter a valid number{}'.format(
+                    ' between 1 and {}.'.format(
+                      len(employee_names) if len(employee_names) > 1
+                      else '.')))
+                selection = None
+    return display_results(
+        cached_search(employee=employee_names[selection - 1][0],
+                      history=history))
+
+
+def employee_lookup(employee_names):
+    '''Asks for part of an employee's name until it matches employees
+    among the (employee, number of entries) pairs given, and returns
+    the pairs of the best matches, best first'''
+    entries = dict(employee_names)
+    while True:
+        text = input("Enter part of the employee's name.\n>>>")
+        matches = [(name, entries[name])
+                   for name in find_employees(text, FUZZY_CANDIDATES)
+                   if name in entries]
+        if matches:
+            return matches[:EMPLOYEE_LIST_SIZE]
+        print('No employee names match {}.'.format(text.strip()))
+
+
+@work_trace.traced
+def display_results(results_list):
+    '''Displays search results one by one,
+allowing each entry to be edited or deleted.
+Returns the next menu to show.'''
+    count = 1
+    total = len(results_list)
+    terms = getattr(results_list, 'terms', None)
+    if getattr(results_list, 'history', False):
+        # bulk changes leave archived tasks alone
+        terms = None
+    for entry in results_list:
+        archived = getattr(entry, 'archive', 0)
+        print('''
+            Result {} of {}\n
+            Employee name: {}
+            Task name: {}
+            Work time: {}
+            Date: {}{}
+            Notes: {}
+'''.format(count, total, entry.employee, entry.name,
+              entry.time, entry.date, ' (archived)' if archived else '',
+              entry.notes))
+        selection = None
+        while not selection:
+            selection = input('Select {}[E]dit entry, '
+                              '[D]elete entry, {}[S]earch menu \n>>>'
+                              .format('[N]ext result, ' if count <
+                                      total else '',
+                                      '[B]ulk change all results, '
+                                      if terms else ''))
+            if selection.lower() == 'b' and terms:
+                return bulk_menu(terms)
+            elif selection.lower() in ('e', 'd') and archived:
+                print('Archived tasks cannot be changed.')
+                selection = None
+            elif selection.lower() == 'e':
+                next_menu = edit_entry(entry)
+                if next_menu:
+                    return next_menu
+            elif selection.lower() == 'd':
+                delete_entry(entry)
+            elif selection.lower() == 's':
+                # quit display results and go back to search menu
+                return task_search
+            elif selection.lower() != 'n':
+                selection = None
+        count += 1
+    print("\nEnd of search results.\n")
+    return task_search
+
+
+@work_trace.traced
+def bulk_menu(terms):
+    '''Lets the user edit or delete every task a search found at once,
+    or undo the last bulk change.  Returns the next menu to show.'''
+    count = bulk_count(**terms)
+    print('\n{} task{} match this search.'.format(
+        count, '' if count == 1 else 's'))
+    while True:
+        selection = input('[E]dit a field of all of them, [D]elete all of '
+                          'them, [U]ndo the last bulk change, [C]ancel'
+                          '\n>>>').strip().lower()
+        if selection == 'e':
+            field, value = bulk_change_input()
+            if input('Set the {} of {} tasks to {!r}? [yN]'.format(
+                    field, count, str(value))).lower() == 'y':
+                operation = bulk_edit(terms, **{field: value})
+                print('\n{} tasks changed.\n'.format(operation.count))
+            return task_search
+        elif selection == 'd':
+            if input('Delete {} tasks? [yN]'.format(count)).lower() == 'y':
+                operation = bulk_delete(terms)
+                print('\n{} tasks deleted.\n'.format(operation.count))
+            return task_search
+        elif selection == 'u':
+            try:
+                operation = undo_bulk()
+            except ValueError as error:
+                print(error)
+                return task_search
+            if operation is None:
+                print('\nThere is no bulk change to undo.\n')
+            else:
+                print('\nUndid the bulk {} of {} tasks.\n'.format(
+                    operation.kind, operation.count))
+            return task_search
+        elif selection == 'c':
+            return task_search
+        else:
+            print('Please choose E, D, U or C.')
+
+
+def bulk_change_input():
+    '''Asks for a field and a new value for it, and returns both'''
+    field_dict = {'1': 'employee', '2': 'name', '3': 'time', '4': 'date',
+                  '5': 'notes'}
+    field = None
+    while field not in field_dict:
+        field = input('Select field to change: 1 - employee name, '
+                      '2 - task name, 3 - time, 4 - date, 5 - notes\n>>>'
+                      ).strip()
+    field = field_dict[field]
+    while True:
+        try:
+            return field, validate_changes(
+                {field: input('Enter new {}.\n>>>'.format(field))})[field]
+        except ValueError as error:
+            print(error)
+
+
+@work_trace.traced
+def edit_entry(table_row):
+    '''Allows user to edit specific field of task entry.
+    Returns the search menu if the user asks for it.'''
+    field_dict = {'1': 'name', '2': 'time', '3': 'date', '4': 'notes'}
+    field = None
+    while not field:
+        field = input('''Select field to edit: 1 - task name, 2 - time, 3 - date, 4 - notes.
+Enter 5 to go back to search results, 6 to go back to search menu\n>>>''')
+        if field == '5':
+            return
+        if field == '6':
+            return task_search
+    print('Enter new {}.'.format(field_dict[field]))
+    new_info = None
+    while not new_info:
+        new_info = input('>>>')
+        if new_info.isspace():
+            print('Please enter non-empty string.')
+            new_info = None
+            continue
+        if field == '1':
+            try:
+                new_info = validate_name(new_info)
+            except ValueError as error:
+                print(error)
+                new_info = None
+        if field == '2':
+            try:
+                new_info = int(new_info)
+            except ValueError:
+                print("Please enter a valid number")
+                new_info = None
+            else:
+                if new_info <= 0:
+                    print("Please enter a valid number")
+                    new_info = None
+        if field == '3':
+            try:
+                datetime.datetime.strptime(new_info, '%Y-%m-%d')
+            except ValueError:
+                print("Dates should be valid and in format YYYY-MM-DD")
+                new_info = None
+    edit_task(table_row.id, **{field_dict[field]: new_info})
+    print("\nEntry edited!\n")
+
+
+@work_trace.traced
+def delete_entry(table_row):
+    '''Allows user to delete task entry'''
+    print("Confirm delete? [yN]")
+    confirm = input('>>>')
+    if confirm.lower() == 'y':
+        delete_task(table_row.id)
+        print("\nEntry deleted!\n")
+    else:
+        print("Delete cancelled!\n")
+
+
+if __name__ == "__main__":
+    # modules that import work_db, such as work_cli, get this module
+    # rather than running all of it again as a second copy
+    sys.modules.setdefault('work_db', sys.modules[__name__])
+    sys.exit(main(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,238 @@
+'''Streaming export of tasks to CSV, JSON Lines or a columnar file.
+
+Rows are read with a database cursor and written as they arrive, so an
+export uses the same memory for ten rows or ten million.  The search
+terms are the ones the interactive searches use.
+
+    python work_export.py june.csv --start-date 2017-06-01 --employee Fred
+    python work_export.py - --format jsonl --employee Fred
+
+Columnar files hold the tasks in groups of up to ROW_GROUP_SIZE rows.
+After an 8 byte magic string, each group is a little-endian uint32 row
+count followed by one block per column in EXPORT_FIELDS order.  Number
+columns (id, time) are int64 and int32 arrays, dates are int32 days
+since 1970-01-01, and text columns are a uint32 array of UTF-8 byte
+lengths followed by the bytes themselves.  read_columnar() reads them
+back.
+'''
+import argparse
+import array
+import csv
+import datetime
+import json
+import struct
+import sys
+
+import work_db
+from work_db import Task
+
+EXPORT_FIELDS = ['id', 'employee', 'name', 'time', 'date', 'notes']
+
+COLUMNAR_MAGIC = b'TASKCOL1'
+ROW_GROUP_SIZE = 65536
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+# rows pulled from the database cursor at a time
+FETCH_SIZE = 10000
+
+# array typecode of each number column; the rest are text
+_NUMBER_COLUMNS = {'id': 'q', 'time': 'i', 'date': 'i'}
+
+
+def export_rows(query, fetch_size=FETCH_SIZE, model=Task):
+    '''Yields (id, employee, name, time, date, notes) tuples for the tasks
+    in a query of model (Task or work_db.TaskHistory), in id order unless
+    the query has its own.  Queries of Task must join the employee, as
+    work_db.task_query() does.  Rows come straight from the database
+    cursor, skipping model instances and field conversion, so dates stay
+    as YYYY-MM-DD strings.
+    '''
+    fields = [getattr(model, name) for name in EXPORT_FIELDS]
+    if model is Task:
+        fields[1] = work_db.Employee.name
+    query = query.select(*fields)
+    if not query._order_by:
+        query = query.order_by(model.id)
+    cursor = Task._meta.database.execute_sql(*query.sql())
+    rows = cursor.fetchmany(fetch_size)
+    while rows:
+        for row in rows:
+            yield row
+        rows = cursor.fetchmany(fetch_size)
+
+
+def write_csv(rows, output):
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows, output):
+    count = 0
+    for task_id, employee, name, time, date, notes in rows:
+        output.write(json.dumps({
+            'id': task_id, 'employee': employee, 'name': name,
+            'time': time, 'date': date, 'notes': notes}))
+        output.write('\n')
+        count += 1
+    return count
+
+
+def _text_block(values):
+    encoded = [(value or '').encode('utf-8') for value in values]
+    lengths = array.array('I', [len(value) for value in encoded])
+    if sys.byteorder != 'little':
+        lengths.byteswap()
+    return lengths.tobytes() + b''.join(encoded)
+
+
+def _number_block(typecode, values):
+    numbers = array.array(typecode, values)
+    if sys.byteorder != 'little':
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+_day_numbers = {}
+
+
+def _day_number(date_string):
+    # a table has few distinct dates, so each is only parsed once
+    day = _day_numbers.get(date_string)
+    if day is None:
+        day = work_db.validate_date(date_string).toordinal() - EPOCH
+        _day_numbers[date_string] = day
+    return day
+
+
+def _write_row_group(group, output):
+    output.write(struct.pack('<I', len(group)))
+    for index, name in enumerate(EXPORT_FIELDS):
+        column = [row[index] for row in group]
+        if name == 'date':
+            column = [_day_number(date) for date in column]
+        if name in _NUMBER_COLUMNS:
+            output.write(_number_block(_NUMBER_COLUMNS[name], column))
+        else:
+            output.write(_text_block(column))
+
+
+def write_columnar(rows, output):
+    '''Writes rows to a binary file in the columnar layout described
+    at the top of this module.
+    '''
+    output.write(COLUMNAR_MAGIC)
+    count = 0
+    group = []
+    for row in rows:
+        group.append(row)
+        if len(group) == ROW_GROUP_SIZE:
+            _write_row_group(group, output)
+            count += len(group)
+            group = []
+    if group:
+        _write_row_group(group, output)
+        count += len(group)
+    return count
+
+
+def _read_exactly(source, size):
+    data = source.read(size)
+    if len(data) != size:
+        raise ValueError('Columnar file is truncated.')
+    return data
+
+
+def read_columnar(source):
+    '''Yields the rows of a columnar export as tuples'''
+    if source.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError('Not a columnar task export.')
+    while True:
+        header = source.read(4)
+        if not header:
+            return
+        if len(header) != 4:
+            raise ValueError('Columnar file is truncated.')
+        row_count = struct.unpack('<I', header)[0]
+        columns = []
+        for name in EXPORT_FIELDS:
+            typecode = _NUMBER_COLUMNS.get(name, 'I')
+            numbers = array.array(typecode)
+            numbers.frombytes(_read_exactly(
+                source, row_count * numbers.itemsize))
+            if sys.byteorder != 'little':
+                numbers.byteswap()
+            if name == 'date':
+                columns.append([datetime.date.fromordinal(day + EPOCH)
+                                for day in numbers])
+            elif name in _NUMBER_COLUMNS:
+                columns.append(list(numbers))
+            else:
+                data = _read_exactly(source, sum(numbers))
+                texts, start = [], 0
+                for length in numbers:
+                    texts.append(data[start:start + length].decode('utf-8'))
+                    start += length
+                columns.append(texts)
+        for row in zip(*columns):
+            yield row
+
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'columnar': write_columnar,
+}
+
+
+def export_tasks(output, file_format='csv', start_date=None, end_date=None,
+                 employee=None, time=None):
+    '''Writes the tasks matching the search terms to an open file and
+    returns how many were written.  Columnar output needs a binary file.
+    Exports of dates before the archive cutoff include archived tasks.
+    '''
+    terms = {'start_date': start_date, 'end_date': end_date,
+             'employee': employee, 'time': time}
+    terms = work_db.with_archives({name: value for name, value
+                                   in terms.items() if value is not None})
+    model = work_db.TaskHistory if terms.get('history') else Task
+    query = work_db.search_query(**terms)
+    return WRITERS[file_format](export_rows(query, model=model), output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Export tasks to CSV, JSON Lines or a columnar file.')
+    parser.add_argument('path', help="output file, or - for standard output")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--start-date', type=work_db.validate_date,
+                        metavar='YYYY-MM-DD')
+    parser.add_argument('--end-date', type=work_db.validate_date,
+                        metavar='YYYY-MM-DD')
+    parser.add_argument('--employee')
+    parser.add_argument('--time', type=work_db.validate_time,
+                        help='exact time spent in minutes')
+    args = parser.parse_args(argv)
+    work_db.initialize()
+    binary = args.format == 'columnar'
+    if args.path == '-':
+        output = sys.stdout.buffer if binary else sys.stdout
+    elif binary:
+        output = open(args.path, 'wb')
+    else:
+        output = open(args.path, 'w', newline='', encoding='utf-8')
+    try:
+        count = export_tasks(output, args.format, args.start_date,
+                             args.end_date, args.employee, args.time)
+    finally:
+        if args.path != '-':
+            output.close()
+    print('Exported {} tasks.'.format(count), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+'''Bulk import of historical tasks from CSV or JSON Lines files.
+
+Each row needs employee, name and time columns, and may have date
+(YYYY-MM-DD, default today) and notes.  Rows are checked with the same
+rules as the interactive prompts, and valid rows are written in batches,
+one transaction per batch.  The number of rows committed is saved with
+every batch, so an interrupted import picks up where it left off.
+
+    python work_import.py timesheets.csv --batch-size 5000 --errors bad.csv
+    python work_import.py timesheets.csv --workers 8
+    python work_import.py timesheets.csv --workers 8 --totals
+
+The file is split into chunks of batch-size rows without parsing them.
+With --workers, a pool of processes parses and checks the chunks and
+totals each chunk's entries and minutes per date and per employee,
+while this process alone writes them, in order, so SQLite keeps a
+single writer.  --totals prints the totals per employee instead of
+importing anything.
+'''
+import argparse
+import collections
+import csv
+import datetime
+import io
+import json
+import os
+
+import work_db
+from work_db import ImportProgress
+
+DEFAULT_BATCH_SIZE = 1000
+
+ImportSummary = collections.namedtuple(
+    'ImportSummary', ['imported', 'rejected', 'next_row'])
+
+# A chunk of a file, cleaned: the number of rows it had, its tasks as
+# (employee, name, time, date, notes) tuples with YYYY-MM-DD dates, its
+# rejected rows as (row number in the chunk, from 1, reason, row as
+# JSON), and the tasks' totals as {date: (entries, minutes)} and
+# {employee: (entries, minutes)}.
+Chunk = collections.namedtuple(
+    'Chunk', ['count', 'tasks', 'rejected', 'dates', 'employees'])
+
+
+def in_quotes(line, quoted=False):
+    '''Returns True if a line of CSV ends inside a quoted field, so that
+    its record goes on to the next line.  quoted says whether the line
+    starts inside one.  As in the csv module, a quote only opens a field
+    at its start; elsewhere it is part of the field's text.
+    '''
+    position = line.find('"')
+    while position >= 0:
+        if quoted:
+            if line.startswith('"', position + 1):
+                # a doubled quote inside a quoted field
+                position += 1
+            else:
+                quoted = False
+        elif position == 0 or line[position - 1] == ',':
+            quoted = True
+        position = line.find('"', position + 1)
+    return quoted
+
+
+def read_chunks(path, file_format, size, skip=0):
+    '''Yields (fieldnames, records) for each run of up to size rows of a
+    CSV or JSON Lines file, after skipping the first skip rows.  Records
+    are the rows' text, split apart without parsing them; fieldnames is
+    the CSV header, or None for JSON Lines.  Blank lines are not rows.
+    '''
+    with open(path, newline='', encoding='utf-8') as source:
+        fieldnames = None
+        if file_format == 'csv':
+            fieldnames = next(csv.reader(source), None)
+            if fieldnames is None:
+                return
+        records = []
+        record = ''
+        quoted = False
+        for line in source:
+            record += line
+            if file_format == 'csv' and '"' in line:
+                quoted = in_quotes(line, quoted)
+                if quoted:
+                    continue
+            if record.strip('\r\n' if file_format == 'csv' else None):
+                if skip:
+                    skip -= 1
+                else:
+                    records.append(record)
+            record = ''
+            if len(records) >= size:
+                yield fieldnames, records
+                records = []
+        if record and not skip:
+            # a quoted field the file ends inside of
+            records.append(record)
+        if records:
+            yield fieldnames, records
+
+
+def parse_records(records, fieldnames=None):
+    '''Yields each record from read_chunks() as a dict'''
+    if fieldnames is not None:
+        for row in csv.DictReader(io.StringIO(''.join(records)),
+                                  fieldnames):
+            yield row
+        return
+    for line in records:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # clean_row() rejects it as not being a record
+            yield line
+
+
+def read_rows(path, file_format=None):
+    '''Yields each row of a CSV or JSON Lines file as a dict,
+    reading one chunk of lines at a time.
+    '''
+    file_format = file_format or file_format_for(path)
+    for fieldnames, records in read_chunks(path, file_format,
+                                           DEFAULT_BATCH_SIZE):
+        for row in parse_records(records, fieldnames):
+            yield row
+
+
+def file_format_for(path):
+    '''Guesses csv or jsonl from a file name'''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.json', '.ndjson'):
+        return 'jsonl'
+    raise ValueError('Cannot tell the format of {}; '
+                     'use --format csv or --format jsonl.'.format(path))
+
+
+def clean_row(row):
+    '''Returns the Task fields for one imported row,
+    or raises ValueError if the row breaks a rule.
+    '''
+    if not isinstance(row, dict):
+        raise ValueError('Row is not a record.')
+    for field in ('employee', 'name', 'date', 'notes'):
+        value = row.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError('{} must be text.'.format(field))
+    time = row.get('time', '')
+    if time is not None and (isinstance(time, bool) or
+                             not isinstance(time, (str, int))):
+        raise ValueError('time must be a number or text.')
+    date = row.get('date') or ''
+    return {
+        'employee': work_db.validate_name(row.get('employee') or ''),
+        'name': work_db.validate_name(row.get('name') or ''),
+        'time': work_db.validate_time(time),
+        'date': (work_db.validate_date(date.strip()) if date
+                 else datetime.date.today()),
+        'notes': row.get('notes') or '',
+    }
+
+
+def clean_chunk(records, fieldnames=None):
+    '''Parses and checks the records of a chunk from read_chunks(), and
+    returns them as a Chunk.  Worker processes run it.'''
+    tasks = []
+    rejected = []
+    dates = collections.defaultdict(lambda: [0, 0])
+    employees = collections.defaultdict(lambda: [0, 0])
+    count = 0
+    for count, row in enumerate(parse_records(records, fieldnames), 1):
+        try:
+            task = clean_row(row)
+        except ValueError as error:
+            rejected.append((count, str(error), json.dumps(row)))
+            continue
+        date = task['date'].isoformat()
+        tasks.append((task['employee'], task['name'], task['time'], date,
+                      task['notes']))
+        for total in (dates[date], employees[task['employee']]):
+            total[0] += 1
+            total[1] += task['time']
+    return Chunk(count, tasks, rejected,
+                 {date: tuple(total) for date, total in dates.items()},
+                 {name: tuple(total) for name, total in employees.items()})
+
+
+def clean_chunks(path, file_format=None, batch_size=DEFAULT_BATCH_SIZE,
+                 workers=1, skip=0):
+    '''Yields a Chunk for each run of batch_size rows of a file, in
+    order, cleaned by a pool of that many worker processes, or by this
+    one if workers is 1.  Only a few chunks per worker are read ahead,
+    so memory stays bounded however large the file.
+    '''
+    file_format = file_format or file_format_for(path)
+    chunks = read_chunks(path, file_format, batch_size, skip)
+    if workers <= 1:
+        for fieldnames, records in chunks:
+            yield clean_chunk(records, fieldnames)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        pending = collections.deque()
+        for fieldnames, records in chunks:
+            pending.append(pool.submit(clean_chunk, records, fieldnames))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_batch(chunk, source, next_row):
+    '''Inserts the tasks of a Chunk and records the import's progress
+    in one transaction.
+    '''
+    work_db.writer.run(_insert_batch, chunk, source, next_row)
+
+
+def _insert_batch(chunk, source, next_row):
+    work_db.load_tasks(chunk.tasks, chunk.dates, chunk.employees)
+    progress = (ImportProgress
+                .update(next_row=next_row)
+                .where(ImportProgress.source == source)
+                .execute())
+    if not progress:
+        ImportProgress.create(source=source, next_row=next_row)
+
+
+def import_file(path, file_format=None, batch_size=DEFAULT_BATCH_SIZE,
+                errors=None, resume=True, workers=1):
+    '''Imports the tasks in a CSV or JSON Lines file, cleaning them
+    with a pool of worker processes if workers is more than 1.
+
+    Rows that fail validation are skipped and, if errors is a writable
+    file, reported there as CSV with their row number and the reason.
+    With resume, rows committed by an earlier run of the same file are
+    skipped.  Returns an ImportSummary.
+    '''
+    source = os.path.abspath(path)
+    start_row = 0
+    if resume:
+        progress = (ImportProgress.select()
+                    .where(ImportProgress.source == source)
+                    .first())
+        if progress:
+            start_row = progress.next_row
+    report = csv.writer(errors) if errors else None
+    imported = rejected = 0
+    next_row = start_row
+    for chunk in clean_chunks(path, file_format, batch_size, workers,
+                              skip=start_row):
+        for number, reason, row in chunk.rejected:
+            if report:
+                report.writerow([next_row + number, reason, row])
+        next_row += chunk.count
+        write_batch(chunk, source, next_row)
+        imported += len(chunk.tasks)
+        rejected += len(chunk.rejected)
+    return ImportSummary(imported, rejected, next_row)
+
+
+def file_totals(path, file_format=None, batch_size=DEFAULT_BATCH_SIZE,
+                workers=1):
+    '''Returns {employee: (entries, minutes)} for the valid rows of a
+    file, without importing them, from the totals the workers make for
+    each chunk'''
+    totals = collections.defaultdict(lambda: (0, 0))
+    for chunk in clean_chunks(path, file_format, batch_size, workers):
+        for name, (entries, minutes) in chunk.employees.items():
+            totals[name] = (totals[name][0] + entries,
+                            totals[name][1] + minutes)
+    return dict(totals)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Import tasks from a CSV or JSON Lines file.')
+    parser.add_argument('path', help='file to import')
+    parser.add_argument('--format', choices=['csv', 'jsonl'],
+                        help='file format (default: from the file name)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='rows committed per transaction')
+    parser.add_argument('--errors', metavar='PATH',
+                        help='write rejected rows to this CSV file')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore progress saved by an earlier run')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes that parse and check rows '
+                        '(default: 1, this one)')
+    parser.add_argument('--totals', action='store_true',
+                        help='print entries and minutes per employee '
+                        'instead of importing')
+    args = parser.parse_args(argv)
+    if args.totals:
+        totals = file_totals(args.path, args.format, args.batch_size,
+                             args.workers)
+        for name, (entries, minutes) in sorted(totals.items()):
+            print('{}: {} entries, {} minutes'.format(name, entries,
+                                                      minutes))
+        return
+    work_db.initialize()
+    errors = open(args.errors, 'a', newline='') if args.errors else None
+    try:
+        summary = import_file(args.path, args.format, args.batch_size,
+                              errors, resume=not args.restart,
+                              workers=args.workers)
+    finally:
+        if errors:
+            errors.close()
+    print('Imported {} tasks, rejected {}.'.format(summary.imported,
+                                                  summary.rejected))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+'''Load test for work_server.py.
+
+Opens many keep-alive connections at once and sends a mix of task
+creations and searches, then reports throughput, latency percentiles
+and errors:
+
+    python work_server.py --port 8080 &
+    python work_loadtest.py --port 8080 --concurrency 200 --requests 20000
+'''
+import argparse
+import asyncio
+import json
+import random
+import time
+
+EMPLOYEES = ['Airi', 'Chisato', 'Maimi', 'Momoko', 'Saki', 'Yurina']
+TASK_NAMES = ['Filing', 'Typing', 'Meeting', 'Phone support', 'Reporting']
+
+
+def random_request(write_ratio):
+    '''Returns the method, target and JSON body of one random request'''
+    if random.random() < write_ratio:
+        body = {'employee': random.choice(EMPLOYEES),
+                'name': random.choice(TASK_NAMES),
+                'time': random.randint(5, 240),
+                'notes': 'load test'}
+        return 'POST', '/tasks', body
+    choice = random.random()
+    if choice < 0.4:
+        target = '/tasks?employee={}&limit=20'.format(
+            random.choice(EMPLOYEES))
+    elif choice < 0.7:
+        target = '/tasks?time={}&limit=20'.format(random.randint(5, 240))
+    else:
+        target = '/tasks?text={}&limit=20'.format(
+            random.choice(TASK_NAMES).split()[0])
+    return 'GET', target, None
+
+
+async def send(reader, writer, host, method, target, body):
+    '''Sends one request on an open connection; returns the status'''
+    data = b'' if body is None else json.dumps(body).encode()
+    writer.write('{} {} HTTP/1.1\r\nHost: {}\r\nContent-Length: {}\r\n'
+                 'Content-Type: application/json\r\n\r\n'
+                 .format(method, target, host, len(data)).encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, requests, write_ratio, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            method, target, body = random_request(write_ratio)
+            started = time.perf_counter()
+            try:
+                status = await send(reader, writer, host, method, target,
+                                    body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append('connection lost')
+                return
+            latencies.append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+async def run_load(host, port, concurrency, requests, write_ratio):
+    '''Runs the load test and returns a dict of results'''
+    latencies, errors = [], []
+    per_client = max(1, requests // concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, per_client, write_ratio, latencies, errors)
+        for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            name: round(percentile(latencies, fraction) * 1000, 2)
+            for name, fraction in [('p50', 0.5), ('p90', 0.9),
+                                   ('p99', 0.99), ('max', 1.0)]},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='connections open at once')
+    parser.add_argument('--requests', type=int, default=10000,
+                        help='total requests to send')
+    parser.add_argument('--write-ratio', type=float, default=0.2,
+                        help='fraction of requests that create tasks')
+    args = parser.parse_args(argv)
+    results = asyncio.run(run_load(args.host, args.port, args.concurrency,
+                                   args.requests, args.write_ratio))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+'''Utilization reports computed with NumPy over a snapshot of the tasks.
+
+    python work_report.py --period week --start-date 2017-06-01
+    python work_report.py --top 5 --percentiles 50 90 99 --json
+
+The employee, date and time of every task are held as NumPy arrays:
+employees are dictionary encoded (an int32 code into a list of names),
+dates are int32 days since 1970-01-01 and times are int32 minutes.
+Totals per employee per week or month, percentiles of time spent and
+the top employees are computed with vectorized operations over them.
+
+The snapshot is saved next to the database and refreshed incrementally:
+only tasks with an id above the highest one in the snapshot are read.
+It also keeps the seq of the latest change journal entry it has seen
+(see work_db.changes_since).  If a later entry is for a task already in
+the snapshot, because it was edited, deleted or archived, the snapshot
+is rebuilt.  Like the rollups, reports cover the task table only:
+tasks moved to the archive files by work_db.archive_tasks() are left
+out.
+
+NumPy is needed for this module only; the rest of the work log runs
+without it.
+'''
+import argparse
+import datetime
+import json
+import os
+
+import numpy
+
+import work_db
+from work_db import Task
+
+# rows pulled from the database cursor at a time
+FETCH_SIZE = 50000
+
+PERIODS = ['week', 'month']
+
+
+class Snapshot:
+    '''Columns of the tasks with ids up to last_id, as of change journal
+    entry seq'''
+    def __init__(self, ids, employees, days, times, names, seq=0):
+        self.ids = ids
+        self.employees = employees
+        self.days = days
+        self.times = times
+        self.names = names
+        self.seq = seq
+
+    @classmethod
+    def empty(cls):
+        return cls(numpy.zeros(0, numpy.int64), numpy.zeros(0, numpy.int32),
+                   numpy.zeros(0, numpy.int32), numpy.zeros(0, numpy.int32),
+                   [])
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def last_id(self):
+        return int(self.ids[-1]) if len(self.ids) else 0
+
+    def append(self, rows):
+        '''Adds (id, employee, date, time) rows, in id order'''
+        ids, employees, dates, times = zip(*rows)
+        names, inverse = numpy.unique(numpy.array(employees),
+                                      return_inverse=True)
+        codes = {name: code for code, name in enumerate(self.names)}
+        for name in names.tolist():
+            if name not in codes:
+                codes[name] = len(self.names)
+                self.names.append(name)
+        mapping = numpy.array([codes[name] for name in names.tolist()],
+                              numpy.int32)
+        # ISO date strings parse to datetime64 days in one call
+        days = numpy.array(dates, 'datetime64[D]').astype(numpy.int32)
+        self.ids = numpy.concatenate([self.ids,
+                                      numpy.array(ids, numpy.int64)])
+        self.employees = numpy.concatenate([self.employees,
+                                            mapping[inverse.ravel()]])
+        self.days = numpy.concatenate([self.days, days])
+        self.times = numpy.concatenate([self.times,
+                                        numpy.array(times, numpy.int32)])
+
+    def save(self, path):
+        # written beside the old snapshot, then renamed over it, so a
+        # crash never leaves half a snapshot
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as output:
+            numpy.savez(output, ids=self.ids, employees=self.employees,
+                        days=self.days, times=self.times,
+                        names=numpy.array(self.names, dtype=str),
+                        seq=numpy.int64(self.seq))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        '''Returns the snapshot saved at path, or None if there is none
+        or it cannot be read'''
+        try:
+            with numpy.load(path) as arrays:
+                return cls(arrays['ids'], arrays['employees'],
+                           arrays['days'], arrays['times'],
+                           arrays['names'].tolist(), int(arrays['seq']))
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+def snapshot_path():
+    '''Where the snapshot of the current database is kept'''
+    return Task._meta.database.database + '.snapshot.npz'
+
+
+def latest_seq():
+    '''Returns the seq of the latest change journal entry, or 0'''
+    return Task._meta.database.execute_sql(
+        'SELECT COALESCE(MAX(seq), 0) FROM taskchange').fetchone()[0]
+
+
+def tasks_changed(snapshot):
+    '''Returns True if a task in the snapshot has been written since
+    it was made, going by the change journal'''
+    if work_db.compacted_through() > snapshot.seq:
+        # entries the snapshot has not seen may have been removed
+        return True
+    return Task._meta.database.execute_sql(
+        'SELECT 1 FROM taskchange WHERE seq > ? AND task_id <= ? LIMIT 1',
+        (snapshot.seq, snapshot.last_id)).fetchone() is not None
+
+
+def read_rows(after_id=0):
+    '''Yields lists of (id, employee, date, time) rows with ids above
+    after_id, in id order'''
+    cursor = Task._meta.database.execute_sql(
+        'SELECT task.id, employee.name, task.date, task.time FROM task '
+        'JOIN employee ON employee.id = task.employee_id '
+        'WHERE task.id > ? ORDER BY task.id', (after_id,))
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def load_snapshot(path=None, rebuild=False):
+    '''Returns a snapshot of every task, reading only the tasks added
+    since the snapshot saved at path, and saves it again if it changed.
+    The snapshot is rebuilt from scratch if asked or if older tasks have
+    been edited, deleted or archived since it was saved.
+    '''
+    path = path or snapshot_path()
+    snapshot = None if rebuild else Snapshot.load(path)
+    changed = False
+    with Task._meta.database.atomic():
+        seq = latest_seq()
+        if snapshot is None or tasks_changed(snapshot):
+            snapshot = Snapshot.empty()
+            changed = True
+        if snapshot.seq != seq:
+            snapshot.seq = seq
+            changed = True
+        for rows in read_rows(snapshot.last_id):
+            snapshot.append(rows)
+            changed = True
+    if changed:
+        snapshot.save(path)
+    return snapshot
+
+
+def day_number(date):
+    return (date - datetime.date(1970, 1, 1)).days
+
+
+def date_of(day):
+    return datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))
+
+
+def _select(snapshot, start_date=None, end_date=None):
+    # boolean mask of the tasks between the dates, inclusive
+    mask = numpy.ones(len(snapshot), bool)
+    if start_date:
+        mask &= snapshot.days >= day_number(start_date)
+    if end_date:
+        mask &= snapshot.days <= day_number(end_date)
+    return mask
+
+
+def period_starts(days, period):
+    '''Returns the day number of the first day of the week (Monday) or
+    month containing each day number'''
+    if period == 'week':
+        # 1970-01-01 was a Thursday, three days after a Monday
+        return (days + 3) // 7 * 7 - 3
+    months = days.astype('datetime64[D]').astype('datetime64[M]')
+    return months.astype('datetime64[D]').astype(numpy.int32)
+
+
+def period_totals(snapshot, period='week', start_date=None, end_date=None):
+    '''Returns (employee, first day of period, entries, minutes) for each
+    employee and week or month with tasks, by employee then period'''
+    mask = _select(snapshot, start_date, end_date)
+    employees = snapshot.employees[mask].astype(numpy.int64)
+    starts = period_starts(snapshot.days[mask], period).astype(numpy.int64)
+    # one key per (employee, period), grouped with a single unique()
+    keys = employees << 32 | (starts - starts.min() if len(starts) else 0)
+    groups, inverse = numpy.unique(keys, return_inverse=True)
+    inverse = inverse.ravel()
+    entries = numpy.bincount(inverse, minlength=len(groups))
+    minutes = numpy.bincount(inverse, weights=snapshot.times[mask],
+                             minlength=len(groups))
+    first = starts.min() if len(starts) else 0
+    rows = [(snapshot.names[key >> 32], date_of((key & 0xffffffff) + first),
+             int(count), int(total))
+            for key, count, total in zip(groups.tolist(), entries, minutes)]
+    return sorted(rows)
+
+
+def time_percentiles(snapshot, percentiles=(50, 90, 99), start_date=None,
+                     end_date=None):
+    '''Returns {employee: [minutes at each percentile]}, with the whole
+    team under None.  Percentiles use the nearest rank below, and must
+    be from 0 to 100.'''
+    if any(not 0 <= percentile <= 100 for percentile in percentiles):
+        raise ValueError('Percentiles must be from 0 to 100.')
+    mask = _select(snapshot, start_date, end_date)
+    employees = snapshot.employees[mask]
+    times = snapshot.times[mask]
+    if not len(times):
+        return {}
+    fractions = numpy.array(percentiles, float) / 100
+    result = {None: numpy.sort(times)[
+        (fractions * (len(times) - 1)).astype(int)].tolist()}
+    # sort by employee then time, so each employee's times are a sorted
+    # run; index every run at every percentile at once
+    order = numpy.lexsort((times, employees))
+    counts = numpy.bincount(employees, minlength=len(snapshot.names))
+    present = numpy.nonzero(counts)[0]
+    starts = numpy.concatenate([[0], numpy.cumsum(counts)[:-1]])[present]
+    indexes = (starts[:, None] +
+               (fractions[None, :] *
+                (counts[present][:, None] - 1)).astype(int))
+    values = times[order][indexes]
+    for code, row in zip(present.tolist(), values.tolist()):
+        result[snapshot.names[code]] = row
+    return result
+
+
+def top_employees(snapshot, count=10, start_date=None, end_date=None):
+    '''Returns (employee, minutes, entries) for the count employees with
+    the most time logged, most first'''
+    mask = _select(snapshot, start_date, end_date)
+    employees = snapshot.employees[mask]
+    minutes = numpy.bincount(employees, weights=snapshot.times[mask],
+                             minlength=len(snapshot.names))
+    entries = numpy.bincount(employees, minlength=len(snapshot.names))
+    count = min(count, numpy.count_nonzero(entries))
+    if not count:
+        return []
+    # argpartition finds the top count without sorting every employee
+    top = numpy.argpartition(-minutes, count - 1)[:count]
+    top = top[numpy.lexsort((top, -minutes[top]))]
+    return [(snapshot.names[code], int(minutes[code]), int(entries[code]))
+            for code in top.tolist()]
+
+
+def report(snapshot, period='week', start_date=None, end_date=None, top=10,
+           percentiles=(50, 90, 99)):
+    '''Returns every report as a dict that can be written as JSON'''
+    by_employee = time_percentiles(snapshot, percentiles, start_date,
+                                   end_date)
+    return {
+        'tasks': int(_select(snapshot, start_date, end_date).sum()),
+        'totals': [
+            {'employee': employee, period: start.isoformat(),
+             'entries': entries, 'minutes': minutes}
+            for employee, start, entries, minutes in period_totals(
+                snapshot, period, start_date, end_date)],
+        'percentiles': dict(
+            percentiles=list(percentiles),
+            everyone=by_employee.pop(None, []),
+            employees=by_employee),
+        'top': [{'employee': employee, 'minutes': minutes,
+                 'entries': entries}
+                for employee, minutes, entries in top_employees(
+                    snapshot, top, start_date, end_date)],
+    }
+
+
+def print_report(result, period):
+    print('{} tasks'.format(result['tasks']))
+    print('\nMinutes per employee per {}:'.format(period))
+    for row in result['totals']:
+        print('  {:<30} {} {:>6} entries {:>8} minutes'.format(
+            row['employee'], row[period], row['entries'], row['minutes']))
+    print('\nTime spent percentiles:')
+    for percentile, minutes in zip(result['percentiles']['percentiles'],
+                                   result['percentiles']['everyone']):
+        print('  {:>3}th: {} minutes'.format(percentile, minutes))
+    print('\nMost time logged:')
+    for rank, row in enumerate(result['top'], 1):
+        print('  {:>2}. {:<30} {:>8} minutes {:>6} entries'.format(
+            rank, row['employee'], row['minutes'], row['entries']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Report time logged per employee with NumPy.')
+    parser.add_argument('--period', choices=PERIODS, default='week')
+    parser.add_argument('--start-date', type=work_db.validate_date,
+                        metavar='YYYY-MM-DD')
+    parser.add_argument('--end-date', type=work_db.validate_date,
+                        metavar='YYYY-MM-DD')
+    parser.add_argument('--top', type=int, default=10,
+                        help='number of employees to rank')
+    parser.add_argument('--percentiles', type=float, nargs='+',
+                        default=[50, 90, 99])
+    parser.add_argument('--snapshot', help='default: next to the database')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='read every task again')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+    if args.top < 1:
+        parser.error('--top must be at least 1')
+    if any(not 0 <= percentile <= 100 for percentile in args.percentiles):
+        parser.error('--percentiles must be from 0 to 100')
+    work_db.initialize()
+    snapshot = load_snapshot(args.snapshot, args.rebuild)
+    result = report(snapshot, args.period, args.start_date, args.end_date,
+                    args.top, args.percentiles)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result, args.period)
+
+
+if __name__ == '__main__':
+    main()
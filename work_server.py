@@ -0,0 +1,328 @@
+'''HTTP/JSON service over the work log for other local tools.
+
+    python work_server.py --port 8080
+
+Endpoints (all bodies and responses are JSON):
+
+    POST   /tasks          add a task: {"employee", "name", "time",
+                           optional "date" and "notes"}
+    GET    /tasks          search, with any of start_date, end_date,
+                           employee, time, min_time, max_time and text
+                           as query parameters, plus limit (default 100)
+                           and offset; searches of dates before the
+                           archive cutoff find archived tasks too, as
+                           work_db.py search does
+    GET    /tasks/<id>     one task
+    PATCH  /tasks/<id>     change any of name, time, date and notes
+    DELETE /tasks/<id>     delete a task
+    GET    /changes        tasks written since the change journal entry
+                           given by the since parameter (default 0), in
+                           journal order, plus limit (default 100); see
+                           work_db.changes_since
+
+The event loop only parses requests; database work runs in a bounded
+pool of threads, each with its own connection.  Writes go through the
+work log's write coordinator, so writes from concurrent requests are
+committed together.  work_loadtest.py measures the service.
+'''
+import argparse
+import asyncio
+import json
+import logging
+import re
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import work_db
+import work_export
+from work_db import Task
+
+DEFAULT_WORKERS = 8
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BODY = 1024 * 1024
+
+log = logging.getLogger('work_server')
+
+_TASK_PATH = re.compile(r'^/tasks/(\d+)$')
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def task_dict(row):
+    '''Returns a task row from work_export.export_rows as a dict'''
+    return dict(zip(work_export.EXPORT_FIELDS, row))
+
+
+def get_task(task_id):
+    rows = list(work_export.export_rows(
+        work_db.task_query().where(Task.id == task_id)))
+    if not rows:
+        raise HTTPError(HTTPStatus.NOT_FOUND,
+                        'No task with id {}.'.format(task_id))
+    return task_dict(rows[0])
+
+
+def check_page(limit, offset=0):
+    '''Raises HTTPError unless limit is at least 1 and offset at least 0'''
+    if limit < 1:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'limit must be at least 1.')
+    if offset < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST,
+                        'offset must be at least 0.')
+
+
+def search_tasks(params):
+    def param(name, convert=str):
+        if name not in params:
+            return None
+        try:
+            return convert(params[name])
+        except ValueError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            '{}: {}'.format(name, error))
+    limit = param('limit', int)
+    limit = DEFAULT_LIMIT if limit is None else limit
+    offset = param('offset', int) or 0
+    check_page(limit, offset)
+    terms = {
+        'start_date': param('start_date', work_db.validate_date),
+        'end_date': param('end_date', work_db.validate_date),
+        'employee': param('employee'),
+        'time': param('time', work_db.validate_time),
+        'text': param('text'),
+        'min_time': param('min_time', work_db.validate_time),
+        'max_time': param('max_time', work_db.validate_time),
+    }
+    terms = work_db.with_archives({name: value for name, value
+                                   in terms.items() if value is not None})
+    model = work_db.TaskHistory if terms.get('history') else Task
+    query = work_db.search_query(**terms)
+    query = query.limit(min(limit, MAX_LIMIT)).offset(offset)
+    return [task_dict(row)
+            for row in work_export.export_rows(query, model=model)]
+
+
+def task_changes(params):
+    try:
+        since = int(params.get('since', 0))
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+        check_page(limit)
+        return [dict(zip(work_db.CHANGE_FIELDS, row))
+                for row in work_db.changes_since(since,
+                                                 min(limit, MAX_LIMIT))]
+    except ValueError as error:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, str(error))
+
+
+def check_fields(data):
+    '''Raises HTTPError if a task field in a request body is not a
+    string, or, for time, a string or a whole number'''
+    for field in ('employee', 'name', 'time', 'date', 'notes'):
+        if field not in data or isinstance(data[field], str):
+            continue
+        if field == 'time':
+            if (isinstance(data[field], int) and
+                    not isinstance(data[field], bool)):
+                continue
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            'time must be a number or a string.')
+        raise HTTPError(HTTPStatus.BAD_REQUEST,
+                        '{} must be a string.'.format(field))
+
+
+def create_task(data):
+    check_fields(data)
+    date = data.get('date')
+    task = work_db.add_task(data.get('employee') or '',
+                            data.get('name') or '',
+                            data.get('time', ''),
+                            data.get('notes') or '',
+                            work_db.validate_date(date) if date else None)
+    return get_task(task.id)
+
+
+def update_task(task_id, data):
+    check_fields(data)
+    changes = {field: data[field] for field in ('name', 'time', 'date',
+                                                'notes') if field in data}
+    if not changes:
+        raise HTTPError(HTTPStatus.BAD_REQUEST,
+                        'Give at least one of name, time, date and notes.')
+    if not work_db.edit_task(task_id, **changes):
+        raise HTTPError(HTTPStatus.NOT_FOUND,
+                        'No task with id {}.'.format(task_id))
+    return get_task(task_id)
+
+
+def delete_task(task_id):
+    if not work_db.delete_task(task_id):
+        raise HTTPError(HTTPStatus.NOT_FOUND,
+                        'No task with id {}.'.format(task_id))
+
+
+def _open_connection():
+    # runs once in each pool thread, which keeps its connection
+    Task._meta.database.connect()
+    work_db.apply_pragmas(Task._meta.database, work_db.connection_pragmas)
+
+
+class TaskServer:
+    '''Serves the endpoints above from an asyncio event loop'''
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='work-db',
+            initializer=_open_connection)
+
+    async def start(self, host='127.0.0.1', port=8080):
+        '''Starts listening, and the write coordinator's thread, and
+        returns the asyncio server'''
+        work_db.writer.start()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        self.executor.shutdown()
+        work_db.writer.stop()
+
+    async def run_in_pool(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def dispatch(self, method, target, body):
+        '''Returns the status and JSON payload answering one request'''
+        url = urllib.parse.urlsplit(target)
+        match = _TASK_PATH.match(url.path)
+        if url.path == '/tasks':
+            if method == 'GET':
+                params = dict(urllib.parse.parse_qsl(url.query))
+                return HTTPStatus.OK, await self.run_in_pool(search_tasks,
+                                                             params)
+            if method == 'POST':
+                return HTTPStatus.CREATED, await self.run_in_pool(
+                    create_task, self.json_object(body))
+        elif url.path == '/changes':
+            if method == 'GET':
+                params = dict(urllib.parse.parse_qsl(url.query))
+                return HTTPStatus.OK, await self.run_in_pool(task_changes,
+                                                             params)
+        elif match:
+            task_id = int(match.group(1))
+            if method == 'GET':
+                return HTTPStatus.OK, await self.run_in_pool(get_task,
+                                                             task_id)
+            if method == 'PATCH':
+                return HTTPStatus.OK, await self.run_in_pool(
+                    update_task, task_id, self.json_object(body))
+            if method == 'DELETE':
+                await self.run_in_pool(delete_task, task_id)
+                return HTTPStatus.NO_CONTENT, None
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND, 'No such resource.')
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED,
+                        '{} is not allowed here.'.format(method))
+
+    @staticmethod
+    def json_object(body):
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Body is not JSON.')
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            'Body must be a JSON object.')
+        return data
+
+    async def handle_connection(self, reader, writer):
+        '''Answers requests on one connection until the client closes it'''
+        try:
+            keep_alive = True
+            while keep_alive:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = await self.read_headers(reader)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    method, target, version = (
+                        request_line.decode('latin-1').split())
+                    length = int(headers.get('content-length', 0))
+                    if length > MAX_BODY:
+                        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                        'Body is too large.')
+                    body = await reader.readexactly(length)
+                    status, payload = await self.dispatch(method, target,
+                                                          body)
+                except HTTPError as error:
+                    status, payload = error.status, {'error': str(error)}
+                except ValueError as error:
+                    status = HTTPStatus.BAD_REQUEST
+                    payload = {'error': str(error)}
+                except Exception:
+                    log.exception('Error answering %s',
+                                  request_line.decode('latin-1').strip())
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {'error': 'Internal server error.'}
+                    keep_alive = False
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_headers(reader):
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+    @staticmethod
+    def write_response(writer, status, payload, keep_alive):
+        body = b'' if payload is None else json.dumps(payload).encode()
+        head = ['HTTP/1.1 {} {}'.format(status.value, status.phrase),
+                'Content-Length: {}'.format(len(body)),
+                'Connection: {}'.format('keep-alive' if keep_alive
+                                        else 'close')]
+        if payload is not None:
+            head.append('Content-Type: application/json')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') +
+                     body)
+
+
+async def serve(host, port, workers):
+    task_server = TaskServer(workers)
+    server = await task_server.start(host, port)
+    print('Serving the work log on http://{}:{}/tasks'.format(host, port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        task_server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve the work log over HTTP as JSON.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='threads doing database work')
+    args = parser.parse_args(argv)
+    work_db.initialize()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
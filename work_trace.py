@@ -0,0 +1,149 @@
+'''Opt-in query tracing for the work log.
+
+Set WORK_DB_TRACE before starting an interactive session:
+
+    WORK_DB_TRACE=1 python work_db.py            # summary when you quit
+    WORK_DB_TRACE=trace.jsonl python work_db.py  # also log every query
+
+Every SQL statement is counted and timed and charged to the menu action
+that issued it: the innermost function marked with @traced, or the menu
+run_session is showing.  When the session ends a summary is printed with
+each action's calls, queries and query time, and any action that ran the
+same statement many times in one call (the N+1 pattern: one query per
+row of an earlier result) is flagged.
+'''
+import collections
+import contextlib
+import functools
+import json
+import sys
+import time
+
+# Same statement this many times in one call of an action counts as N+1.
+N_PLUS_ONE_THRESHOLD = 10
+
+# The tracer in use, if tracing is on.
+active = None
+
+
+class QueryTracer:
+    '''Counts and times the statements a database runs, per action'''
+    def __init__(self, trace_file=None, threshold=N_PLUS_ONE_THRESHOLD):
+        self.trace_file = trace_file
+        self.threshold = threshold
+        self.totals = collections.OrderedDict()
+        self.warnings = []
+        self._frames = []
+        self._database = None
+        self._execute_sql = None
+
+    def install(self, database):
+        '''Starts timing every statement the database executes'''
+        self._database = database
+        self._execute_sql = execute_sql = database.execute_sql
+
+        @functools.wraps(execute_sql)
+        def traced_execute_sql(sql, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return execute_sql(sql, *args, **kwargs)
+            finally:
+                self.record(sql, time.perf_counter() - started)
+
+        database.execute_sql = traced_execute_sql
+
+    def uninstall(self):
+        if self._database is not None:
+            del self._database.execute_sql
+            self._database = self._execute_sql = None
+
+    def _totals_for(self, name):
+        if name not in self.totals:
+            self.totals[name] = {'calls': 0, 'queries': 0, 'seconds': 0.0}
+        return self.totals[name]
+
+    def record(self, sql, seconds):
+        name = self._frames[-1][0] if self._frames else '(no action)'
+        totals = self._totals_for(name)
+        totals['queries'] += 1
+        totals['seconds'] += seconds
+        if self._frames:
+            self._frames[-1][1][sql] += 1
+        if self.trace_file:
+            self.trace_file.write(json.dumps(
+                {'action': name, 'sql': sql,
+                 'ms': round(seconds * 1000, 3)}) + '\n')
+
+    @contextlib.contextmanager
+    def action(self, name):
+        '''Charges the statements run inside the block to the action'''
+        self._frames.append((name, collections.Counter()))
+        self._totals_for(name)['calls'] += 1
+        try:
+            yield
+        finally:
+            name, statements = self._frames.pop()
+            for sql, count in statements.items():
+                if count >= self.threshold:
+                    self.warnings.append((name, count, sql))
+
+    def summary(self):
+        '''Returns the per-action report as text'''
+        lines = ['{:<20} {:>6} {:>8} {:>10}'.format(
+            'action', 'calls', 'queries', 'query ms')]
+        for name, totals in self.totals.items():
+            lines.append('{:<20} {:>6} {:>8} {:>10.2f}'.format(
+                name, totals['calls'], totals['queries'],
+                totals['seconds'] * 1000))
+        for name, count, sql in self.warnings:
+            lines.append('N+1 in {}: ran {} times: {}'.format(
+                name, count, sql))
+        return '\n'.join(lines)
+
+
+def start(database, setting):
+    '''Starts tracing if setting (the WORK_DB_TRACE value) asks for it.
+    Anything other than 1 is taken as a file to log each query to.'''
+    global active
+    if not setting:
+        return None
+    trace_file = None
+    if setting.lower() not in ('1', 'yes', 'true', 'summary'):
+        trace_file = open(setting, 'a', buffering=1)
+    active = QueryTracer(trace_file)
+    active.install(database)
+    return active
+
+
+def finish():
+    '''Stops tracing and prints the summary'''
+    global active
+    if active is None:
+        return
+    active.uninstall()
+    if active.trace_file:
+        active.trace_file.close()
+    print('\n' + active.summary(), file=sys.stderr)
+    active = None
+
+
+@contextlib.contextmanager
+def action(name):
+    '''tracer.action() for the active tracer; does nothing if tracing
+    is off'''
+    if active is None:
+        yield
+    else:
+        with active.action(name):
+            yield
+
+
+def traced(func):
+    '''Marks a menu function as an action of its own in traces'''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if active is None:
+            return func(*args, **kwargs)
+        with active.action(func.__name__):
+            return func(*args, **kwargs)
+    return wrapper